@@ -1,8 +1,8 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django import forms
 from django.forms import CheckboxSelectMultiple
 from django.utils.html import format_html
-from .models import Author, Post, Comment, Tag, Publication, WelcomePopup, PostImage, Brochure
+from .models import Author, Post, Comment, Tag, Publication, WelcomePopup, PostImage, Brochure, Job
 
 class PostImageInline(admin.TabularInline):
     model = PostImage
@@ -98,3 +98,26 @@ class WelcomePopupAdmin(admin.ModelAdmin):
 class BrochureAdmin(admin.ModelAdmin):
 	list_display = ('id', 'title', 'created_at')
 	search_fields = ('title',)
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+	list_display = ('id', 'kind', 'status', 'attempts', 'max_attempts', 'run_after', 'created_at', 'finished_at')
+	list_filter = ('status', 'kind')
+	search_fields = ('idempotency_key',)
+	readonly_fields = ('kind', 'payload', 'idempotency_key', 'attempts', 'created_at', 'started_at', 'finished_at', 'last_error')
+	actions = ['retry_jobs']
+
+	@admin.action(description='Retry selected jobs')
+	def retry_jobs(self, request, queryset):
+		"""Put failed/done jobs back in the queue with a fresh attempt budget."""
+		from django.db import IntegrityError
+		from django.utils import timezone
+		try:
+			updated = queryset.exclude(status__in=Job.ACTIVE_STATUSES).update(
+				status=Job.STATUS_PENDING, attempts=0, run_after=timezone.now(), last_error='',
+			)
+		except IntegrityError:
+			self.message_user(request, 'A selected job already has an active duplicate.', level=messages.ERROR)
+			return
+		self.message_user(request, f'{updated} job(s) queued again.')
@@ -0,0 +1,262 @@
+import math
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .cache import aget_namespace_version, cache_entry, get_api_cache, response_cache_key, response_from_entry
+from .conditional import make_validators, not_modified_response, set_validators, validator_aggregates
+from .fastpath import PostValuesSerializer, PublicationValuesSerializer
+from .models import Brochure, Publication, WelcomePopup
+from .pagination import PostPagination
+from .renderers import FastJSONRenderer
+from .serializers import BrochureSerializer, WelcomePopupSerializer
+from .views import POST_LIST_FIELDS, post_queryset
+
+JSON = 'application/json'
+
+
+def wants_json(request):
+    """True when DRF would pick the JSON renderer for this request."""
+    fmt = request.GET.get(api_settings.URL_FORMAT_OVERRIDE)
+    if fmt is not None:
+        return fmt == 'json'
+    accept = request.headers.get('Accept') or '*/*'
+    return 'text/html' not in accept and (JSON in accept or '*/*' in accept)
+
+
+class AsyncReadView:
+    """Anonymous JSON list/detail reads through the async ORM.
+
+    Mounted in front of a router route when API_ASYNC_READS is on (see
+    blog/urls.py), so under an ASGI server these requests never take a
+    thread: rows come from `aiterator()`/`aget()`, relations from async
+    iteration and the response cache from the async cache API. Payloads,
+    cache entries and ETags are the ones the DRF viewset produces, so both
+    paths share cache entries. Anything else (writes, signed-in users, the
+    browsable API, unknown query parameters, throttled clients, 404s) is
+    handed to the router's view, `fallback`, which also throttles them
+    unless they were already counted here.
+    """
+    cache_namespace = None
+    last_modified_field = None
+    # .values() rows rendered by a blog.fastpath serializer, or else model
+    # instances through `serializer_class`
+    values_serializer_class = None
+    serializer_class = None
+    pagination_class = None
+    # query parameters understood here besides ?format=json
+    query_params = ()
+
+    def __init__(self, fallback, unthrottled_fallback):
+        self.fallback = fallback
+        self.unthrottled_fallback = unthrottled_fallback
+
+    @classmethod
+    def as_view(cls, fallback):
+        # for requests throttle_classes() already counted
+        unthrottled = fallback.cls.as_view(fallback.actions, **{**fallback.initkwargs, 'throttle_classes': ()})
+
+        async def view(request, *args, **kwargs):
+            return await cls(fallback, unthrottled).dispatch(request, *args, **kwargs)
+        # labels requests in /metrics the way DRF views are (blog/metrics.py)
+        view.cls, view.actions = cls, fallback.actions
+        # like the DRF view it stands in for, which runs its own CSRF check
+        return csrf_exempt(view)
+
+    def get_queryset(self, request):
+        raise NotImplementedError
+
+    def filter_queryset(self, request, pk=None):
+        queryset = self.get_queryset(request)
+        return queryset if pk is None else queryset.filter(pk=pk)
+
+    def allow_header(self):
+        actions = self.fallback.actions
+        return ', '.join(
+            method.upper() for method in self.fallback.cls.http_method_names
+            if method in actions or method in ('head', 'options')
+        )
+
+    async def fall_back(self, request, *args, counted=False, **kwargs):
+        # the router's regex hands DRF a string pk
+        kwargs = {name: str(value) for name, value in kwargs.items()}
+        fallback = self.unthrottled_fallback if counted else self.fallback
+        return await sync_to_async(fallback)(request, *args, **kwargs)
+
+    async def can_handle(self, request):
+        if request.method not in ('GET', 'HEAD') or not wants_json(request):
+            return False
+        if set(request.GET) - set(self.query_params) - {api_settings.URL_FORMAT_OVERRIDE}:
+            return False
+        if 'HTTP_AUTHORIZATION' in request.META:
+            return False
+        request.user = await request.auser()
+        return not request.user.is_authenticated
+
+    async def throttled(self, request):
+        """Count the request against the viewsets' throttles.
+
+        Runs before any cache or database work. A refused request is handed
+        to the fallback for DRF's 429, which does not count it again since
+        throttles do not record refusals; one that is counted here and then
+        handed over anyway (a 404) goes to the unthrottled fallback.
+        """
+        def allow():
+            throttles = [throttle() for throttle in api_settings.DEFAULT_THROTTLE_CLASSES]
+            return all([throttle.allow_request(request, None) for throttle in throttles])
+        # the throttle history lives in the (sync) default cache
+        return not await sync_to_async(allow)()
+
+    async def dispatch(self, request, pk=None):
+        kwargs = {} if pk is None else {'pk': pk}
+        if not await self.can_handle(request) or await self.throttled(request):
+            return await self.fall_back(request, **kwargs)
+        response = await self.respond(request, pk)
+        if response is None:
+            return await self.fall_back(request, counted=True, **kwargs)
+        return response
+
+    async def respond(self, request, pk=None):
+        """The response to a request can_handle() accepted, or None to fall back."""
+        # what DRF content negotiation sets; part of cache keys and ETags
+        request.accepted_media_type = JSON
+
+        use_cache = getattr(settings, 'API_CACHE_ENABLED', True)
+        cache = get_api_cache()
+        version = await aget_namespace_version(self.cache_namespace)
+        key = response_cache_key(request, self.cache_namespace)
+        if use_cache:
+            entry = await cache.aget(key, version=version)
+            if entry is not None:
+                return response_from_entry(request, entry)
+
+        stats = None
+        if self.last_modified_field:
+            queryset = self.filter_queryset(request, pk).order_by()
+            stats = await queryset.aaggregate(**validator_aggregates(self.last_modified_field))
+        etag, last_modified = make_validators(self.cache_namespace, version, request, stats)
+        not_modified = not_modified_response(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        data = await self.get_data(request, pk)
+        if data is None:
+            return None
+        response = HttpResponse(FastJSONRenderer().render(data), content_type=JSON)
+        response['Allow'] = self.allow_header()
+        response['Vary'] = 'Accept'
+        set_validators(response, etag, last_modified)
+        if use_cache:
+            entry = await sync_to_async(cache_entry, thread_sensitive=False)(response)
+            await cache.aset(key, entry, version=version)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    async def get_data(self, request, pk=None):
+        """The payload, or None for requests DRF should answer (404s)."""
+        self.request = request
+        queryset = self.filter_queryset(request, pk)
+        if pk is not None:
+            rows = await self.fetch(queryset, one=True)
+            return (await self.represent(rows))[0] if rows else None
+        if self.pagination_class is not None:
+            return await self.paginate(queryset)
+        return await self.represent(await self.fetch(queryset))
+
+    def get_values_serializer(self):
+        return self.values_serializer_class(context={'request': self.request})
+
+    async def fetch(self, queryset, one=False):
+        if self.values_serializer_class is not None:
+            queryset = self.get_values_serializer().values(queryset)
+        if one:
+            try:
+                return [await queryset.aget()]
+            except queryset.model.DoesNotExist:
+                return []
+        return [row async for row in queryset.aiterator()]
+
+    async def represent(self, rows):
+        # srcset lookups read the (sync) default cache, so the rendering
+        # itself runs in the sync thread
+        if self.values_serializer_class is not None:
+            serializer = self.get_values_serializer()
+            related = await serializer.aload_related([row['id'] for row in rows])
+            return await sync_to_async(serializer.to_representation)(rows, related)
+
+        def serialize():
+            return self.serializer_class(rows, many=True, context={'request': self.request}).data
+        return await sync_to_async(serialize)()
+
+    async def paginate(self, queryset):
+        """PageNumberPagination's payload; None for pages DRF would 404."""
+        paginator = self.pagination_class
+        page = self.request.GET.get(paginator.page_query_param, '1')
+        if not page.isdigit() or int(page) < 1:
+            return None
+        page, size = int(page), paginator.page_size
+        count = await queryset.acount()
+        if page > max(1, math.ceil(count / size)):
+            return None
+        start = (page - 1) * size
+        results = await self.represent(await self.fetch(queryset[start:start + size]))
+
+        url = self.request.build_absolute_uri()
+        next_link = replace_query_param(url, paginator.page_query_param, page + 1) if start + size < count else None
+        previous_link = None
+        if page == 2:
+            previous_link = remove_query_param(url, paginator.page_query_param)
+        elif page > 2:
+            previous_link = replace_query_param(url, paginator.page_query_param, page - 1)
+        return {'count': count, 'next': next_link, 'previous': previous_link, 'results': results}
+
+
+class PostReadView(AsyncReadView):
+    cache_namespace = 'posts'
+    last_modified_field = 'updated_at'
+    values_serializer_class = PostValuesSerializer
+    pagination_class = PostPagination
+    query_params = ('page',)
+
+    def get_queryset(self, request):
+        return post_queryset()
+
+    async def get_data(self, request, pk=None):
+        self.fields = None if pk is not None else POST_LIST_FIELDS
+        return await super().get_data(request, pk)
+
+    def get_values_serializer(self):
+        return self.values_serializer_class(context={'request': self.request}, fields=self.fields)
+
+
+class PublicationReadView(AsyncReadView):
+    cache_namespace = 'publications'
+    values_serializer_class = PublicationValuesSerializer
+
+    def get_queryset(self, request):
+        return Publication.objects.order_by('-created_at')
+
+
+class BrochureReadView(AsyncReadView):
+    cache_namespace = 'brochures'
+    serializer_class = BrochureSerializer
+
+    def get_queryset(self, request):
+        return Brochure.objects.order_by('-created_at')
+
+
+class WelcomePopupReadView(AsyncReadView):
+    cache_namespace = 'welcome-popups'
+    serializer_class = WelcomePopupSerializer
+    query_params = ('is_active',)
+
+    def get_queryset(self, request):
+        qs = WelcomePopup.objects.order_by('-created_at')
+        is_active = request.GET.get('is_active')
+        if is_active is not None:
+            qs = qs.filter(is_active=is_active.lower() == 'true')
+        return qs
@@ -0,0 +1,197 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import parse_http_date_safe
+
+from .compression import negotiate, precompress, weaken_etag
+
+# Response headers worth replaying from a cached entry.
+CACHED_HEADERS = ('Content-Type', 'Vary', 'Allow', 'ETag', 'Last-Modified')
+
+
+def get_api_cache():
+    """Return the cache backend configured for API responses."""
+    return caches[getattr(settings, 'API_CACHE_ALIAS', 'default')]
+
+
+def _version_key(namespace):
+    return f'api-version:{namespace}'
+
+
+def _fresh_version():
+    # seeded from the clock so a version lost with a restarted local-memory
+    # cache never collides with one already handed out (e.g. inside an ETag)
+    return int(time.time() * 1000)
+
+
+def version_timestamp(version):
+    """Unix time (seconds) at which a namespace version was issued.
+
+    Versions are millisecond timestamps, so this is when the namespace was
+    last bumped, whatever row in it changed.
+    """
+    return version // 1000
+
+
+def get_namespace_version(namespace):
+    """Current version number for a namespace; bumping it orphans old entries."""
+    cache = get_api_cache()
+    version = cache.get(_version_key(namespace))
+    if version is None:
+        cache.add(_version_key(namespace), _fresh_version(), timeout=None)
+        version = cache.get(_version_key(namespace))
+    return version
+
+
+async def aget_namespace_version(namespace):
+    """get_namespace_version() for async views."""
+    cache = get_api_cache()
+    version = await cache.aget(_version_key(namespace))
+    if version is None:
+        await cache.aadd(_version_key(namespace), _fresh_version(), timeout=None)
+        version = await cache.aget(_version_key(namespace))
+    return version
+
+
+def bump_namespace(namespace):
+    """Invalidate every cached response stored under `namespace`."""
+    cache = get_api_cache()
+    key = _version_key(namespace)
+    # the new version is the bump time, kept ahead of the old one when two
+    # bumps land in the same millisecond (or a worker's clock lags)
+    cache.set(key, max(_fresh_version(), (cache.get(key) or 0) + 1), timeout=None)
+
+
+def response_cache_key(request, namespace):
+    """Key a response by host, full path (with query string) and media type.
+
+    `Host` is part of the key because serializers emit absolute media URLs via
+    `build_absolute_uri`.
+    """
+    media_type = getattr(request, 'accepted_media_type', '') or ''
+    raw = '|'.join([request.get_host(), request.get_full_path(), media_type])
+    digest = hashlib.md5(raw.encode('utf-8')).hexdigest()
+    return f'api-response:{namespace}:{digest}'
+
+
+def cache_entry(response):
+    """What the response cache stores for a rendered 200 response."""
+    return {
+        'status': response.status_code,
+        'content': response.content,
+        'encoded': precompress(response.content, response.get('Content-Type')),
+        'headers': {h: response[h] for h in CACHED_HEADERS if response.has_header(h)},
+    }
+
+
+def response_from_entry(request, entry):
+    """Replay a cached entry, compressed and conditional as the request allows."""
+    response = HttpResponse(entry['content'], status=entry['status'])
+    for header, value in entry['headers'].items():
+        response[header] = value
+    encoded = entry.get('encoded', {})
+    if encoded:
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING'))
+        if encoding in encoded:
+            # compressed once when stored, see precompress()
+            response.content = encoded[encoding]
+            response['Content-Encoding'] = encoding
+            weaken_etag(response)
+    response['X-Cache'] = 'HIT'
+    # the entry carries the validators computed when it was stored
+    return get_conditional_response(
+        request,
+        etag=response.get('ETag'),
+        last_modified=parse_http_date_safe(response.get('Last-Modified', '')),
+        response=response,
+    )
+
+
+class LocalEntries:
+    """In-process copies of response cache entries for one namespace.
+
+    Entries are only returned for the namespace version they were stored
+    under, and all of them are dropped once it moves, so a worker never
+    serves what another worker has invalidated. A hit saves the shared cache
+    round trip and unpickling; the version itself is still read per request.
+    """
+
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self._version = None
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        with self._lock:
+            if self._version != version:
+                return None
+            return self._entries.get(key)
+
+    def set(self, key, entry, version):
+        with self._lock:
+            if self._version != version:
+                self._version, self._entries = version, {}
+            elif len(self._entries) >= self.maxsize:
+                # keys vary by host and format only; this never grows in practice
+                self._entries.clear()
+            self._entries[key] = entry
+
+    def clear(self):
+        with self._lock:
+            self._version, self._entries = None, {}
+
+
+class CachedResponseMixin:
+    """Serve anonymous list/retrieve GETs from the API cache.
+
+    Entries are stored under `cache_namespace`, which `blog.signals` bumps
+    whenever a model feeding that endpoint changes.
+    """
+    cache_namespace = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # without one nothing would ever be cached, silently
+        if not cls.cache_namespace:
+            raise ImproperlyConfigured(f'{cls.__name__} uses CachedResponseMixin without a cache_namespace')
+
+    def list(self, request, *args, **kwargs):
+        return self._cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached_response(super().retrieve, request, *args, **kwargs)
+
+    def _should_cache(self, request):
+        if not getattr(settings, 'API_CACHE_ENABLED', True):
+            return False
+        if request.method not in ('GET', 'HEAD'):
+            return False
+        user = getattr(request, 'user', None)
+        return not (user and user.is_authenticated)
+
+    def _cached_response(self, handler, request, *args, **kwargs):
+        if not self._should_cache(request):
+            return handler(request, *args, **kwargs)
+
+        cache = get_api_cache()
+        version = get_namespace_version(self.cache_namespace)
+        key = response_cache_key(request, self.cache_namespace)
+        entry = cache.get(key, version=version)
+        if entry is not None:
+            return response_from_entry(request, entry)
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            def store(rendered):
+                cache.set(key, cache_entry(rendered), version=version)
+            response.add_post_render_callback(store)
+        response['X-Cache'] = 'MISS'
+        return response
@@ -0,0 +1,93 @@
+import gzip
+import re
+
+from django.conf import settings
+
+try:
+    import brotli
+except ImportError:  # optional: only gzip is produced without it
+    brotli = None
+
+# HTML is left alone: the browsable API embeds a CSRF token (BREACH).
+COMPRESSIBLE_TYPES = re.compile(r'^(application/(json|javascript|xml)|text/(plain|css|csv|javascript|xml)|image/svg\+xml)\b')
+
+# Quality used when compressing on every request vs. once per cached entry.
+DYNAMIC_LEVELS = {'br': 4, 'gzip': 6}
+CACHED_LEVELS = {'br': 9, 'gzip': 9}
+
+
+def gzip_bytes(data, level=9):
+    # mtime=0 keeps the output identical for identical input
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def brotli_bytes(data, quality=11):
+    if brotli is None:
+        return None
+    return brotli.compress(data, quality=quality)
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def min_size():
+    return getattr(settings, 'API_COMPRESSION_MIN_SIZE', 1024)
+
+
+def negotiate(accept_encoding):
+    """Pick 'br' or 'gzip' from an Accept-Encoding header, or None.
+
+    The client's q-values decide; brotli wins a tie.
+    """
+    weights = {}
+    for item in (accept_encoding or '').split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        q = 1.0
+        match = re.search(r'q=([0-9.]+)', params)
+        if match:
+            try:
+                q = float(match.group(1))
+            except ValueError:
+                q = 0.0
+        weights[coding] = q
+    best, best_q = None, 0.0
+    for coding in available_encodings():
+        q = weights.get(coding, weights.get('*', 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def should_compress(content_type, size):
+    return size >= min_size() and bool(COMPRESSIBLE_TYPES.match(content_type or ''))
+
+
+def compress(data, encoding, levels=DYNAMIC_LEVELS):
+    if encoding == 'br':
+        return brotli_bytes(data, quality=levels['br'])
+    return gzip_bytes(data, level=levels['gzip'])
+
+
+def precompress(data, content_type):
+    """Return {encoding: bytes} for a payload stored in the response cache.
+
+    Done once when the entry is written, at a higher level than per-request
+    compression; encodings that do not make the payload smaller are dropped.
+    """
+    if not should_compress(content_type, len(data)):
+        return {}
+    encoded = {}
+    for encoding in available_encodings():
+        body = compress(data, encoding, CACHED_LEVELS)
+        if len(body) < len(data):
+            encoded[encoding] = body
+    return encoded
+
+
+def weaken_etag(response):
+    # compressed bytes differ from the identity representation
+    etag = response.get('ETag')
+    if etag and not etag.startswith('W/'):
+        response['ETag'] = 'W/' + etag
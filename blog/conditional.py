@@ -0,0 +1,110 @@
+import calendar
+import hashlib
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .cache import get_namespace_version, version_timestamp
+
+
+def validator_aggregates(field):
+    """Aggregates folded into the ETag of a model with a modification timestamp."""
+    return {'last_modified': Max(field), 'count': Count('pk')}
+
+
+def make_validators(namespace, version, request, stats=None):
+    """Return (etag, last_modified timestamp or None).
+
+    `stats` is the result of `validator_aggregates()` over the rows the
+    response is built from, when the model has a modification timestamp.
+    Last-Modified is then the later of that timestamp and the namespace's
+    last bump, since related rows (comments, tags, images) and rows leaving
+    the queryset move only the latter.
+    """
+    parts = [
+        namespace,
+        str(version),
+        request.get_host(),
+        request.get_full_path(),
+        getattr(request, 'accepted_media_type', '') or '',
+    ]
+    last_modified = None
+    if stats is not None:
+        parts += [str(stats['count']), str(stats['last_modified'])]
+        last_modified = version_timestamp(version)
+        if stats['last_modified'] is not None:
+            last_modified = max(last_modified, calendar.timegm(stats['last_modified'].utctimetuple()))
+    etag = '"%s"' % hashlib.md5('|'.join(parts).encode('utf-8')).hexdigest()
+    return etag, last_modified
+
+
+def not_modified_response(request, etag, last_modified):
+    """A 304/412 for the request's preconditions, or None to go on."""
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None and response.status_code == 304:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+
+
+class ConditionalGetMixin:
+    """ETag / Last-Modified support for list and retrieve.
+
+    Validators are computed before the handler runs, so a matching
+    `If-None-Match` / `If-Modified-Since` gets a 304 without touching the
+    serializer. The ETag always folds in the content version of
+    `cache_namespace` (bumped by `blog.signals`); viewsets whose model has a
+    modification timestamp set `last_modified_field` to also fold in
+    `Max(last_modified_field)` and the row count of the filtered queryset,
+    and additionally get a Last-Modified header (see `make_validators`).
+    """
+    cache_namespace = None
+    last_modified_field = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # the namespace is part of every ETag; caught here rather than as a
+        # TypeError on the first GET
+        if not cls.cache_namespace:
+            raise ImproperlyConfigured(f'{cls.__name__} uses ConditionalGetMixin without a cache_namespace')
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional_response(super().retrieve, request, *args, **kwargs)
+
+    def get_validator_queryset(self):
+        qs = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        if lookup_url_kwarg in self.kwargs:
+            qs = qs.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        return qs
+
+    def get_validators(self, request):
+        """Return (etag, last_modified timestamp or None) for this request."""
+        stats = None
+        if self.last_modified_field:
+            stats = self.get_validator_queryset().order_by().aggregate(**validator_aggregates(self.last_modified_field))
+        return make_validators(self.cache_namespace, get_namespace_version(self.cache_namespace), request, stats)
+
+    def _conditional_response(self, handler, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return handler(request, *args, **kwargs)
+
+        etag, last_modified = self.get_validators(request)
+        not_modified = not_modified_response(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            set_validators(response, etag, last_modified)
+        return response
@@ -0,0 +1,257 @@
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.http import Http404
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from .metrics import timed_serialization
+from .models import Post, PostImage, Comment, Publication
+from .serializers import PostSerializer, PublicationSerializer, CommentSerializer, absolute_media_url, absolute_srcset
+
+_datetime = serializers.DateTimeField()
+
+
+def format_datetime(value):
+    # same string DRF's DateTimeField produces (timezone, trailing Z)
+    return None if value is None else _datetime.to_representation(value)
+
+
+@lru_cache(maxsize=64)
+def readable_fields(serializer_class, fields=None):
+    """Output keys of `serializer_class`, in order, for a `fields` subset."""
+    kwargs = {'fields': list(fields)} if fields is not None else {}
+    return tuple(name for name, field in serializer_class(**kwargs).fields.items() if not field.write_only)
+
+
+class ValuesSerializer:
+    """Read-only twin of a ModelSerializer that renders `.values()` rows.
+
+    Produces the same keys, order and value formats as `serializer_class`
+    without per-field dispatch: plain columns are copied from the row,
+    datetimes and file URLs are formatted directly, and each relation in
+    `computed` is loaded with one query for the whole page. Subclasses list
+    the serializer-only fields in `computed` ({name: method name}) and the
+    columns those methods read in `computed_columns`.
+    """
+    serializer_class = None
+    computed = {}
+    computed_columns = {}
+
+    def __init__(self, context=None, fields=None):
+        self.context = context or {}
+        self.request = self.context.get('request')
+        self.model = self.serializer_class.Meta.model
+        self.fields = readable_fields(self.serializer_class, tuple(fields) if fields is not None else None)
+
+    def columns(self):
+        cols = []
+        for name in self.fields:
+            if name in self.computed:
+                cols += self.computed_columns.get(name, [])
+            else:
+                cols.append(self.model._meta.get_field(name).attname)
+        if 'id' not in cols:
+            cols.append('id')
+        return list(dict.fromkeys(cols))
+
+    def values(self, queryset):
+        # also picks up `created_at` so keyset pagination can read the last row
+        cols = self.columns()
+        if 'created_at' not in cols and any(f.name == 'created_at' for f in self.model._meta.concrete_fields):
+            cols.append('created_at')
+        return queryset.prefetch_related(None).values(*cols)
+
+    def media_url(self, field_name, name):
+        return absolute_media_url(self.request, name, self.model._meta.get_field(field_name).storage)
+
+    def srcset(self, field_name, name):
+        field = self.model._meta.get_field(field_name)
+        return absolute_srcset(self.request, field.attr_class(None, field, name))
+
+    def related_querysets(self, ids):
+        """Hook for subclasses: {name: rows queryset} of relations for this page."""
+        return {}
+
+    def group_related(self, name, rows):
+        """Hook for subclasses: turn the rows of one relation into a lookup."""
+        return rows
+
+    def load_related(self, ids):
+        return {name: self.group_related(name, qs) for name, qs in self.related_querysets(ids).items()}
+
+    async def aload_related(self, ids):
+        """load_related() through the async ORM."""
+        return {
+            name: self.group_related(name, [row async for row in qs])
+            for name, qs in self.related_querysets(ids).items()
+        }
+
+    def to_representation(self, rows, related=None):
+        with timed_serialization():
+            return self._to_representation(rows, related)
+
+    def _to_representation(self, rows, related):
+        rows = list(rows)
+        if related is None:
+            related = self.load_related([row['id'] for row in rows])
+        plan = []
+        for name in self.fields:
+            if name in self.computed:
+                plan.append((name, getattr(self, self.computed[name]), True))
+                continue
+            field = self.model._meta.get_field(name)
+            if isinstance(field, models.DateTimeField):
+                plan.append((name, lambda row, n=name: format_datetime(row[n]), False))
+            elif isinstance(field, models.FileField):
+                plan.append((name, lambda row, n=name: self.media_url(n, row[n]), False))
+            else:
+                plan.append((name, lambda row, a=field.attname: row[a], False))
+        return [
+            {name: (fn(row, related) if takes_related else fn(row)) for name, fn, takes_related in plan}
+            for row in rows
+        ]
+
+
+class PostValuesSerializer(ValuesSerializer):
+    serializer_class = PostSerializer
+    computed = {
+        'comments': 'get_comments',
+        'tags': 'get_tags',
+        'thumbnail': 'get_thumbnail',
+        'thumbnail_srcset': 'get_thumbnail_srcset',
+        'video': 'get_video',
+        'images': 'get_images',
+        'images_srcset': 'get_images_srcset',
+    }
+    computed_columns = {
+        'thumbnail': ['thumbnail'],
+        'thumbnail_srcset': ['thumbnail'],
+        'video': ['video'],
+    }
+
+    def related_querysets(self, ids):
+        querysets = {}
+        if 'comments' in self.fields:
+            comments = Comment.objects.filter(post_id__in=ids, approved=True).order_by('created_at')
+            querysets['comments'] = comments.values('id', 'post_id', 'author_name', 'body', 'created_at', 'approved')
+        if 'tags' in self.fields:
+            through = Post.tags.through.objects.filter(post_id__in=ids).order_by('pk')
+            querysets['tags'] = through.values_list('post_id', 'tag__name')
+        if 'images' in self.fields or 'images_srcset' in self.fields:
+            images = PostImage.objects.filter(post_id__in=ids).exclude(image='').order_by('pk')
+            querysets['images'] = images.values_list('post_id', 'image')
+        return querysets
+
+    def group_related(self, name, rows):
+        grouped = defaultdict(list)
+        if name == 'comments':
+            comment_fields = readable_fields(CommentSerializer)
+            for row in rows:
+                row['post'] = row['post_id']
+                row['created_at'] = format_datetime(row['created_at'])
+                grouped[row['post_id']].append({field: row[field] for field in comment_fields})
+        else:
+            # (post_id, value) pairs for tags and images
+            for post_id, value in rows:
+                grouped[post_id].append(value)
+        return grouped
+
+    def get_comments(self, row, related):
+        return related['comments'].get(row['id'], [])
+
+    def get_tags(self, row, related):
+        return related['tags'].get(row['id'], [])
+
+    def get_thumbnail(self, row, related):
+        return self.media_url('thumbnail', row['thumbnail'])
+
+    def get_thumbnail_srcset(self, row, related):
+        return self.srcset('thumbnail', row['thumbnail'])
+
+    def get_video(self, row, related):
+        return self.media_url('video', row['video'])
+
+    def get_images(self, row, related):
+        storage = PostImage._meta.get_field('image').storage
+        return [absolute_media_url(self.request, name, storage) for name in related['images'].get(row['id'], [])]
+
+    def get_images_srcset(self, row, related):
+        field = PostImage._meta.get_field('image')
+        return [
+            absolute_srcset(self.request, field.attr_class(None, field, name))
+            for name in related['images'].get(row['id'], [])
+        ]
+
+
+class PublicationValuesSerializer(ValuesSerializer):
+    serializer_class = PublicationSerializer
+    computed = {
+        'image': 'get_image',
+        'image_srcset': 'get_image_srcset',
+        'download_link': 'get_download_link',
+    }
+    computed_columns = {
+        'image': ['image'],
+        'image_srcset': ['image'],
+        'download_link': ['pdf_file'],
+    }
+
+    def get_image(self, row, related):
+        return self.media_url('image', row['image'])
+
+    def get_image_srcset(self, row, related):
+        return self.srcset('image', row['image'])
+
+    def get_download_link(self, row, related):
+        return self.media_url('pdf_file', row['pdf_file'])
+
+
+class ValuesReadMixin:
+    """Serve list/retrieve GETs through `values_serializer_class`.
+
+    Only used while the viewset would render with that class's
+    `serializer_class` (so `?view=summary` and writes keep the regular
+    path), and only when API_VALUES_FAST_PATH is on. Reads are not checked
+    against object-level permissions, which these viewsets do not use.
+    """
+    values_serializer_class = None
+
+    def use_values_path(self):
+        return (
+            self.values_serializer_class is not None
+            and getattr(settings, 'API_VALUES_FAST_PATH', True)
+            and self.request.method in ('GET', 'HEAD')
+            and self.get_serializer_class() is self.values_serializer_class.serializer_class
+        )
+
+    def get_values_serializer(self, **kwargs):
+        return self.values_serializer_class(context=self.get_serializer_context(), **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        if not self.use_values_path():
+            return super().list(request, *args, **kwargs)
+        serializer = self.get_values_serializer()
+        queryset = serializer.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serializer.to_representation(page))
+        return Response(serializer.to_representation(queryset))
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self.use_values_path():
+            return super().retrieve(request, *args, **kwargs)
+        serializer = self.get_values_serializer()
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            queryset = self.filter_queryset(self.get_queryset()).filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+            rows = list(serializer.values(queryset)[:1])
+        except (TypeError, ValueError, ValidationError):
+            # a malformed pk, as get_object_or_404 treats it
+            raise Http404
+        if not rows:
+            raise Http404
+        return Response(serializer.to_representation(rows)[0])
@@ -0,0 +1,170 @@
+import hashlib
+import json
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+from .jobs import enqueue_on_commit, job_handler
+
+DERIVATIVES_DIR = 'derivatives'
+
+
+def image_fields():
+    """Map each model with uploaded images to its ImageField names."""
+    from .models import Post, PostImage, Publication, Brochure, WelcomePopup
+    return {
+        Post: ('thumbnail',),
+        PostImage: ('image',),
+        Publication: ('image',),
+        Brochure: ('image',),
+        WelcomePopup: ('image',),
+    }
+
+
+def derivative_widths():
+    return getattr(settings, 'IMAGE_DERIVATIVE_WIDTHS', (320, 640, 960, 1280))
+
+
+def derivative_formats():
+    formats = getattr(settings, 'IMAGE_DERIVATIVE_FORMATS', ('webp', 'avif'))
+    return [f for f in formats if features.check(f)]
+
+
+def _manifest_path(name):
+    digest = hashlib.md5(name.encode('utf-8')).hexdigest()
+    return f'{DERIVATIVES_DIR}/by-name/{digest}.json'
+
+
+def _source_signature(storage, name):
+    """Cheap change detector for a source file: size + mtime (a stat call)."""
+    return [storage.size(name), storage.get_modified_time(name).timestamp()]
+
+
+def _hash_file(storage, name):
+    sha = hashlib.sha256()
+    with storage.open(name, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _manifest_cache_key(name):
+    return f'image-derivatives:{name}'
+
+
+# cached in place of a manifest that does not exist yet
+PENDING = 'pending'
+
+
+def load_manifest(name, storage=default_storage, verify=False):
+    """Return the stored manifest for `name`, or None while there is none.
+
+    The request path only reads the (cached) manifest: uploads are stored
+    under a content hash, so a name keeps its content. `verify` (the
+    worker, post_save and the backfill command) also compares the source's
+    size and mtime with the ones the manifest was built from. A missing
+    manifest is remembered for IMAGE_MANIFEST_MISS_TIMEOUT seconds, so pages
+    with many images not yet processed do not check storage every time.
+    """
+    cache = caches['default']
+    key = _manifest_cache_key(name)
+    manifest = cache.get(key)
+    if manifest == PENDING and not verify:
+        return None
+    if manifest is None or manifest == PENDING:
+        path = _manifest_path(name)
+        if not storage.exists(path):
+            cache.set(key, PENDING, timeout=getattr(settings, 'IMAGE_MANIFEST_MISS_TIMEOUT', 60))
+            return None
+        with storage.open(path, 'rb') as f:
+            manifest = json.loads(f.read())
+        cache.set(key, manifest, timeout=None)
+    if verify:
+        try:
+            if manifest['signature'] != _source_signature(storage, name):
+                return None
+        except (OSError, NotImplementedError):
+            return None
+    return manifest
+
+
+def generate_derivatives(name, storage=default_storage):
+    """Build resized WebP/AVIF copies of `name` and write its manifest.
+
+    Derivatives live under `derivatives/<sha256 of source>/`, so identical
+    uploads share them and an unchanged source is never re-encoded.
+    Widths larger than the original are skipped (no upscaling).
+    """
+    signature = _source_signature(storage, name)
+    source_hash = _hash_file(storage, name)
+    base = f'{DERIVATIVES_DIR}/{source_hash[:2]}/{source_hash}'
+    variants = {}
+    with storage.open(name, 'rb') as f:
+        with Image.open(f) as original:
+            original = ImageOps.exif_transpose(original)
+            if original.mode not in ('RGB', 'RGBA'):
+                original = original.convert('RGBA' if 'A' in original.getbands() else 'RGB')
+            widths = [w for w in derivative_widths() if w <= original.width]
+            for fmt in derivative_formats() if widths else ():
+                variants[fmt] = {}
+                for width in widths:
+                    path = f'{base}/{width}.{fmt}'
+                    if not storage.exists(path):
+                        height = max(1, round(original.height * width / original.width))
+                        buffer = BytesIO()
+                        original.resize((width, height), Image.LANCZOS).save(buffer, format=fmt.upper(), quality=80)
+                        storage.save(path, ContentFile(buffer.getvalue()))
+                    variants[fmt][str(width)] = path
+    manifest = {'signature': signature, 'source_hash': source_hash, 'variants': variants}
+    path = _manifest_path(name)
+    if storage.exists(path):
+        storage.delete(path)
+    storage.save(path, ContentFile(json.dumps(manifest).encode('utf-8')))
+    caches['default'].set(_manifest_cache_key(name), manifest, timeout=None)
+    return manifest
+
+
+@job_handler('image_derivatives')
+def derivatives_job(name, model=None):
+    generate_derivatives(name)
+    if model:
+        # responses cached before the derivatives existed lack the srcset
+        from .signals import invalidate_for
+        invalidate_for(apps.get_model(model))
+
+
+def request_derivatives(fieldfile):
+    """Queue a derivatives job for an uploaded image.
+
+    Called when an image is saved (blog.signals) and by rehash_media;
+    images from before are backfilled with generate_image_derivatives.
+    """
+    enqueue_on_commit(
+        'image_derivatives',
+        {'name': fieldfile.name, 'model': fieldfile.field.model._meta.label},
+        key=f'image_derivatives:{fieldfile.name}',
+    )
+
+
+def get_srcset(fieldfile):
+    """Return {format: {width: url}} for an uploaded image, or {} if not ready.
+
+    Only reads the manifest: images are encoded by the worker, queued when
+    they are saved, and the caller falls back to the original URL until
+    then.
+    """
+    if not fieldfile or not getattr(settings, 'IMAGE_DERIVATIVES_ENABLED', True):
+        return {}
+    storage = fieldfile.storage
+    manifest = load_manifest(fieldfile.name, storage)
+    if manifest is None:
+        return {}
+    return {
+        fmt: {width: storage.url(path) for width, path in widths.items()}
+        for fmt, widths in manifest['variants'].items()
+    }
@@ -0,0 +1,112 @@
+import logging
+import traceback
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# kind -> callable(**payload); filled in with @job_handler
+_handlers = {}
+
+RETRY_BASE_SECONDS = 30
+STALE_AFTER = timedelta(minutes=15)
+
+
+def job_handler(kind):
+    """Register the function that runs jobs of `kind`.
+
+    The job's payload is passed as keyword arguments, so it must be JSON
+    serializable and the handler should be safe to run more than once.
+    """
+    def register(func):
+        _handlers[kind] = func
+        return func
+    return register
+
+
+def enqueue(kind, payload=None, key='', max_attempts=5, delay=None):
+    """Queue a job; returns it, or None when `key` already has an active job."""
+    if key and Job.objects.filter(idempotency_key=key, status__in=Job.ACTIVE_STATUSES).exists():
+        return None
+    run_after = timezone.now() + delay if delay else timezone.now()
+    try:
+        with transaction.atomic():
+            return Job.objects.create(
+                kind=kind,
+                payload=payload or {},
+                idempotency_key=key,
+                max_attempts=max_attempts,
+                run_after=run_after,
+            )
+    except IntegrityError:
+        # lost the race against another enqueue of the same key
+        return None
+
+
+def enqueue_on_commit(kind, payload=None, key='', **kwargs):
+    """enqueue() once the current transaction commits (immediately outside one)."""
+    transaction.on_commit(lambda: enqueue(kind, payload, key, **kwargs))
+
+
+def requeue_stale():
+    """Return jobs left `running` by a worker that died back to the queue."""
+    cutoff = timezone.now() - STALE_AFTER
+    return Job.objects.filter(status=Job.STATUS_RUNNING, started_at__lt=cutoff).update(status=Job.STATUS_PENDING)
+
+
+def claim_next():
+    """Atomically mark the next due job as running and return it (or None).
+
+    The claim is a conditional UPDATE, so several workers can share the
+    table without SELECT ... FOR UPDATE (which SQLite lacks).
+    """
+    now = timezone.now()
+    due = Job.objects.filter(status=Job.STATUS_PENDING, run_after__lte=now).order_by('run_after', 'pk')
+    for pk in due.values_list('pk', flat=True)[:10]:
+        claimed = Job.objects.filter(pk=pk, status=Job.STATUS_PENDING).update(
+            status=Job.STATUS_RUNNING, attempts=F('attempts') + 1, started_at=now,
+        )
+        if claimed:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def run_job(job):
+    """Run one claimed job and record the outcome, scheduling a retry on failure."""
+    try:
+        handler = _handlers.get(job.kind)
+        if handler is None:
+            raise LookupError(f'No handler registered for job kind {job.kind!r}')
+        handler(**job.payload)
+    except Exception:
+        logger.exception('Job %s failed (attempt %s/%s)', job, job.attempts, job.max_attempts)
+        job.last_error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            job.status = Job.STATUS_PENDING
+            job.run_after = timezone.now() + timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (job.attempts - 1))
+        else:
+            job.status = Job.STATUS_FAILED
+            job.finished_at = timezone.now()
+    else:
+        job.status = Job.STATUS_DONE
+        job.last_error = ''
+        job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'last_error', 'run_after', 'finished_at'])
+    return job
+
+
+def run_pending(limit=None):
+    """Run due jobs until the queue is drained (or `limit` is reached)."""
+    processed = 0
+    while limit is None or processed < limit:
+        job = claim_next()
+        if job is None:
+            break
+        run_job(job)
+        processed += 1
+    return processed
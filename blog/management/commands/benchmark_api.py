@@ -0,0 +1,191 @@
+import json
+import platform
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from statistics import mean, quantiles
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, Q
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+from rest_framework.views import APIView
+
+from blog.metrics import end_request, start_request
+from blog.models import Brochure, Post, Publication, Tag, WelcomePopup
+
+# measurements compared against a baseline; times get --tolerance and
+# --min-delta-ms of slack, query counts none
+TIMINGS = ('p50_ms', 'p95_ms')
+
+
+def scenarios():
+    """[(name, path)] of the endpoints the frontend hits hardest, for the data in the database."""
+    published = Post.objects.filter(status=Post.STATUS_PUBLISHED)
+    count = published.count()
+    if not count:
+        raise CommandError('No published posts; run generate_benchmark_data first')
+    last_page = -(-count // settings.REST_FRAMEWORK['PAGE_SIZE'])
+    tag = (
+        Tag.objects.annotate(used=Count('posts', filter=Q(posts__status=Post.STATUS_PUBLISHED)))
+        .filter(used__gt=0).order_by('-used', 'pk').first()
+    )
+    post = published.order_by('-created_at', '-pk').first()
+    found = [
+        ('posts-page-1', '/api/posts/'),
+        ('posts-page-last', f'/api/posts/?page={last_page}'),
+        ('posts-by-tag', f'/api/posts/?tag={tag.slug}' if tag else None),
+        ('post-detail', f'/api/posts/{post.pk}/'),
+        ('publications', '/api/publications/'),
+        ('brochures', '/api/brochures/'),
+        ('active-popup', '/api/welcome-popups/?is_active=true'),
+        ('active-popup-single', '/api/welcome-popups/active/'),
+    ]
+    return [(name, path) for name, path in found if path]
+
+
+def percentiles(samples):
+    cuts = quantiles(samples, n=100, method='inclusive') if len(samples) > 1 else samples * 99
+    return cuts[49], cuts[94]
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """Messages for every scenario that got worse than in `baseline`."""
+    regressions = []
+    for name, old in baseline.get('scenarios', {}).items():
+        new = results['scenarios'].get(name)
+        if new is None:
+            continue
+        for key in TIMINGS:
+            if new[key] > old[key] * (1 + tolerance) and new[key] - old[key] > min_delta_ms:
+                regressions.append(f'{name}: {key} {old[key]:.2f} -> {new[key]:.2f}')
+        if new['queries'] > old['queries']:
+            regressions.append(f"{name}: queries {old['queries']} -> {new['queries']}")
+        if new['bytes'] > old['bytes'] * (1 + tolerance):
+            regressions.append(f"{name}: bytes {old['bytes']} -> {new['bytes']}")
+    return regressions
+
+
+@contextmanager
+def unthrottled():
+    # the run would otherwise be cut short by the anon rate limit
+    throttle_classes = APIView.throttle_classes
+    APIView.throttle_classes = ()
+    try:
+        yield
+    finally:
+        APIView.throttle_classes = throttle_classes
+
+
+class Command(BaseCommand):
+    help = 'Time the hot API endpoints in-process and compare the results with a saved baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50, help='Timed requests per scenario')
+        parser.add_argument('--warmup', type=int, default=5, help='Untimed requests per scenario before measuring')
+        parser.add_argument('--scenario', action='append', dest='only', help='Only run this scenario (repeatable)')
+        parser.add_argument('--cache', action='store_true', help='Keep the API response cache on (measures cache hits)')
+        parser.add_argument('--output', default='benchmark.json', help='Where to write the results as JSON')
+        parser.add_argument('--baseline', help='Results JSON of an earlier run; exit with an error on regressions')
+        parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed relative increase of latency and bytes')
+        parser.add_argument('--min-delta-ms', type=float, default=1.0, help='Latency increases below this never count')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be at least 1')
+        baseline = None
+        if options['baseline']:
+            try:
+                baseline = json.loads(Path(options['baseline']).read_text())
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Cannot read baseline {options['baseline']}: {exc}")
+
+        selected = scenarios()
+        if options['only']:
+            unknown = set(options['only']) - {name for name, _ in selected}
+            if unknown:
+                raise CommandError(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+            selected = [(name, path) for name, path in selected if name in options['only']]
+
+        # DEBUG would keep every query in memory; the metrics middleware is
+        # off because run() collects the same numbers itself
+        overrides = override_settings(
+            DEBUG=False,
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            API_CACHE_ENABLED=options['cache'],
+            METRICS_ENABLED=False,
+        )
+        client = APIClient(HTTP_ACCEPT='application/json')
+        results = {'meta': self.meta(options), 'scenarios': {}}
+        with overrides, unthrottled():
+            for name, path in selected:
+                results['scenarios'][name] = self.run(client, path, options['warmup'], options['iterations'])
+                self.report(name, results['scenarios'][name])
+
+        Path(options['output']).write_text(json.dumps(results, indent=2) + '\n')
+        self.stdout.write(f"Results written to {options['output']}")
+
+        if baseline is not None:
+            regressions = compare(results, baseline, options['tolerance'], options['min_delta_ms'])
+            if regressions:
+                raise CommandError('Regressions against {}:\n  {}'.format(options['baseline'], '\n  '.join(regressions)))
+            self.stdout.write(self.style.SUCCESS(f"No regressions against {options['baseline']}"))
+
+    def meta(self, options):
+        return {
+            'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'cache': options['cache'],
+            'iterations': options['iterations'],
+            'rows': {
+                'published_posts': Post.objects.filter(status=Post.STATUS_PUBLISHED).count(),
+                'tags': Tag.objects.count(),
+                'publications': Publication.objects.count(),
+                'brochures': Brochure.objects.count(),
+                'popups': WelcomePopup.objects.count(),
+            },
+        }
+
+    def run(self, client, path, warmup, iterations):
+        for _ in range(warmup):
+            client.get(path)
+        latencies, db_times, serializer_times = [], [], []
+        for _ in range(iterations):
+            metrics, token = start_request()
+            started = time.perf_counter()
+            try:
+                with connection.execute_wrapper(metrics):
+                    response = client.get(path)
+            finally:
+                latencies.append((time.perf_counter() - started) * 1000)
+                end_request(token)
+            # 204: no active popup
+            if response.status_code not in (200, 204):
+                raise CommandError(f'GET {path} answered {response.status_code}')
+            db_times.append(metrics.db_time * 1000)
+            serializer_times.append(metrics.serializer_time * 1000)
+        p50, p95 = percentiles(latencies)
+        return {
+            'path': path,
+            'p50_ms': round(p50, 3),
+            'p95_ms': round(p95, 3),
+            'mean_ms': round(mean(latencies), 3),
+            'db_ms': round(mean(db_times), 3),
+            'serializer_ms': round(mean(serializer_times), 3),
+            # the same for every request of a scenario; the last one's
+            'queries': metrics.queries,
+            'bytes': len(response.content),
+        }
+
+    def report(self, name, result):
+        self.stdout.write(
+            f"{name:>20}: p50={result['p50_ms']:.2f}ms  p95={result['p95_ms']:.2f}ms  "
+            f"queries={result['queries']}  bytes={result['bytes']}  "
+            f"(db {result['db_ms']:.2f}ms, serializer {result['serializer_ms']:.2f}ms)"
+        )
@@ -0,0 +1,148 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.client import HTTPConnection
+from statistics import quantiles
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# (label, command template, extra environment); `{port}` and `{workers}` are
+# filled in, so both servers run the same number of worker processes
+STACKS = [
+    ('sync', [sys.executable, '-m', 'gunicorn', 'blog_project.wsgi:application', '--bind', '127.0.0.1:{port}', '--workers', '{workers}'], {'API_ASYNC_READS': 'False'}),
+    ('async', [sys.executable, '-m', 'uvicorn', 'blog_project.asgi:application', '--port', '{port}', '--workers', '{workers}', '--no-access-log'], {'API_ASYNC_READS': 'True'}),
+]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(server, port, log, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and server.poll() is None:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    log.seek(0)
+    raise CommandError(f'{server.args[2]} did not start on port {port}:\n{log.read().decode(errors="replace")[-2000:]}')
+
+
+def hammer(port, paths, stop_at, latencies, errors):
+    """One client: GET `paths` round-robin on a keep-alive connection until `stop_at`."""
+    conn = HTTPConnection('127.0.0.1', port, timeout=30)
+    i = 0
+    while time.monotonic() < stop_at:
+        path = paths[i % len(paths)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            conn.request('GET', path, headers={'Accept': 'application/json'})
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+                continue
+            if response.getheader('Connection', '').lower() == 'close':
+                conn.close()
+        except OSError as exc:
+            errors.append(type(exc).__name__)
+            conn.close()
+            continue
+        latencies.append(time.perf_counter() - started)
+    conn.close()
+
+
+class Command(BaseCommand):
+    help = 'Compare read throughput of the sync (Gunicorn/WSGI) and async (Uvicorn/ASGI) stacks at equal worker count'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Server worker processes for each stack')
+        parser.add_argument('--concurrency', type=int, default=16, help='Simultaneous client connections')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds of load per stack')
+        parser.add_argument('--warmup', type=float, default=2.0, help='Seconds of load before measuring')
+        parser.add_argument('--path', action='append', dest='paths', help='Endpoint to request (repeatable)')
+        parser.add_argument('--cache', action='store_true', help='Keep the API response cache on (measures cache hits)')
+        parser.add_argument('--stack', action='append', choices=[label for label, _, _ in STACKS], help='Only run these stacks')
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or ['/api/posts/', '/api/posts/?page=2', '/api/publications/', '/api/brochures/', '/api/welcome-popups/']
+        stacks = [stack for stack in STACKS if not options['stack'] or stack[0] in options['stack']]
+        env = dict(
+            os.environ,
+            DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'blog_project.settings'),
+            DJANGO_DEBUG='False',
+            DJANGO_ALLOWED_HOSTS='127.0.0.1,localhost',
+            API_CACHE_ENABLED=str(options['cache']),
+            # rate limits would turn most of the run into 429s
+            API_THROTTLE_ANON='1000000/second',
+            API_THROTTLE_USER='1000000/second',
+        )
+        self.stdout.write(
+            f"workers={options['workers']} concurrency={options['concurrency']} duration={options['duration']}s "
+            f"cache={'on' if options['cache'] else 'off'} database={settings.DATABASES['default']['ENGINE']}"
+        )
+        results = {}
+        for label, template, extra_env in stacks:
+            results[label] = self.run_stack(template, dict(env, **extra_env), paths, options)
+            self.report(label, results[label])
+        if 'sync' in results and 'async' in results and results['sync']['rps']:
+            ratio = results['async']['rps'] / results['sync']['rps']
+            self.stdout.write(self.style.SUCCESS(f'async/sync throughput: {ratio:.2f}x'))
+
+    def run_stack(self, template, env, paths, options):
+        port = free_port()
+        command = [part.format(port=port, workers=options['workers']) for part in template]
+        log = tempfile.TemporaryFile()
+        server = subprocess.Popen(command, env=env, cwd=settings.BASE_DIR, stdout=log, stderr=subprocess.STDOUT)
+        try:
+            wait_until_up(server, port, log)
+            if options['warmup'] > 0:
+                self.load(port, paths, options['concurrency'], options['warmup'])
+            return self.load(port, paths, options['concurrency'], options['duration'])
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+            log.close()
+
+    def load(self, port, paths, concurrency, duration):
+        latencies, errors = [], []
+        stop_at = time.monotonic() + duration
+        clients = [threading.Thread(target=hammer, args=(port, paths, stop_at, latencies, errors)) for _ in range(concurrency)]
+        started = time.monotonic()
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        elapsed = time.monotonic() - started
+        cuts = quantiles(latencies, n=100) if len(latencies) > 1 else [0.0] * 99
+        return {
+            'requests': len(latencies),
+            'errors': len(errors),
+            'error_kinds': sorted({str(e) for e in errors}),
+            'rps': len(latencies) / elapsed,
+            'p50_ms': cuts[49] * 1000,
+            'p95_ms': cuts[94] * 1000,
+            'p99_ms': cuts[98] * 1000,
+        }
+
+    def report(self, label, result):
+        self.stdout.write(
+            f"{label:>5}: {result['rps']:8.1f} req/s  p50={result['p50_ms']:.1f}ms  p95={result['p95_ms']:.1f}ms  "
+            f"p99={result['p99_ms']:.1f}ms  requests={result['requests']} errors={result['errors']}"
+        )
+        if result['errors']:
+            self.stdout.write(self.style.WARNING(f"  errors: {json.dumps(result['error_kinds'])}"))
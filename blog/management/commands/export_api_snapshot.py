@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from blog.compression import brotli, brotli_bytes, gzip_bytes
+from blog.models import Post, WelcomePopup
+from blog.views import PostViewSet, TagViewSet, PublicationViewSet, BrochureViewSet, WelcomePopupViewSet
+
+MANIFEST = '.snapshot-manifest.json'
+
+
+def snapshot_path(url):
+    """Map an API URL to the file Nginx serves for it.
+
+    `/api/posts/` -> `api/posts/index.json`, `/api/posts/?page=2` ->
+    `api/posts/index.page=2.json` (see the Nginx snippet in README.md).
+    """
+    parts = urlsplit(url)
+    name = f'index.{parts.query}.json' if parts.query else 'index.json'
+    return parts.path.strip('/') + '/' + name
+
+
+class Command(BaseCommand):
+    help = 'Render the public API to precompressed static JSON files that Nginx can serve directly'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=settings.API_SNAPSHOT_DIR, help='Directory to write the snapshot to')
+        parser.add_argument('--base-url', default=settings.API_SNAPSHOT_BASE_URL, help='Public origin used in pagination links, e.g. https://api.iraya.com')
+        parser.add_argument('--incremental', action='store_true', help='Only rewrite files whose content changed since the last export')
+
+    def handle(self, *args, **options):
+        origin = urlsplit(options['base_url'])
+        if not origin.hostname:
+            raise CommandError(f"--base-url must be an absolute URL, got {options['base_url']!r}")
+        self.secure = origin.scheme == 'https'
+        self.factory = RequestFactory(
+            SERVER_NAME=origin.hostname,
+            SERVER_PORT=str(origin.port or (443 if self.secure else 80)),
+        )
+        self.output = Path(options['output'])
+        self.output.mkdir(parents=True, exist_ok=True)
+
+        manifest_path = self.output / MANIFEST
+        previous = json.loads(manifest_path.read_text()) if manifest_path.exists() else {}
+        current = {}
+        written = 0
+        for url, body in self.render_all():
+            path = snapshot_path(url)
+            digest = hashlib.sha256(body).hexdigest()
+            current[path] = digest
+            if options['incremental'] and previous.get(path) == digest and (self.output / path).exists():
+                continue
+            self.write(path, body)
+            written += 1
+
+        removed = 0
+        for path in set(previous) - set(current):
+            for suffix in ('', '.gz', '.br'):
+                target = self.output / (path + suffix)
+                if target.exists():
+                    target.unlink()
+            removed += 1
+        self.write(MANIFEST, json.dumps(current, indent=2, sort_keys=True).encode('utf-8'), compress=False)
+
+        if brotli is None:
+            self.stdout.write(self.style.WARNING('Brotli is not installed; only .gz files were written'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Snapshot in {self.output}: files={len(current)} written={written} unchanged={len(current) - written} removed={removed}'
+        ))
+
+    def render_all(self):
+        """Yield (url, json bytes) for every public endpoint."""
+        yield from self.render_pages('/api/posts/', PostViewSet)
+        for pk, slug in Post.objects.filter(status=Post.STATUS_PUBLISHED).values_list('pk', 'slug'):
+            yield self.render(f'/api/posts/{pk}/', PostViewSet, 'retrieve', pk=str(pk))
+            yield self.render(f'/api/posts/by-slug/{slug}/', PostViewSet, 'by_slug', slug=slug)
+        yield from self.render_pages('/api/tags/', TagViewSet)
+        yield self.render('/api/publications/', PublicationViewSet)
+        yield self.render('/api/brochures/', BrochureViewSet)
+        yield self.render('/api/welcome-popups/', WelcomePopupViewSet)
+        yield self.render('/api/welcome-popups/?is_active=true', WelcomePopupViewSet)
+        if WelcomePopup.objects.filter(is_active=True).exists():
+            # the 204 for no active popup is left to Django
+            yield self.render('/api/welcome-popups/active/', WelcomePopupViewSet, 'active')
+
+    def render_pages(self, url, viewset):
+        page = 1
+        while True:
+            page_url = url if page == 1 else f'{url}?page={page}'
+            page_url, body = self.render(page_url, viewset)
+            yield page_url, body
+            if not json.loads(body).get('next'):
+                return
+            page += 1
+
+    def render(self, url, viewset, action='list', **kwargs):
+        # the export makes hundreds of requests: no throttling
+        view = viewset.as_view({'get': action}, throttle_classes=[])
+        response = view(self.factory.get(url, secure=self.secure, HTTP_ACCEPT='application/json'), **kwargs)
+        if hasattr(response, 'render'):
+            # response cache hits come back already rendered
+            response.render()
+        if response.status_code != 200:
+            raise CommandError(f'{url} returned {response.status_code}')
+        return url, response.content
+
+    def write(self, path, body, compress=True):
+        target = self.output / path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        files = [(target, body)]
+        if compress:
+            files.append((target.with_name(target.name + '.gz'), gzip_bytes(body)))
+            compressed = brotli_bytes(body)
+            if compressed is not None:
+                files.append((target.with_name(target.name + '.br'), compressed))
+        for name, data in files:
+            # write then rename, so Nginx never serves a half-written file
+            fd, tmp = tempfile.mkstemp(dir=name.parent, prefix='.tmp-')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, name)
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from blog.pdfs import pdf_fields, update_pdf_info
+
+
+class Command(BaseCommand):
+    help = 'Extract page count, size, title and a first-page preview for every Publication/Brochure PDF'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Re-extract even when the file has not changed')
+
+    def handle(self, *args, **options):
+        updated = 0
+        failed = 0
+        for model, field in pdf_fields().items():
+            for obj in model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True}):
+                try:
+                    if update_pdf_info(obj, force=options['force']):
+                        updated += 1
+                        self.stdout.write(f'  {model.__name__} {obj.pk}: {getattr(obj, field).name}')
+                except Exception as e:
+                    failed += 1
+                    self.stdout.write(self.style.WARNING(f'  {model.__name__} {obj.pk}: {e}'))
+        self.stdout.write(self.style.SUCCESS(f'PDF metadata: updated={updated} failed={failed}'))
@@ -0,0 +1,147 @@
+import random
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from blog.models import Author, Brochure, Comment, Post, PostImage, Publication, Tag, WelcomePopup
+from blog.search import reindex_posts
+from blog.signals import invalidate_for
+
+# everything generated here is recognisable by these, so --clear only ever
+# removes benchmark rows
+EMAIL_DOMAIN = 'bench.example.com'
+PREFIX = 'Bench'
+
+WORDS = (
+    'seismic reservoir basin well core sample porosity permeability facies fault horizon '
+    'interpretation dataset geology survey pipeline cloud platform workflow model analysis '
+    'exploration field report digital archive search document image log study team energy'
+).split()
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with a reproducible synthetic data set for benchmark_api'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--authors', type=int, default=5, help='Authors the posts are spread over')
+        parser.add_argument('--posts', type=int, default=500, help='Posts to create')
+        parser.add_argument('--tags', type=int, default=20, help='Tags to create')
+        parser.add_argument('--tags-per-post', type=int, default=3, help='Tags linked to each post')
+        parser.add_argument('--comments-per-post', type=int, default=5, help='Comments per post (about 10%% unapproved)')
+        parser.add_argument('--images-per-post', type=int, default=4, help='Gallery images per post')
+        parser.add_argument('--words', type=int, default=600, help='Approximate words of markdown per post')
+        parser.add_argument('--drafts', type=float, default=0.1, help='Share of posts left as drafts')
+        parser.add_argument('--publications', type=int, default=50, help='Publications to create')
+        parser.add_argument('--brochures', type=int, default=10, help='Brochures to create')
+        parser.add_argument('--popups', type=int, default=5, help='Welcome popups; the newest one is active')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed gives the same data')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows per bulk INSERT')
+        parser.add_argument('--clear', action='store_true', help='Delete previously generated benchmark data first')
+
+    def handle(self, *args, **options):
+        if options['authors'] < 1 and options['posts']:
+            raise CommandError('--posts needs at least one author')
+        self.random = random.Random(options['seed'])
+        if options['clear']:
+            self.clear()
+        elif Author.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}').exists():
+            raise CommandError('Benchmark data already exists; pass --clear to replace it')
+
+        with transaction.atomic():
+            authors = [
+                Author.objects.create(name=f'{PREFIX} Author {i}', email=f'author-{i}@{EMAIL_DOMAIN}', bio=self.sentence(12))
+                for i in range(options['authors'])
+            ]
+            tags = [Tag.objects.create(name=f'{PREFIX} {WORDS[i % len(WORDS)].title()} {i}') for i in range(options['tags'])]
+            posts = self.create_posts(authors, tags, options)
+            for i in range(options['publications']):
+                Publication.objects.create(title=f'{PREFIX} Publication {i}', sub_text=self.sentence(8), content=self.paragraph(60))
+            for i in range(options['brochures']):
+                Brochure.objects.create(title=f'{PREFIX} Brochure {i}', text_content=self.paragraph(40))
+            for i in range(options['popups']):
+                # saved oldest first, so the last one stays the active popup
+                WelcomePopup.objects.create(title=f'{PREFIX} Popup {i}', is_active=True)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(authors)} authors, {len(posts)} posts, {len(tags)} tags, "
+            f"{options['publications']} publications, {options['brochures']} brochures, {options['popups']} popups "
+            f"(seed {options['seed']})"
+        ))
+
+    def clear(self):
+        with transaction.atomic():
+            # posts, comments, gallery images and tag links go with their author
+            Author.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}').delete()
+            Tag.objects.filter(name__startswith=f'{PREFIX} ').delete()
+            for model in (Publication, Brochure, WelcomePopup):
+                model.objects.filter(title__startswith=f'{PREFIX} ').delete()
+
+    def sentence(self, words):
+        return ' '.join(self.random.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+    def paragraph(self, words):
+        return ' '.join(self.sentence(self.random.randint(8, 16)) for _ in range(max(1, words // 12)))
+
+    def markdown(self, words):
+        sections = []
+        while words > 0:
+            size = min(words, self.random.randint(80, 160))
+            sections.append(f'## {self.sentence(4)[:-1]}\n\n{self.paragraph(size)}')
+            words -= size
+        return '\n\n'.join(sections)
+
+    def create_posts(self, authors, tags, options):
+        """Posts through the bulk path import_md_posts --bulk uses.
+
+        Post.save() is skipped, so the derived fields are filled in here and
+        the cache and search index are refreshed at the end.
+        """
+        now = timezone.now()
+        posts = []
+        for i in range(options['posts']):
+            title = f'{PREFIX} post {i}: {self.sentence(5)[:-1]}'
+            post = Post(
+                author=self.random.choice(authors),
+                title=title,
+                slug=f'{slugify(title)[:240]}-{i}',
+                content=self.markdown(options['words']),
+                status=Post.STATUS_DRAFT if self.random.random() < options['drafts'] else Post.STATUS_PUBLISHED,
+                # spread over the last few years so pages look like real ones
+                published_at=now - timedelta(hours=i * 7),
+            )
+            post.apply_derived_fields()
+            post.render_content()
+            posts.append(post)
+        batch_size = options['batch_size']
+        Post.objects.bulk_create(posts, batch_size=batch_size)
+        # created_at (auto_now_add) orders lists and cursors and updated_at
+        # feeds Last-Modified; bulk_create stamped both with the current
+        # time, so they are moved back to match published_at here
+        for post in posts:
+            post.created_at = post.updated_at = post.published_at
+        Post.objects.bulk_update(posts, ['created_at', 'updated_at'], batch_size=batch_size)
+
+        Through = Post.tags.through
+        links, comments, images = [], [], []
+        for i, post in enumerate(posts):
+            for tag in self.random.sample(tags, min(len(tags), options['tags_per_post'])):
+                links.append(Through(post_id=post.pk, tag_id=tag.pk))
+            for n in range(options['comments_per_post']):
+                comments.append(Comment(
+                    post=post, author_name=f'Reader {n}', body=self.sentence(self.random.randint(6, 30)),
+                    approved=self.random.random() > 0.1,
+                ))
+            for n in range(options['images_per_post']):
+                # names only, like content-addressed uploads; no files are written
+                images.append(PostImage(post=post, image=f'posts/gallery/bench-{i}-{n}.webp'))
+        Through.objects.bulk_create(links, batch_size=batch_size)
+        Comment.objects.bulk_create(comments, batch_size=batch_size)
+        PostImage.objects.bulk_create(images, batch_size=batch_size)
+
+        # bulk writes send no signals
+        invalidate_for(Post)
+        reindex_posts([post.pk for post in posts])
+        return posts
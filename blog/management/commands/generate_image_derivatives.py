@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from blog.images import image_fields, generate_derivatives, load_manifest
+from blog.signals import invalidate_for
+
+
+class Command(BaseCommand):
+    help = 'Generate resized WebP/AVIF derivatives for every uploaded image (skips ones already up to date)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Rebuild manifests even when they look current')
+
+    def handle(self, *args, **options):
+        generated = 0
+        skipped = 0
+        failed = 0
+        for model, fields in image_fields().items():
+            touched = False
+            for obj in model.objects.all().only('pk', *fields):
+                for field in fields:
+                    fieldfile = getattr(obj, field)
+                    if not fieldfile:
+                        continue
+                    if not options['force'] and load_manifest(fieldfile.name, fieldfile.storage, verify=True) is not None:
+                        skipped += 1
+                        continue
+                    try:
+                        # derivatives are written through default_storage, which
+                        # keeps their own content-hashed paths
+                        generate_derivatives(fieldfile.name)
+                        generated += 1
+                        touched = True
+                    except Exception as e:
+                        failed += 1
+                        self.stdout.write(self.style.WARNING(f'  {model.__name__} {obj.pk} {fieldfile.name}: {e}'))
+            if touched:
+                invalidate_for(model)
+        self.stdout.write(self.style.SUCCESS(f'Derivatives: generated={generated} skipped={skipped} failed={failed}'))
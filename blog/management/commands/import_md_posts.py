@@ -1,7 +1,14 @@
 from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from datetime import datetime, time
 from pathlib import Path
 from blog.models import Post, Author, Tag
+from blog.rendering import content_hash
+from blog.search import reindex_posts
+from blog.signals import invalidate_for
 from django.utils.text import slugify
 import re
 
@@ -12,6 +19,8 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument('--author', type=int, default=1, help='Author ID to assign to imported posts')
         parser.add_argument('--path', type=str, default=None, help='Path to content/blog folder (optional)')
+        parser.add_argument('--bulk', action='store_true', help='Parse everything first and write with bulk queries in a single transaction')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows per bulk INSERT/UPDATE in --bulk mode')
 
     def _parse_frontmatter(self, text):
         """Return (meta_dict, body_text) from a markdown string.
@@ -60,6 +69,13 @@ class Command(BaseCommand):
             self.stdout.write(self.style.WARNING('No markdown files found in %s' % content_dir))
             return
 
+        if options.get('bulk'):
+            created, updated, unchanged = self._bulk_import(files, author, options.get('batch_size'))
+            self.stdout.write(self.style.SUCCESS(
+                f'Imported {len(files)} files: created={created} updated={updated} unchanged={unchanged}'
+            ))
+            return
+
         created = 0
         updated = 0
 
@@ -107,4 +123,125 @@ class Command(BaseCommand):
             else:
                 updated += 1
 
-        self.stdout.write(self.style.SUCCESS(f'Imported {len(files)} files: created={created} updated={updated}'))
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS(f'Imported {len(files)} files: created={created} updated={updated}'))
+
+    def _parse_file(self, path):
+        """Return the Post field values and tag names described by one file."""
+        meta, body = self._parse_frontmatter(path.read_text(encoding='utf-8'))
+        try:
+            published_at = self._parse_date(meta.get('date'))
+        except ValueError:
+            # well-formed but impossible, e.g. 2024-13-45
+            self.stdout.write(self.style.WARNING(f"Invalid date {meta.get('date')!r} in {path.name}; importing it without one"))
+            published_at = None
+        fields = {
+            'title': meta.get('title') or meta.get('Title') or path.stem,
+            'content': body,
+            'status': (meta.get('status') or 'published').lower(),
+            'published_at': published_at,
+        }
+        tags_raw = meta.get('tags') or meta.get('Tags')
+        tag_names = [t.strip() for t in re.split('[,;]', tags_raw) if t.strip()] if tags_raw else None
+        return meta.get('slug') or slugify(path.stem), fields, tag_names
+
+    def _parse_date(self, value):
+        if not value:
+            return None
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            if day is None:
+                return None
+            parsed = datetime.combine(day, time.min)
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
+
+    def _is_unchanged(self, post, fields, tag_names, author):
+        return (
+            post.content_hash == content_hash(fields['content'])
+            and post.author_id == author.pk
+            and post.title == fields['title']
+            and post.status == fields['status']
+            and (fields['published_at'] is None or post.published_at == fields['published_at'])
+            and (tag_names is None or {t.name for t in post.tags.all()} == set(tag_names))
+        )
+
+    def _bulk_import(self, files, author, batch_size):
+        """Import every file with a fixed number of queries per batch.
+
+        Existing posts and tags are preloaded in one query each, new and
+        changed posts are written with bulk_create/bulk_update and tag links
+        go straight into the through table, all inside one transaction.
+        Files whose content hash and metadata match the stored post are
+        skipped entirely.
+        """
+        parsed = {}
+        for f in files:
+            slug, fields, tag_names = self._parse_file(f)
+            parsed[slug] = (fields, tag_names)
+
+        existing = {
+            p.slug: p
+            for p in Post.objects.filter(slug__in=parsed).defer('content_html').prefetch_related('tags')
+        }
+        tags = {t.name: t for t in Tag.objects.all()}
+
+        to_create, to_update, tag_links = [], [], {}
+        unchanged = 0
+        now = timezone.now()
+        for slug, (fields, tag_names) in parsed.items():
+            post = existing.get(slug)
+            if post is not None and self._is_unchanged(post, fields, tag_names, author):
+                unchanged += 1
+                continue
+            if post is None:
+                post = Post(slug=slug)
+                to_create.append(post)
+            else:
+                to_update.append(post)
+            post.author = author
+            post.updated_at = now
+            for name, value in fields.items():
+                if name != 'published_at' or value is not None:
+                    setattr(post, name, value)
+            post.apply_derived_fields()
+            post.render_content()
+            if tag_names is not None:
+                tag_links[slug] = tag_names
+
+        missing_tags = {name for names in tag_links.values() for name in names} - set(tags)
+        update_fields = [
+            'author', 'title', 'content', 'status', 'published', 'published_at', 'updated_at',
+            'content_html', 'excerpt', 'word_count', 'reading_time', 'content_hash',
+        ]
+        with transaction.atomic():
+            if missing_tags:
+                Tag.objects.bulk_create([Tag(name=n, slug=slugify(n)[:64]) for n in sorted(missing_tags)], batch_size=batch_size)
+                tags = {t.name: t for t in Tag.objects.all()}
+            Post.objects.bulk_create(to_create, batch_size=batch_size)
+            Post.objects.bulk_update(to_update, update_fields, batch_size=batch_size)
+
+            if tag_links:
+                post_ids = dict(Post.objects.filter(slug__in=tag_links).values_list('slug', 'pk'))
+                Through = Post.tags.through
+                Through.objects.filter(post_id__in=post_ids.values()).delete()
+                Through.objects.bulk_create(
+                    [
+                        Through(post_id=post_ids[slug], tag_id=tags[name].pk)
+                        for slug, names in tag_links.items()
+                        for name in dict.fromkeys(names)
+                    ],
+                    batch_size=batch_size,
+                )
+
+            # bulk writes send no signals, so drop the cached API responses
+            # and refresh the search index here
+            if missing_tags:
+                invalidate_for(Tag)
+            if to_create or to_update:
+                invalidate_for(Post)
+                changed = [p.slug for p in to_create + to_update]
+                reindex_posts(Post.objects.filter(slug__in=changed).values_list('pk', flat=True))
+
+        return len(to_create), len(to_update), unchanged
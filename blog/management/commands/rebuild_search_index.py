@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from blog.models import Post, Publication, Brochure, SearchDocument
+from blog.search import FTS_TABLE, document_values, search_kind
+from blog.signals import invalidate_for
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the /api/search/ documents (and the SQLite FTS5 index) from posts, publications and brochures'
+
+    def handle(self, *args, **options):
+        sources = [
+            Post.objects.prefetch_related('tags'),
+            Publication.objects.all(),
+            Brochure.objects.all(),
+        ]
+        with transaction.atomic():
+            SearchDocument.objects.all().delete()
+            SearchDocument.objects.bulk_create(
+                [
+                    SearchDocument(kind=search_kind(qs.model), object_id=obj.pk, **document_values(search_kind(qs.model), obj))
+                    for qs in sources
+                    for obj in qs
+                ],
+                batch_size=200,
+            )
+            if connection.vendor == 'sqlite':
+                # also repairs the index if the triggers were lost to a table rebuild
+                with connection.cursor() as cursor:
+                    cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+            invalidate_for(Post)
+        self.stdout.write(self.style.SUCCESS(f'Indexed {SearchDocument.objects.count()} documents'))
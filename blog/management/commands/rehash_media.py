@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+from blog.images import image_fields, request_derivatives
+from blog.pdfs import pdf_fields
+from blog.signals import invalidate_for
+from blog.storage import content_addressed_fields, delete_unreferenced, is_content_addressed
+
+
+class Command(BaseCommand):
+    help = 'Move existing uploads to content-hashed paths (cas/...) and relink the rows that point at them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report what would move without writing anything')
+        parser.add_argument('--delete-originals', action='store_true', help='Delete the old files once no row refers to them')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        relinked = 0
+        missing = 0
+        old_names = set()
+        for model, field in content_addressed_fields():
+            touched = False
+            rows = model.objects.exclude(**{field.name: ''}).exclude(**{f'{field.name}__isnull': True})
+            for obj in rows:
+                fieldfile = getattr(obj, field.name)
+                old = fieldfile.name
+                if is_content_addressed(old):
+                    continue
+                if not fieldfile.storage.exists(old):
+                    missing += 1
+                    self.stdout.write(self.style.WARNING(f'  {model.__name__} {obj.pk}: missing {old}'))
+                    continue
+                if dry_run:
+                    self.stdout.write(f'  {model.__name__} {obj.pk}: {old}')
+                    relinked += 1
+                    continue
+
+                with fieldfile.storage.open(old, 'rb') as f:
+                    new = fieldfile.storage.save(old, f)
+                values = {field.name: new}
+                if pdf_fields().get(model) == field.name and obj.pdf_analyzed_name == old:
+                    # same bytes: keep the extracted PDF metadata
+                    values['pdf_analyzed_name'] = new
+                # update() so no signals re-queue work for every row
+                model.objects.filter(pk=obj.pk).update(**values)
+                if field.name in image_fields().get(model, ()):
+                    fieldfile.name = new
+                    request_derivatives(fieldfile)
+                old_names.add(old)
+                relinked += 1
+                touched = True
+                self.stdout.write(f'  {model.__name__} {obj.pk}: {old} -> {new}')
+            if touched:
+                invalidate_for(model)
+
+        deleted = 0
+        if options['delete_originals'] and not dry_run:
+            deleted = delete_unreferenced(old_names)
+        self.stdout.write(self.style.SUCCESS(f'Media: relinked={relinked} missing={missing} deleted={deleted}'))
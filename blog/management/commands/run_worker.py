@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from blog.jobs import requeue_stale, run_pending
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (image derivatives, etc.) from the blog_job table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the queue once and exit')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Seconds to wait when the queue is empty')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Worker started')
+        while True:
+            close_old_connections()
+            requeue_stale()
+            processed = run_pending()
+            if processed:
+                self.stdout.write(f'Processed {processed} job(s)')
+            if options['once']:
+                break
+            if not processed:
+                time.sleep(options['sleep'])
@@ -1,16 +1,87 @@
-import os
-import glob
 import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import islice
 from pathlib import Path
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from django.utils import timezone
 from django.utils.text import slugify
-from django.core.files import File
+from django.core.files.base import ContentFile
+from blog.images import request_derivatives
 from blog.models import Post, Author, Tag
+from blog.search import reindex_posts
+from blog.signals import invalidate_for
+
+
+def read_markdown_post(file_path, assets_dir):
+    """Read, parse and load the image for one markdown file.
+
+    Runs inside the worker pool, so it must not touch the database. Returns a
+    dict with the parsed fields, the image bytes (if any) and the messages to
+    report for this file.
+    """
+    result = {'file': file_path, 'messages': [], 'error': None}
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+
+        # Parse Frontmatter
+        # Very customized simple parser
+        frontmatter = {}
+        body = content
+
+        if content.startswith('---'):
+            parts = re.split(r'^---$', content, maxsplit=2, flags=re.MULTILINE)
+            if len(parts) >= 3:
+                fm_text = parts[1]
+                body = parts[2].strip()
+
+                # Parse lines
+                for line in fm_text.splitlines():
+                    if ':' in line:
+                        key, val = line.split(':', 1)
+                        frontmatter[key.strip()] = val.strip().strip('"\'')
+        else:
+            result['messages'].append(('WARNING', f"No frontmatter in {file_path.name}"))
+
+        # Extract Fields
+        title = frontmatter.get('title', file_path.stem)
+        result.update({
+            'title': title,
+            'slug': frontmatter.get('slug', slugify(title)),
+            'body': body,
+            'date_str': frontmatter.get('date'),
+            'category': frontmatter.get('category'),
+            'image_name': None,
+            'image_data': None,
+        })
+
+        # Load the image here so the writer only has to store it
+        image_path = frontmatter.get('image') or frontmatter.get('img')
+        if image_path:
+            # image_path usually looks like "/assets/blog/Filename.webp"
+            # We want just "Filename.webp"
+            filename = Path(image_path).name
+            local_img_path = assets_dir / filename
+            if local_img_path.exists():
+                result['image_name'] = filename
+                result['image_data'] = local_img_path.read_bytes()
+            else:
+                result['messages'].append(('WARNING', f"  Image definition found but file missing: {local_img_path}"))
+    except Exception as e:
+        result['error'] = e
+    return result
+
 
 class Command(BaseCommand):
     help = 'Seed database with blog posts from local markdown files'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help='Threads used to read and parse files and images')
+        parser.add_argument('--batch-size', type=int, default=50, help='Posts written per database transaction')
+
     def handle(self, *args, **options):
         # Define path to local markdown content
         # Update this path if necessary to match your project structure
@@ -18,9 +89,9 @@ class Command(BaseCommand):
         base_dir = Path(__file__).resolve().parent.parent.parent.parent.parent
         blog_content_dir = base_dir / 'content' / 'blog'
         assets_dir = base_dir / 'assets' / 'blog'
-        
+
         self.stdout.write(f"Looking for markdown files in: {blog_content_dir}")
-        
+
         if not blog_content_dir.exists():
             self.stdout.write(self.style.ERROR(f"Directory not found: {blog_content_dir}"))
             return
@@ -34,108 +105,165 @@ class Command(BaseCommand):
             self.stdout.write(self.style.SUCCESS(f"Created default author: {default_author.name}"))
 
         # Glob all markdown files
-        md_files = list(blog_content_dir.glob('*.md'))
-        
+        md_files = sorted(blog_content_dir.glob('*.md'))
+
         if not md_files:
             self.stdout.write(self.style.WARNING("No markdown files found."))
             return
 
-        for md_file in md_files:
-            try:
-                self.process_file(md_file, default_author, assets_dir)
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f"Failed to process {md_file.name}: {e}"))
+        self.seed(md_files, default_author, assets_dir, options['workers'], options['batch_size'])
 
-    def process_file(self, file_path, author, assets_dir):
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+    def seed(self, md_files, author, assets_dir, workers=1, batch_size=50):
+        """Parse files in a thread pool and funnel the results to one writer.
 
-        # Parse Frontmatter
-        # Very customized simple parser
-        frontmatter = {}
-        body = content
-        
-        if content.startswith('---'):
-            parts = re.split(r'^---$', content, maxsplit=2, flags=re.MULTILINE)
-            if len(parts) >= 3:
-                fm_text = parts[1]
-                body = parts[2].strip()
-                
-                # Parse lines
-                for line in fm_text.splitlines():
-                    if ':' in line:
-                        key, val = line.split(':', 1)
-                        frontmatter[key.strip()] = val.strip().strip('"\'')
-        else:
-            self.stdout.write(self.style.WARNING(f"No frontmatter in {file_path.name}"))
+        At most two files per worker are parsed ahead of the writer, so only
+        the current batch and that window (image bytes included) are held in
+        memory. Results are written in file order, one batch at a time.
+        """
+        workers = max(1, workers)
+        self.tags = {t.name: t for t in Tag.objects.all()}
+        files = iter(md_files)
+        batch = []
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            in_flight = deque(pool.submit(read_markdown_post, path, assets_dir) for path in islice(files, workers * 2))
+            while in_flight:
+                batch.append(in_flight.popleft().result())
+                for path in islice(files, 1):
+                    in_flight.append(pool.submit(read_markdown_post, path, assets_dir))
+                if len(batch) >= batch_size or not in_flight:
+                    self.write_batch(batch, author)
+                    batch = []
 
-        # Extract Fields
-        title = frontmatter.get('title', file_path.stem)
-        slug = frontmatter.get('slug', slugify(title))
-        date_str = frontmatter.get('date')
-        image_path = frontmatter.get('image') or frontmatter.get('img')
-        category = frontmatter.get('category')
-        tags_list = frontmatter.get('tags', []) 
-        
-        # Tags might need parsing if it looks like a list string "[a, b]"
-        # But simple key: val usually implies single string or yaml list which simple parser might miss
-        # For this simple parser, let's assume single category -> Tag
-        
-        # Create or Update Post
-        post, created = Post.objects.update_or_create(
-            slug=slug,
-            defaults={
-                'author': author,
-                'title': title,
-                'content': body,
-                'static_image_path': image_path,
-                'status': Post.STATUS_PUBLISHED,
-                'published_at': timezone.now() if not date_str else None # If date_str exists, we might parse it, but for now allow null or set to now
-            }
-        )
-        
-        # Handle Date manually if present
-        if date_str:
-            # Try parsing date - simple fallback
-            try:
-                # Assuming YYYY-MM-DD
-                from datetime import datetime
-                dt = datetime.strptime(date_str, '%Y-%m-%d')
-                post.published_at = timezone.make_aware(dt)
-                post.created_at = timezone.make_aware(dt)
-                post.save()
-            except ValueError:
-                self.stdout.write(self.style.WARNING(f"Could not parse date {date_str} for {slug}"))
-
-        # Handle Tags from Category
-        if category:
-            tag, _ = Tag.objects.get_or_create(name=category)
-            post.tags.add(tag)
-            
-        # Additional heuristic tags based on title/subtitle
-        if 'event' in title.lower() or 'conference' in title.lower():
-            t, _ = Tag.objects.get_or_create(name='Events')
-            post.tags.add(t)
-            
-        # Handle Image Upload
-        if image_path:
-            # image_path usually looks like "/assets/blog/Filename.webp"
-            # We want just "Filename.webp"
-            filename = Path(image_path).name
-            local_img_path = assets_dir / filename
-            
-            if local_img_path.exists():
-                # Check if we already have an image to avoid re-uploading every time?
-                # For simplicity, we can overwrite or skip if exists. 
-                # Let's overwrite or ensure it's there.
+    def write_batch(self, batch, author):
+        """Write a batch of parsed files with bulk queries in one transaction.
+
+        If the batch fails, its files are retried one at a time so the
+        failure is reported against the file that caused it.
+        """
+        parsed_files = []
+        for parsed in batch:
+            for level, message in parsed['messages']:
+                self.stdout.write(getattr(self.style, level)(message))
+            if parsed['error'] is not None:
+                self.stdout.write(self.style.ERROR(f"Failed to process {parsed['file'].name}: {parsed['error']}"))
+            else:
+                parsed_files.append(parsed)
+        if parsed_files:
+            self.write_posts(parsed_files, author)
+
+    def write_posts(self, parsed_files, author):
+        try:
+            with transaction.atomic():
+                report = self.bulk_write(parsed_files, author)
+        except Exception as e:
+            # tags created inside the rolled back transaction are gone
+            self.tags = {t.name: t for t in Tag.objects.all()}
+            if len(parsed_files) == 1:
+                self.stdout.write(self.style.ERROR(f"Failed to process {parsed_files[0]['file'].name}: {e}"))
+                return
+            for parsed in parsed_files:
+                self.write_posts([parsed], author)
+            return
+        for message in report:
+            self.stdout.write(message)
+
+    def parse_date(self, parsed):
+        date_str = parsed['date_str']
+        if not date_str:
+            return None
+        try:
+            # Assuming YYYY-MM-DD
+            return timezone.make_aware(datetime.strptime(date_str, '%Y-%m-%d'))
+        except ValueError:
+            self.stdout.write(self.style.WARNING(f"Could not parse date {date_str} for {parsed['slug']}"))
+            return None
+
+    def tag_names(self, parsed):
+        # Tags from Category, plus a heuristic one based on the title
+        names = []
+        if parsed['category']:
+            names.append(parsed['category'])
+        title = parsed['title'].lower()
+        if 'event' in title or 'conference' in title:
+            names.append('Events')
+        return names
+
+    def bulk_write(self, parsed_files, author):
+        """Create or update (by slug) the posts of one batch.
+
+        Existing posts are loaded in one query, posts go through
+        bulk_create/bulk_update and tags are added straight to the through
+        table. Bulk writes send no signals, so the API cache, the search
+        index and the image derivative jobs are taken care of here. Returns
+        the per-file report lines, written once the batch has committed.
+        """
+        # a later file with the same slug wins, as with update_or_create
+        by_slug = {parsed['slug']: parsed for parsed in parsed_files}
+        existing = {p.slug: p for p in Post.objects.filter(slug__in=by_slug).defer('content_html')}
+        now = timezone.now()
+        to_create, to_update, backdated, with_image, report = [], [], [], [], []
+        for slug, parsed in by_slug.items():
+            post = existing.get(slug)
+            if post is None:
+                post = Post(slug=slug)
+                to_create.append(post)
+            else:
+                to_update.append(post)
+            post.author = author
+            post.title = parsed['title']
+            post.content = parsed['body']
+            post.status = Post.STATUS_PUBLISHED
+            post.updated_at = now
+            date = self.parse_date(parsed)
+            post.published_at = date or now
+            if date:
+                backdated.append((post, date))
+            post.apply_derived_fields()
+            post.render_content()
+
+            # Handle Image Upload
+            if parsed['image_data'] is not None:
+                filename = parsed['image_name']
                 try:
-                    with open(local_img_path, 'rb') as f:
-                        post.image.save(filename, File(f), save=True)
-                        self.stdout.write(f"  Uploaded image: {filename}")
+                    post.thumbnail.save(filename, ContentFile(parsed['image_data']), save=False)
+                    with_image.append(post)
+                    report.append(f"  Uploaded image: {filename}")
                 except Exception as e:
-                    self.stdout.write(self.style.WARNING(f"  Failed to upload image {filename}: {e}"))
-            else:
-                self.stdout.write(self.style.WARNING(f"  Image definition found but file missing: {local_img_path}"))
-        
-        action = "Created" if created else "Updated"
-        self.stdout.write(self.style.SUCCESS(f"{action} post: {title}"))
+                    report.append(self.style.WARNING(f"  Failed to upload image {filename}: {e}"))
+
+            action = "Created" if post.pk is None else "Updated"
+            report.append(self.style.SUCCESS(f"{action} post: {parsed['title']}"))
+
+        tag_links = {slug: self.tag_names(parsed) for slug, parsed in by_slug.items()}
+        missing_tags = {name for names in tag_links.values() for name in names} - set(self.tags)
+        if missing_tags:
+            Tag.objects.bulk_create([Tag(name=n, slug=slugify(n)[:64]) for n in sorted(missing_tags)])
+            self.tags = {t.name: t for t in Tag.objects.all()}
+
+        Post.objects.bulk_create(to_create)
+        Post.objects.bulk_update(to_update, [
+            'author', 'title', 'content', 'status', 'published', 'published_at', 'updated_at', 'thumbnail',
+            'content_html', 'excerpt', 'word_count', 'reading_time', 'content_hash',
+        ])
+        # created_at is auto_now_add, so bulk_create stamped it with now
+        for post, date in backdated:
+            post.created_at = date
+        Post.objects.bulk_update([post for post, _ in backdated], ['created_at'])
+
+        posts = {post.slug: post for post in to_create + to_update}
+        Post.tags.through.objects.bulk_create(
+            [
+                Post.tags.through(post_id=posts[slug].pk, tag_id=self.tags[name].pk)
+                for slug, names in tag_links.items()
+                for name in dict.fromkeys(names)
+            ],
+            ignore_conflicts=True,
+        )
+
+        if missing_tags:
+            invalidate_for(Tag)
+        invalidate_for(Post)
+        reindex_posts([post.pk for post in posts.values()])
+        for post in with_image:
+            request_derivatives(post.thumbnail)
+        return report
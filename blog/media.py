@@ -0,0 +1,201 @@
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote
+from uuid import uuid4
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+from .storage import is_content_addressed
+
+MAX_RANGES = 16
+BLOCK_SIZE = 64 * 1024
+
+_range_re = re.compile(r'^\s*(\d*)\s*-\s*(\d*)\s*$')
+
+
+def parse_range_header(header, size):
+    """Return [(start, end), ...] (inclusive) for a `Range: bytes=...` header.
+
+    Returns None when the header should be ignored (malformed, other unit,
+    too many or overlapping ranges - the full file is served instead) and
+    [] when no range is satisfiable.
+    """
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or not spec:
+        return None
+    ranges = []
+    for part in spec.split(','):
+        match = _range_re.match(part)
+        if not match or match.groups() == ('', ''):
+            return None
+        first, last = match.groups()
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+            if last and int(last) < start:
+                return None
+        else:
+            # suffix range: the last N bytes
+            start = max(size - int(last), 0)
+            end = size - 1
+        if start < size and start <= end:
+            ranges.append((start, end))
+    if len(ranges) > MAX_RANGES:
+        return None
+    ordered = sorted(ranges)
+    if any(b[0] <= a[1] for a, b in zip(ordered, ordered[1:])):
+        return None
+    return ranges
+
+
+class FileRange:
+    """Read at most `length` bytes of `f` starting at its current offset.
+
+    Keeps fileno() so a WSGI server's file_wrapper (gunicorn's sendfile)
+    can push the bytes without copying them through Python; those servers
+    stop at Content-Length.
+    """
+    def __init__(self, f, start, length):
+        f.seek(start)
+        self.file = f
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def _multipart(path, ranges, size, content_type, boundary):
+    with open(path, 'rb') as f:
+        for start, end in ranges:
+            yield (
+                f'\r\n--{boundary}\r\nContent-Type: {content_type}\r\n'
+                f'Content-Range: bytes {start}-{end}/{size}\r\n\r\n'
+            ).encode('ascii')
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining:
+                chunk = f.read(min(BLOCK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        yield f'\r\n--{boundary}--\r\n'.encode('ascii')
+
+
+def _multipart_length(ranges, size, content_type, boundary):
+    length = len(f'\r\n--{boundary}--\r\n')
+    for start, end in ranges:
+        length += len(
+            f'\r\n--{boundary}\r\nContent-Type: {content_type}\r\n'
+            f'Content-Range: bytes {start}-{end}/{size}\r\n\r\n'
+        )
+        length += end - start + 1
+    return length
+
+
+def _if_range_matches(request, etag, mtime):
+    value = request.headers.get('If-Range')
+    if value is None:
+        return True
+    if value.startswith('"'):
+        return value == etag
+    # a date only validates when it is exactly the file's Last-Modified
+    return parse_http_date_safe(value) == mtime
+
+
+@require_safe
+def serve_media(request, path):
+    """Serve a file from MEDIA_ROOT with Range, ETag and X-Accel-Redirect support.
+
+    Replaces django.views.static.serve for /media/: answers single and
+    multi-range requests with 206 (so video seeking and resumed PDF
+    downloads work), 304s on a strong ETag built from mtime and size, and
+    streams with FileResponse. With MEDIA_ACCEL_REDIRECT_PREFIX set, the
+    body is left to Nginx via X-Accel-Redirect.
+    """
+    # safe_join raises SuspiciousFileOperation (a 400) for paths outside MEDIA_ROOT
+    full_path = safe_join(settings.MEDIA_ROOT, path)
+    try:
+        st = os.stat(full_path)
+    except (ValueError, OSError):
+        raise Http404('File not found')
+    if not stat.S_ISREG(st.st_mode):
+        raise Http404('File not found')
+
+    size = st.st_size
+    mtime = int(st.st_mtime)
+    etag = f'"{st.st_mtime_ns:x}-{size:x}"'
+    content_type, encoding = mimetypes.guess_type(full_path)
+    if encoding:
+        # like FileResponse: a .gz download is not sent as Content-Encoding,
+        # which would make the browser decompress it
+        content_type = {'gzip': 'application/gzip', 'br': 'application/x-brotli'}.get(encoding)
+    content_type = content_type or 'application/octet-stream'
+
+    response = get_conditional_response(request, etag=etag, last_modified=mtime)
+    if response is None:
+        response = _build_response(request, path, full_path, size, etag, mtime, content_type)
+    response.headers['ETag'] = etag
+    response.headers['Last-Modified'] = http_date(mtime)
+    response.headers['Accept-Ranges'] = 'bytes'
+    if is_content_addressed(path):
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+
+def _build_response(request, path, full_path, size, etag, mtime, content_type):
+    prefix = getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', '')
+    if prefix:
+        # Nginx handles Range/If-Range itself for internal redirects
+        response = HttpResponse(content_type=content_type)
+        response.headers['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(path)
+        return response
+
+    header = request.headers.get('Range')
+    ranges = None
+    if header and _if_range_matches(request, etag, mtime):
+        ranges = parse_range_header(header, size)
+
+    if ranges == []:
+        response = HttpResponse(status=416)
+        response.headers['Content-Range'] = f'bytes */{size}'
+        return response
+
+    if ranges and len(ranges) == 1:
+        start, end = ranges[0]
+        length = end - start + 1
+        response = FileResponse(FileRange(open(full_path, 'rb'), start, length), status=206, content_type=content_type)
+        response.headers['Content-Length'] = str(length)
+        response.headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+        return response
+
+    if ranges:
+        boundary = uuid4().hex
+        response = StreamingHttpResponse(
+            _multipart(full_path, ranges, size, content_type, boundary),
+            status=206,
+            content_type=f'multipart/byteranges; boundary={boundary}',
+        )
+        response.headers['Content-Length'] = str(_multipart_length(ranges, size, content_type, boundary))
+        return response
+
+    response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+    response.headers['Content-Length'] = str(size)
+    return response
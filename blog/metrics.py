@@ -0,0 +1,348 @@
+import fcntl
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.views.decorators.http import require_safe
+
+logger = logging.getLogger('blog.slow_requests')
+
+# {name: (help, bucket upper bounds)} of the per-endpoint histograms
+HISTOGRAMS = {
+    'api_request_duration_seconds': ('Wall time per request', (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)),
+    'api_db_queries': ('Database queries per request', (0, 1, 2, 5, 10, 20, 50, 100, 200)),
+    'api_db_duration_seconds': ('Time spent in database queries per request', (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)),
+    'api_serializer_duration_seconds': ('Time spent serializing per request', (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)),
+    'api_response_bytes': ('Response body size as sent', (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)),
+}
+COUNTERS = {
+    'api_requests_total': 'Requests by status class and response cache result',
+    'api_slow_requests_total': 'Requests slower than METRICS_SLOW_REQUEST_MS',
+}
+# statements kept per request for the slow request log
+MAX_LOGGED_QUERIES = 50
+# where the numbers of exited processes are folded (see Registry.fold_dead)
+DEAD_FILE = 'metrics-dead.json'
+
+
+class Registry:
+    """Per-process histograms and counters keyed by (name, labels).
+
+    With METRICS_DIR set, each process also writes its values to
+    `<METRICS_DIR>/metrics-<pid>.json` (at most once per
+    METRICS_FLUSH_INTERVAL seconds) and `/metrics` adds up every file, so
+    the numbers cover all Gunicorn workers whichever one is scraped. A
+    process starting up folds the files of exited ones into DEAD_FILE.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = False
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            # {(name, labels): [bucket counts..., sum, count]} / {(name, labels): value}
+            self.histograms = {}
+            self.counters = {}
+            self.flushed_at = 0.0
+
+    def observe(self, name, labels, value):
+        bounds = HISTOGRAMS[name][1]
+        with self.lock:
+            state = self.histograms.setdefault((name, labels), [0] * len(bounds) + [0.0, 0])
+            for i, bound in enumerate(bounds):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def inc(self, name, labels, amount=1):
+        with self.lock:
+            self.counters[(name, labels)] = self.counters.get((name, labels), 0) + amount
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'histograms': [[name, list(labels), list(state)] for (name, labels), state in self.histograms.items()],
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+            }
+
+    def maybe_flush(self, force=False):
+        directory = getattr(settings, 'METRICS_DIR', '')
+        if not directory:
+            return
+        now = time.monotonic()
+        if not force and now - self.flushed_at < getattr(settings, 'METRICS_FLUSH_INTERVAL', 1.0):
+            return
+        self.flushed_at = now
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        if not self.started:
+            self.started = True
+            self.fold_dead(directory)
+        _write_snapshot(directory, f'metrics-{os.getpid()}.json', self.snapshot())
+
+    def fold_dead(self, directory):
+        """Merge the files of processes that have exited into DEAD_FILE.
+
+        Their requests stay in the totals, as Prometheus counters must not
+        go down, but recycled workers no longer leave a file each behind.
+        """
+        with _directory_lock(directory, fcntl.LOCK_EX):
+            dead = [path for path in Path(directory).glob('metrics-*.json') if not _is_running(path)]
+            if not dead:
+                return
+            snapshots = _read_snapshots(dead + [Path(directory, DEAD_FILE)])
+            _write_snapshot(directory, DEAD_FILE, as_snapshot(*merge(snapshots)))
+            for path in dead:
+                path.unlink(missing_ok=True)
+
+    def collect(self):
+        """Snapshots to expose: every process's file, or just this process."""
+        directory = getattr(settings, 'METRICS_DIR', '')
+        if not directory:
+            return [self.snapshot()]
+        self.maybe_flush(force=True)
+        # a fold in progress would be counted twice or not at all
+        with _directory_lock(directory, fcntl.LOCK_SH):
+            return _read_snapshots(Path(directory).glob('metrics-*.json'))
+
+
+def _write_snapshot(directory, name, snapshot):
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(snapshot, f)
+    os.replace(tmp, os.path.join(directory, name))
+
+
+def _read_snapshots(paths):
+    snapshots = []
+    for path in paths:
+        try:
+            snapshots.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            # missing, or replaced by another worker right now
+            continue
+    return snapshots
+
+
+@contextmanager
+def _directory_lock(directory, operation):
+    with open(os.path.join(directory, '.lock'), 'a') as f:
+        fcntl.flock(f, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _is_running(path):
+    """False for `metrics-<pid>.json` files whose process is gone."""
+    pid = path.stem.removeprefix('metrics-')
+    if not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+registry = Registry()
+
+
+def merge(snapshots):
+    histograms, counters = {}, {}
+    for snapshot in snapshots:
+        for name, labels, state in snapshot['histograms']:
+            if name not in HISTOGRAMS:
+                continue
+            key = (name, tuple(tuple(pair) for pair in labels))
+            total = histograms.setdefault(key, [0] * len(state))
+            for i, value in enumerate(state):
+                total[i] += value
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            counters[key] = counters.get(key, 0) + value
+    return histograms, counters
+
+
+def as_snapshot(histograms, counters):
+    """The snapshot layout of merge()'s result."""
+    return {
+        'histograms': [[name, [list(pair) for pair in labels], state] for (name, labels), state in histograms.items()],
+        'counters': [[name, [list(pair) for pair in labels], value] for (name, labels), value in counters.items()],
+    }
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(snapshots):
+    """Prometheus text format (version 0.0.4) for the merged snapshots."""
+    histograms, counters = merge(snapshots)
+    lines = []
+    for name, (help_text, bounds) in HISTOGRAMS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        for (metric, labels), state in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(bounds, state):
+                cumulative += count
+                lines.append(f'{name}_bucket{_label_text(labels, [("le", _number(bound))])} {cumulative}')
+            lines.append(f'{name}_bucket{_label_text(labels, [("le", "+Inf")])} {state[-1]}')
+            lines.append(f'{name}_sum{_label_text(labels)} {_number(state[-2])}')
+            lines.append(f'{name}_count{_label_text(labels)} {state[-1]}')
+    for name, help_text in COUNTERS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f'{name}{_label_text(labels)} {_number(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+class RequestMetrics:
+    """What one request spent, filled in while it runs."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.statements = []
+        self.serializing = False
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper() hook
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.db_time += elapsed
+            if len(self.statements) < MAX_LOGGED_QUERIES:
+                self.statements.append((elapsed, sql))
+
+
+_current = ContextVar('request_metrics', default=None)
+
+
+def start_request():
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+@contextmanager
+def timed_serialization():
+    """Count the enclosed block as serializer time of the current request.
+
+    Nested blocks (a serializer inside another) are only counted once.
+    """
+    metrics = _current.get()
+    if metrics is None or metrics.serializing:
+        yield
+        return
+    metrics.serializing = True
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.serializer_time += time.perf_counter() - started
+        metrics.serializing = False
+
+
+def endpoint_labels(request):
+    """(('view', ...), ('action', ...)) for a request.
+
+    Viewset routes are labelled with the viewset and the action the method
+    maps to (`PostViewSet`, `list`); other views with their URL name,
+    which Django falls back to the view's dotted path for when the URL has
+    none. URLs that resolve to nothing share one label so scanners cannot
+    grow the registry.
+    """
+    match = getattr(request, 'resolver_match', None)
+    method = request.method.lower()
+    if match is None:
+        return (('view', 'unmatched'), ('action', method))
+    cls = getattr(match.func, 'cls', None)
+    if cls is not None:
+        action = getattr(match.func, 'actions', {}).get(method, method)
+        return (('view', cls.__name__), ('action', action))
+    return (('view', match.view_name), ('action', method))
+
+
+def _one_line(sql):
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+def record(request, response, metrics, wall_time):
+    labels = endpoint_labels(request)
+    size = len(response.content) if not response.streaming else int(response.get('Content-Length') or 0)
+    registry.observe('api_request_duration_seconds', labels, wall_time)
+    registry.observe('api_db_queries', labels, metrics.queries)
+    registry.observe('api_db_duration_seconds', labels, metrics.db_time)
+    registry.observe('api_serializer_duration_seconds', labels, metrics.serializer_time)
+    registry.observe('api_response_bytes', labels, size)
+    cache = response.get('X-Cache', 'none').lower()
+    registry.inc('api_requests_total', labels + (('status', f'{response.status_code // 100}xx'), ('cache', cache)))
+
+    threshold = getattr(settings, 'METRICS_SLOW_REQUEST_MS', 500)
+    if threshold and wall_time * 1000 >= threshold:
+        registry.inc('api_slow_requests_total', labels)
+        slowest = sorted(metrics.statements, key=lambda item: item[0], reverse=True)
+        logger.warning(
+            'Slow request %s %s: %.0fms, %d queries in %.0fms, serializer %.0fms, %d bytes, cache %s\n%s',
+            request.method, request.get_full_path(), wall_time * 1000, metrics.queries, metrics.db_time * 1000,
+            metrics.serializer_time * 1000, size, cache,
+            '\n'.join(f'  {elapsed * 1000:7.1f}ms  {_one_line(sql)}' for elapsed, sql in slowest),
+        )
+    registry.maybe_flush()
+
+
+def _allowed(request):
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token:
+        return request.headers.get('Authorization') == f'Bearer {token}'
+    return request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', ('127.0.0.1', '::1'))
+
+
+@require_safe
+def metrics_view(request):
+    """Prometheus scrape endpoint.
+
+    Needs `Authorization: Bearer <METRICS_TOKEN>` when a token is set,
+    otherwise a client address in METRICS_ALLOWED_IPS; anyone else gets a
+    404.
+    """
+    if not _allowed(request):
+        raise Http404
+    return HttpResponse(render_prometheus(registry.collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,101 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connection
+from django.utils.cache import patch_vary_headers
+
+from .compression import compress, negotiate, should_compress, weaken_etag
+from .metrics import end_request, record, start_request
+
+
+class CompressionMiddleware:
+    """Negotiate brotli/gzip for API responses.
+
+    Skips streaming and partial (Range) responses, payloads under
+    API_COMPRESSION_MIN_SIZE and types that do not compress (see
+    blog.compression). Responses already carrying Content-Encoding, such as
+    precompressed hits from the response cache, pass through untouched.
+    Works in both sync and async stacks, so it does not push the async
+    views (blog/async_views.py) onto a thread under ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(request, await self.get_response(request))
+
+    def process_response(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding') or response.has_header('Content-Range'):
+            return response
+        if not should_compress(response.get('Content-Type'), len(response.content)):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING'))
+        if encoding is None:
+            return response
+        body = compress(response.content, encoding)
+        if len(body) >= len(response.content):
+            return response
+
+        response.content = body
+        response['Content-Length'] = str(len(body))
+        response['Content-Encoding'] = encoding
+        weaken_etag(response)
+        return response
+
+
+class MetricsMiddleware:
+    """Time every request for /metrics (see blog/metrics.py).
+
+    Records wall time, the queries run through `connection.execute_wrapper`
+    and their time, serializer time, response size and the response cache
+    result, per viewset action; requests over METRICS_SLOW_REQUEST_MS are
+    logged with their SQL. Sits first so the size is what goes on the wire.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            return self.get_response(request)
+        metrics, token = start_request()
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(metrics):
+                response = self.get_response(request)
+        finally:
+            end_request(token)
+        record(request, response, metrics, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            return await self.get_response(request)
+        metrics, token = start_request()
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(metrics):
+                response = await self.get_response(request)
+        finally:
+            end_request(token)
+        record(request, response, metrics, time.perf_counter() - started)
+        return response
@@ -0,0 +1,51 @@
+# Generated by Django 6.0.1 on 2026-10-18 12:02
+
+from django.db import migrations, models
+
+
+def render_existing_posts(apps, schema_editor):
+    from blog.rendering import render_markdown
+
+    Post = apps.get_model('blog', 'Post')
+    fields = ['content_html', 'excerpt', 'word_count', 'reading_time', 'content_hash']
+    posts = list(Post.objects.only('id', 'content'))
+    for post in posts:
+        for field, value in render_markdown(post.content).items():
+            setattr(post, field, value)
+    Post.objects.bulk_update(posts, fields, batch_size=200)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0016_tag_lower_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='content_html',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='excerpt',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='reading_time',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, help_text='Estimated minutes to read'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='word_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(render_existing_posts, migrations.RunPython.noop),
+    ]
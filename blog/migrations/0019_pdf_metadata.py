@@ -0,0 +1,63 @@
+# Generated by Django 6.0.1 on 2026-10-18 12:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0018_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='brochure',
+            name='pdf_analyzed_name',
+            field=models.CharField(blank=True, default='', editable=False, max_length=500),
+        ),
+        migrations.AddField(
+            model_name='brochure',
+            name='pdf_page_count',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='brochure',
+            name='pdf_preview',
+            field=models.ImageField(blank=True, editable=False, max_length=500, null=True, upload_to='brochures/previews/'),
+        ),
+        migrations.AddField(
+            model_name='brochure',
+            name='pdf_size',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='brochure',
+            name='pdf_title',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='publication',
+            name='pdf_analyzed_name',
+            field=models.CharField(blank=True, default='', editable=False, max_length=500),
+        ),
+        migrations.AddField(
+            model_name='publication',
+            name='pdf_page_count',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='publication',
+            name='pdf_preview',
+            field=models.ImageField(blank=True, editable=False, max_length=500, null=True, upload_to='publications/previews/'),
+        ),
+        migrations.AddField(
+            model_name='publication',
+            name='pdf_size',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='publication',
+            name='pdf_title',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255),
+        ),
+    ]
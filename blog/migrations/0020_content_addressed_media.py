@@ -0,0 +1,64 @@
+# Generated by Django 6.0.1 on 2026-10-18 12:12
+
+import blog.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0019_pdf_metadata'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='brochure',
+            name='file',
+            field=models.FileField(blank=True, null=True, storage=blog.storage.content_addressed_storage, upload_to='brochures/pdfs/'),
+        ),
+        migrations.AlterField(
+            model_name='brochure',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=blog.storage.content_addressed_storage, upload_to='brochures/'),
+        ),
+        migrations.AlterField(
+            model_name='brochure',
+            name='pdf_preview',
+            field=models.ImageField(blank=True, editable=False, max_length=500, null=True, storage=blog.storage.content_addressed_storage, upload_to='brochures/previews/'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='thumbnail',
+            field=models.ImageField(blank=True, null=True, storage=blog.storage.content_addressed_storage, upload_to='posts/'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='video',
+            field=models.FileField(blank=True, null=True, storage=blog.storage.content_addressed_storage, upload_to='posts/videos/'),
+        ),
+        migrations.AlterField(
+            model_name='postimage',
+            name='image',
+            field=models.ImageField(storage=blog.storage.content_addressed_storage, upload_to='posts/gallery/'),
+        ),
+        migrations.AlterField(
+            model_name='publication',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=blog.storage.content_addressed_storage, upload_to='publications/'),
+        ),
+        migrations.AlterField(
+            model_name='publication',
+            name='pdf_file',
+            field=models.FileField(blank=True, max_length=500, null=True, storage=blog.storage.content_addressed_storage, upload_to='publications/files/'),
+        ),
+        migrations.AlterField(
+            model_name='publication',
+            name='pdf_preview',
+            field=models.ImageField(blank=True, editable=False, max_length=500, null=True, storage=blog.storage.content_addressed_storage, upload_to='publications/previews/'),
+        ),
+        migrations.AlterField(
+            model_name='welcomepopup',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=blog.storage.content_addressed_storage, upload_to='popups/'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 6.0.1 on 2026-10-18 12:13
+
+from django.db import migrations, models
+
+
+def create_fulltext_index(apps, schema_editor):
+    from blog.search import POSTGRES_SETUP, SQLITE_SETUP
+
+    statements = {'postgresql': POSTGRES_SETUP, 'sqlite': SQLITE_SETUP}.get(schema_editor.connection.vendor, [])
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def drop_fulltext_index(apps, schema_editor):
+    from blog.search import SQLITE_TEARDOWN
+
+    # the PostgreSQL column and index go away with the table
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in SQLITE_TEARDOWN:
+            schema_editor.execute(sql)
+
+
+def index_existing_content(apps, schema_editor):
+    from blog.search import document_values
+
+    SearchDocument = apps.get_model('blog', 'SearchDocument')
+    sources = [
+        ('post', apps.get_model('blog', 'Post').objects.prefetch_related('tags')),
+        ('publication', apps.get_model('blog', 'Publication').objects.all()),
+        ('brochure', apps.get_model('blog', 'Brochure').objects.all()),
+    ]
+    SearchDocument.objects.bulk_create(
+        [
+            SearchDocument(kind=kind, object_id=obj.pk, **document_values(kind, obj))
+            for kind, qs in sources
+            for obj in qs
+        ],
+        batch_size=200,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0020_content_addressed_media'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('post', 'Post'), ('publication', 'Publication'), ('brochure', 'Brochure')], max_length=20)),
+                ('object_id', models.PositiveIntegerField()),
+                ('title', models.CharField(max_length=255)),
+                ('tags', models.TextField(blank=True, default='')),
+                ('body', models.TextField(blank=True, default='')),
+                ('slug', models.CharField(blank=True, default='', max_length=255)),
+                ('published', models.BooleanField(default=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='searchdocument_kind_object')],
+            },
+        ),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+        migrations.RunPython(index_existing_content, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,9 @@
 from django.db import models
+from django.db.models.functions import Lower
 from django.utils.text import slugify
 from django.utils import timezone
+from .rendering import content_hash, render_markdown
+from .storage import content_addressed_storage
 # Create your models here.
 
 class Author(models.Model):
@@ -16,10 +19,17 @@ class Post(models.Model):
     author = models.ForeignKey(Author, related_name='posts', on_delete=models.CASCADE)
     title = models.CharField(max_length=255)
     # add optional thumbnail upload for posts
-    thumbnail = models.ImageField(upload_to='posts/', null=True, blank=True)
-    video = models.FileField(upload_to='posts/videos/', null=True, blank=True)
+    # uploads are stored by content hash (see blog/storage.py)
+    thumbnail = models.ImageField(upload_to='posts/', null=True, blank=True, storage=content_addressed_storage)
+    video = models.FileField(upload_to='posts/videos/', null=True, blank=True, storage=content_addressed_storage)
     slug = models.SlugField(max_length=255, unique=True, blank=True)
     content = models.TextField()
+    # rendered from `content` on save (see render_content)
+    content_html = models.TextField(blank=True, default='', editable=False)
+    excerpt = models.TextField(blank=True, default='', editable=False)
+    word_count = models.PositiveIntegerField(default=0, editable=False)
+    reading_time = models.PositiveSmallIntegerField(default=0, editable=False, help_text='Estimated minutes to read')
+    content_hash = models.CharField(max_length=64, blank=True, default='', editable=False)
     # status: draft or published
     STATUS_DRAFT = 'draft'
     STATUS_PUBLISHED = 'published'
@@ -36,7 +46,27 @@ class Post(models.Model):
     # Tags: allow multiple labels such as 'News', 'Events', 'Conference', etc.
     tags = models.ManyToManyField('Tag', related_name='posts', blank=True)
 
+    class Meta:
+        indexes = [
+            # keyset pagination walks published posts by (-created_at, -id)
+            models.Index(fields=['status', 'created_at', 'id'], name='post_status_created_idx'),
+        ]
+
     def save(self, *args, **kwargs):
+        self.apply_derived_fields()
+
+        rendered_fields = self.render_content()
+        update_fields = kwargs.get('update_fields')
+        if rendered_fields and update_fields is not None and 'content' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | set(rendered_fields)
+
+        super().save(*args, **kwargs)
+
+    def apply_derived_fields(self):
+        """Fill in slug and published/published_at from title and status.
+
+        Called by save(); bulk code paths that bypass save() call it directly.
+        """
         # auto-generate slug when missing
         if not self.slug:
             self.slug = slugify(self.title)[:255]
@@ -49,14 +79,26 @@ class Post(models.Model):
         else:
             self.published = False
 
-        super().save(*args, **kwargs)
+    def render_content(self, force=False):
+        """Refresh the rendered HTML/excerpt/stats when `content` changed.
+
+        Returns the names of the fields that were updated (empty when the
+        stored hash already matches). Bulk code paths that bypass save()
+        should call this before bulk_create/bulk_update.
+        """
+        if not force and self.content_hash and self.content_hash == content_hash(self.content):
+            return []
+        rendered = render_markdown(self.content)
+        for field, value in rendered.items():
+            setattr(self, field, value)
+        return list(rendered)
 
     def __str__(self):
         return self.title
 
 class PostImage(models.Model):
     post = models.ForeignKey(Post, related_name='uploaded_images', on_delete=models.CASCADE)
-    image = models.ImageField(upload_to='posts/gallery/')
+    image = models.ImageField(upload_to='posts/gallery/', storage=content_addressed_storage)
 
     def __str__(self):
         return f"Image for {self.post.title}"
@@ -65,6 +107,13 @@ class Tag(models.Model):
     name = models.CharField(max_length=64, unique=True)
     slug = models.SlugField(max_length=64, unique=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # case-insensitive lookups (`name__iexact`, `slug__iexact`)
+            models.Index(Lower('name'), name='tag_name_lower_idx'),
+            models.Index(Lower('slug'), name='tag_slug_lower_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.slug:
             from django.utils.text import slugify
@@ -98,11 +147,17 @@ class Publication(models.Model):
 
     # either 'image' or 'video'
     type = models.CharField(max_length=20, default='image')
-    image = models.ImageField(upload_to='publications/', null=True, blank=True)
+    image = models.ImageField(upload_to='publications/', null=True, blank=True, storage=content_addressed_storage)
     video_id = models.CharField(max_length=100, blank=True, null=True)
     
     # PDF File Download
-    pdf_file = models.FileField(upload_to='publications/files/', max_length=500, null=True, blank=True)
+    pdf_file = models.FileField(upload_to='publications/files/', max_length=500, null=True, blank=True, storage=content_addressed_storage)
+    # extracted from pdf_file by the worker (see blog/pdfs.py)
+    pdf_page_count = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    pdf_size = models.PositiveBigIntegerField(null=True, blank=True, editable=False)
+    pdf_title = models.CharField(max_length=255, blank=True, default='', editable=False)
+    pdf_preview = models.ImageField(upload_to='publications/previews/', max_length=500, null=True, blank=True, editable=False, storage=content_addressed_storage)
+    pdf_analyzed_name = models.CharField(max_length=500, blank=True, default='', editable=False)
     
     # UI Control Flags
     show_button = models.BooleanField(default=True)
@@ -121,7 +176,7 @@ class Publication(models.Model):
 
 class WelcomePopup(models.Model):
     title = models.CharField(max_length=255)
-    image = models.ImageField(upload_to='popups/', null=True, blank=True)
+    image = models.ImageField(upload_to='popups/', null=True, blank=True, storage=content_addressed_storage)
     is_active = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -136,7 +191,7 @@ class WelcomePopup(models.Model):
 
 class Brochure(models.Model):
     title = models.CharField(max_length=255)
-    image = models.ImageField(upload_to='brochures/', null=True, blank=True)
+    image = models.ImageField(upload_to='brochures/', null=True, blank=True, storage=content_addressed_storage)
     image_max_width = models.CharField(default="400px", max_length=50)
     image_max_height = models.CharField(default="380px", max_length=50)
     card_height = models.IntegerField(default=350)
@@ -145,8 +200,88 @@ class Brochure(models.Model):
     button_elevation = models.CharField(default='3', max_length=50)
     button_color = models.CharField(default='primary-lighten-1', max_length=50)
     button_hover_success = models.BooleanField(default=True)
-    file = models.FileField(upload_to='brochures/pdfs/', null=True, blank=True)
+    file = models.FileField(upload_to='brochures/pdfs/', null=True, blank=True, storage=content_addressed_storage)
+    # extracted from file by the worker (see blog/pdfs.py)
+    pdf_page_count = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    pdf_size = models.PositiveBigIntegerField(null=True, blank=True, editable=False)
+    pdf_title = models.CharField(max_length=255, blank=True, default='', editable=False)
+    pdf_preview = models.ImageField(upload_to='brochures/previews/', max_length=500, null=True, blank=True, editable=False, storage=content_addressed_storage)
+    pdf_analyzed_name = models.CharField(max_length=500, blank=True, default='', editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.title
+
+
+class SearchDocument(models.Model):
+    """Plain-text copy of a post, publication or brochure for /api/search/.
+
+    Kept current by blog.signals. The full-text index over these rows is
+    backend specific (a generated tsvector column on PostgreSQL, an FTS5
+    table maintained by triggers on SQLite) and is created by migration
+    0021, see blog/search.py.
+    """
+    KIND_CHOICES = [
+        ('post', 'Post'),
+        ('publication', 'Publication'),
+        ('brochure', 'Brochure'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.PositiveIntegerField()
+    title = models.CharField(max_length=255)
+    tags = models.TextField(blank=True, default='')
+    body = models.TextField(blank=True, default='')
+    slug = models.CharField(max_length=255, blank=True, default='')
+    published = models.BooleanField(default=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='searchdocument_kind_object'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.object_id}: {self.title}"
+
+
+class Job(models.Model):
+    """A unit of background work, run by `manage.py run_worker` (see blog/jobs.py)."""
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    ACTIVE_STATUSES = [STATUS_PENDING, STATUS_RUNNING]
+
+    kind = models.CharField(max_length=64, db_index=True)
+    payload = models.JSONField(default=dict, blank=True)
+    # at most one pending/running job per non-empty key
+    idempotency_key = models.CharField(max_length=255, blank=True, default='')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['idempotency_key'],
+                condition=models.Q(status__in=['pending', 'running']) & ~models.Q(idempotency_key=''),
+                name='job_active_idempotency_key',
+            ),
+        ]
 
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return f"{self.kind} #{self.pk} ({self.status})"
@@ -0,0 +1,102 @@
+import os
+from io import BytesIO
+
+import pypdfium2 as pdfium
+from django.apps import apps
+from django.core.files.base import ContentFile
+
+from .jobs import enqueue_on_commit, job_handler
+from .storage import delete_unreferenced
+
+PREVIEW_WIDTH = 480
+
+
+def pdf_fields():
+    """Map each model with an uploaded PDF to its FileField name."""
+    from .models import Publication, Brochure
+    return {
+        Publication: 'pdf_file',
+        Brochure: 'file',
+    }
+
+
+def extract_pdf_info(fieldfile):
+    """Return page count, byte size, title and a WebP first-page preview.
+
+    PDFium reads the open file as it needs it rather than from a copy of
+    the whole upload in memory. A document without pages has no preview.
+    """
+    with fieldfile.open('rb') as f:
+        pdf = pdfium.PdfDocument(f)
+        try:
+            title = (pdf.get_metadata_dict().get('Title') or '').strip()
+            preview = None
+            if len(pdf):
+                page = pdf[0]
+                bitmap = page.render(scale=PREVIEW_WIDTH / page.get_width())
+                buffer = BytesIO()
+                bitmap.to_pil().convert('RGB').save(buffer, format='WEBP', quality=80)
+                preview = buffer.getvalue()
+            return {
+                'pdf_page_count': len(pdf),
+                'pdf_size': fieldfile.size,
+                'pdf_title': title[:255],
+                'preview': preview,
+            }
+        finally:
+            pdf.close()
+
+
+def needs_analysis(instance):
+    fieldfile = getattr(instance, pdf_fields()[type(instance)])
+    return (fieldfile.name or '') != instance.pdf_analyzed_name
+
+
+def update_pdf_info(instance, force=False):
+    """Refresh the pdf_* columns of a Publication/Brochure from its file.
+
+    Skipped when the file has not changed since the last run unless
+    `force`. Writes with a queryset update() so no post_save fires again,
+    then deletes the previous preview unless another row still shares it.
+    Returns True when the row changed.
+    """
+    if not force and not needs_analysis(instance):
+        return False
+    model = type(instance)
+    fieldfile = getattr(instance, pdf_fields()[model])
+    values = {
+        'pdf_page_count': None,
+        'pdf_size': None,
+        'pdf_title': '',
+        'pdf_preview': None,
+        'pdf_analyzed_name': fieldfile.name or '',
+    }
+    old_preview = instance.pdf_preview.name
+    if fieldfile:
+        info = extract_pdf_info(fieldfile)
+        preview = info.pop('preview')
+        values.update(info)
+        if preview is not None:
+            preview_name = os.path.splitext(os.path.basename(fieldfile.name))[0] + '.webp'
+            instance.pdf_preview.save(preview_name, ContentFile(preview), save=False)
+            values['pdf_preview'] = instance.pdf_preview.name
+    model.objects.filter(pk=instance.pk).update(**values)
+    if old_preview and old_preview != values['pdf_preview']:
+        delete_unreferenced({old_preview})
+
+    # update() sends no signals
+    from .signals import invalidate_for
+    invalidate_for(model)
+    return True
+
+
+@job_handler('pdf_metadata')
+def pdf_metadata_job(model, pk):
+    instance = apps.get_model(model).objects.filter(pk=pk).first()
+    if instance is not None:
+        update_pdf_info(instance)
+
+
+def request_pdf_info(instance):
+    label = instance._meta.label
+    enqueue_on_commit('pdf_metadata', {'model': label, 'pk': instance.pk}, key=f'pdf_metadata:{label}:{instance.pk}')
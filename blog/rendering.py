@@ -0,0 +1,35 @@
+import hashlib
+import math
+
+import markdown
+import nh3
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
+
+MARKDOWN_EXTENSIONS = ['extra', 'sane_lists']
+EXCERPT_LENGTH = 200
+WORDS_PER_MINUTE = 200
+
+
+def content_hash(text):
+    """Stable fingerprint of a markdown body, used to skip re-rendering."""
+    return hashlib.sha256((text or '').encode('utf-8')).hexdigest()
+
+
+def render_markdown(text):
+    """Render markdown to sanitized HTML plus the derived text metadata.
+
+    Returns a dict whose keys match the rendered-content columns on Post:
+    content_html, excerpt, word_count, reading_time and content_hash.
+    """
+    text = text or ''
+    html = nh3.clean(markdown.markdown(text, extensions=MARKDOWN_EXTENSIONS))
+    plain = ' '.join(strip_tags(html).split())
+    word_count = len(plain.split())
+    return {
+        'content_html': html,
+        'excerpt': Truncator(plain).chars(EXCERPT_LENGTH),
+        'word_count': word_count,
+        'reading_time': math.ceil(word_count / WORDS_PER_MINUTE) if word_count else 0,
+        'content_hash': content_hash(text),
+    }
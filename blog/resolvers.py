@@ -0,0 +1,75 @@
+import threading
+from collections import OrderedDict
+
+from .cache import get_namespace_version
+from .models import Post, Tag
+
+# name/slug (lower-cased) -> tag id, reloaded whenever the shared `tags`
+# namespace version moves so every worker notices renames and deletes.
+_tag_ids = {'version': None, 'ids': {}}
+
+
+def _load_tag_ids():
+    ids = {}
+    for pk, name, slug in Tag.objects.values_list('pk', 'name', 'slug'):
+        ids[name.lower()] = pk
+        if slug:
+            ids[slug.lower()] = pk
+    return ids
+
+
+def resolve_tag_ids(values):
+    """Map tag names or slugs (case-insensitive) to ids.
+
+    Returns one entry per value, None for values that match no tag. There are
+    only a handful of tags, so the whole table is kept in process memory.
+    """
+    version = get_namespace_version('tags')
+    if _tag_ids['version'] != version:
+        _tag_ids['ids'] = _load_tag_ids()
+        _tag_ids['version'] = version
+    return [_tag_ids['ids'].get(value.strip().lower()) for value in values]
+
+
+class PostSlugCache:
+    """Small in-process LRU of post slug -> pk.
+
+    Misses are not remembered, so a post created by another worker is found
+    on the next lookup. Entries are dropped whenever the shared `posts`
+    namespace version moves, i.e. after a post is saved or deleted in any
+    worker; callers should `forget()` a slug whose pk no longer matches.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._pks = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+
+    def resolve(self, slug):
+        version = get_namespace_version('posts')
+        with self._lock:
+            if self._version != version:
+                self._pks.clear()
+                self._version = version
+            if slug in self._pks:
+                self._pks.move_to_end(slug)
+                return self._pks[slug]
+        pk = Post.objects.filter(slug=slug).values_list('pk', flat=True).first()
+        if pk is not None:
+            with self._lock:
+                self._pks[slug] = pk
+                if len(self._pks) > self.maxsize:
+                    self._pks.popitem(last=False)
+        return pk
+
+    def forget(self, slug):
+        with self._lock:
+            self._pks.pop(slug, None)
+
+    def clear(self):
+        with self._lock:
+            self._pks.clear()
+
+
+post_slugs = PostSlugCache()
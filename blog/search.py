@@ -0,0 +1,198 @@
+import html
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.utils.html import escape, strip_tags
+from django.utils.text import Truncator
+
+# snippet markers; swapped for <mark> after the text around them is escaped
+HL_START, HL_END = '\x02', '\x03'
+
+FTS_TABLE = 'blog_searchdocument_fts'
+
+SEARCH_KINDS = ('post', 'publication', 'brochure')
+
+POSTGRES_SETUP = [
+    """
+    ALTER TABLE blog_searchdocument ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(tags, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(body, '')), 'C')
+    ) STORED
+    """,
+    'CREATE INDEX blog_searchdocument_vector_idx ON blog_searchdocument USING GIN (search_vector)',
+]
+
+# External-content FTS5 table kept in step with blog_searchdocument by triggers.
+SQLITE_SETUP = [
+    f"""
+    CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        title, tags, body, content='blog_searchdocument', content_rowid='id', tokenize='porter unicode61'
+    )
+    """,
+    f"""
+    CREATE TRIGGER blog_searchdocument_ai AFTER INSERT ON blog_searchdocument BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, tags, body) VALUES (new.id, new.title, new.tags, new.body);
+    END
+    """,
+    f"""
+    CREATE TRIGGER blog_searchdocument_ad AFTER DELETE ON blog_searchdocument BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, tags, body) VALUES ('delete', old.id, old.title, old.tags, old.body);
+    END
+    """,
+    f"""
+    CREATE TRIGGER blog_searchdocument_au AFTER UPDATE ON blog_searchdocument BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, tags, body) VALUES ('delete', old.id, old.title, old.tags, old.body);
+        INSERT INTO {FTS_TABLE}(rowid, title, tags, body) VALUES (new.id, new.title, new.tags, new.body);
+    END
+    """,
+]
+
+SQLITE_TEARDOWN = [
+    'DROP TRIGGER IF EXISTS blog_searchdocument_au',
+    'DROP TRIGGER IF EXISTS blog_searchdocument_ad',
+    'DROP TRIGGER IF EXISTS blog_searchdocument_ai',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+
+def _plain_text(*parts):
+    return '\n'.join(html.unescape(strip_tags(p)) for p in parts if p)
+
+
+def document_values(kind, obj):
+    """Return the SearchDocument fields for a post, publication or brochure.
+
+    Only reads plain attributes, so the migration can pass historical models.
+    """
+    if kind == 'post':
+        return {
+            'title': obj.title,
+            'tags': ' '.join(t.name for t in obj.tags.all()),
+            'body': _plain_text(obj.content_html or obj.content),
+            'slug': obj.slug,
+            'published': obj.status == 'published',
+        }
+    if kind == 'publication':
+        return {
+            'title': obj.title,
+            'tags': '',
+            'body': _plain_text(obj.sub_text, obj.content, obj.content1, obj.content2),
+            'slug': '',
+            'published': obj.status == 'published',
+        }
+    return {
+        'title': obj.title,
+        'tags': '',
+        'body': _plain_text(obj.text_content),
+        'slug': '',
+        'published': True,
+    }
+
+
+def search_kind(model):
+    from .models import Post, Publication, Brochure
+    return {Post: 'post', Publication: 'publication', Brochure: 'brochure'}.get(model)
+
+
+def index_instance(instance):
+    from .models import SearchDocument
+    kind = search_kind(type(instance))
+    SearchDocument.objects.update_or_create(
+        kind=kind, object_id=instance.pk, defaults=document_values(kind, instance),
+    )
+
+
+def remove_instance(instance):
+    from .models import SearchDocument
+    SearchDocument.objects.filter(kind=search_kind(type(instance)), object_id=instance.pk).delete()
+
+
+def reindex_posts(ids):
+    from .models import Post
+    for post in Post.objects.filter(pk__in=ids).prefetch_related('tags'):
+        index_instance(post)
+
+
+def highlight(snippet):
+    return escape(snippet).replace(HL_START, '<mark>').replace(HL_END, '</mark>')
+
+
+def search(q, kinds=SEARCH_KINDS, limit=20):
+    """Rank published documents matching `q`, best first.
+
+    Uses the tsvector/GIN index on PostgreSQL and FTS5 on SQLite; other
+    backends fall back to a plain scan. Each result is a dict with kind,
+    object_id, title, slug, snippet (HTML with <mark> around matches) and
+    rank (higher is better).
+    """
+    if connection.vendor == 'postgresql':
+        rows = _search_postgres(q, kinds, limit)
+    elif connection.vendor == 'sqlite':
+        rows = _search_sqlite(q, kinds, limit)
+    else:
+        rows = _search_fallback(q, kinds, limit)
+    return [
+        {'kind': kind, 'object_id': object_id, 'title': title, 'slug': slug, 'snippet': highlight(snippet), 'rank': rank}
+        for kind, object_id, title, slug, snippet, rank in rows
+    ]
+
+
+def pg_tsquery(q):
+    # same semantics as fts5_query(): every word, as a prefix
+    return ' & '.join(f'{word}:*' for word in re.findall(r'\w+', q))
+
+
+def _search_postgres(q, kinds, limit):
+    query = pg_tsquery(q)
+    if not query:
+        return []
+    sql = """
+        SELECT kind, object_id, title, slug,
+               ts_headline('english', body, query,
+                           'StartSel=' || chr(2) || ', StopSel=' || chr(3) || ', MaxFragments=2, MaxWords=24, MinWords=8'),
+               ts_rank(search_vector, query) AS rank
+        FROM blog_searchdocument, to_tsquery('english', %s) AS query
+        WHERE search_vector @@ query AND published AND kind = ANY(%s)
+        ORDER BY rank DESC, id
+        LIMIT %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [query, list(kinds), limit])
+        return cursor.fetchall()
+
+
+def fts5_query(q):
+    # every word must match, as a prefix; quoting keeps FTS5 syntax out of user input
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', q))
+
+
+def _search_sqlite(q, kinds, limit):
+    match = fts5_query(q)
+    if not match:
+        return []
+    placeholders = ', '.join(['%s'] * len(kinds))
+    sql = f"""
+        SELECT d.kind, d.object_id, d.title, d.slug,
+               snippet({FTS_TABLE}, 2, char(2), char(3), '…', 24),
+               -bm25({FTS_TABLE}, 10.0, 5.0, 1.0) AS rank
+        FROM {FTS_TABLE} JOIN blog_searchdocument d ON d.id = {FTS_TABLE}.rowid
+        WHERE {FTS_TABLE} MATCH %s AND d.published AND d.kind IN ({placeholders})
+        ORDER BY rank DESC, d.id
+        LIMIT %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [match, *kinds, limit])
+        return cursor.fetchall()
+
+
+def _search_fallback(q, kinds, limit):
+    from .models import SearchDocument
+    qs = SearchDocument.objects.filter(published=True, kind__in=kinds)
+    for word in re.findall(r'\w+', q):
+        qs = qs.filter(Q(title__icontains=word) | Q(tags__icontains=word) | Q(body__icontains=word))
+    return [
+        (d.kind, d.object_id, d.title, d.slug, Truncator(d.body).words(24), 0.0)
+        for d in qs.order_by('-id')[:limit]
+    ]
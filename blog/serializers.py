@@ -1,17 +1,96 @@
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils.encoding import filepath_to_uri
 from rest_framework import serializers
 from .models import Author, Post, Comment, Tag, Publication, WelcomePopup, Brochure
+from .images import get_srcset
+from .metrics import timed_serialization
 import re
 
-class CommentSerializer(serializers.ModelSerializer):
+
+def media_url_prefix(request):
+    """Scheme and host put in front of relative media URLs.
+
+    MEDIA_BASE_URL (e.g. a CDN origin) wins when set; otherwise it is
+    worked out from the request once and remembered on it.
+    """
+    base = getattr(settings, 'MEDIA_BASE_URL', '')
+    if base:
+        return base.rstrip('/')
+    if request is None:
+        return ''
+    prefix = getattr(request, '_media_url_prefix', None)
+    if prefix is None:
+        prefix = request._media_url_prefix = request.build_absolute_uri('/').rstrip('/')
+    return prefix
+
+
+def absolute_url(request, url):
+    if url.startswith(('http://', 'https://', '//')):
+        return url
+    return media_url_prefix(request) + url
+
+
+def absolute_media_url(request, name, storage):
+    """Absolute URL of a stored file, or None when `name` is empty."""
+    if not name:
+        return None
+    if isinstance(storage, FileSystemStorage):
+        # what FileSystemStorage.url() returns, without the urljoin
+        url = storage.base_url + filepath_to_uri(name).lstrip('/')
+    else:
+        url = storage.url(name)
+    return absolute_url(request, url)
+
+
+def absolute_srcset(request, fieldfile):
+    """{format: {width: url}} of resized copies of an image ({} until generated)."""
+    return {
+        fmt: {width: absolute_url(request, url) for width, url in widths.items()}
+        for fmt, widths in get_srcset(fieldfile).items()
+    }
+
+
+class MediaURLField(serializers.Field):
+    """Read-only absolute URL of a FileField/ImageField (null when empty)."""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return absolute_media_url(self.context.get('request'), value.name, value.storage)
+
+
+class TimedSerializerMixin:
+    """Count to_representation() as serializer time in /metrics."""
+
+    def to_representation(self, instance):
+        with timed_serialization():
+            return super().to_representation(instance)
+
+
+class DynamicFieldsMixin:
+    """Allow callers to pass `fields=[...]` to render only a subset of fields."""
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class CommentSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Comment
         fields = ['id', 'post', 'author_name', 'body', 'created_at', 'approved']
 
-class PostSerializer(serializers.ModelSerializer):
+class PostSerializer(TimedSerializerMixin, DynamicFieldsMixin, serializers.ModelSerializer):
     comments = CommentSerializer(many=True, read_only=True)
     author = serializers.PrimaryKeyRelatedField(queryset=Author.objects.all())
-    thumbnail = serializers.SerializerMethodField()
-    video = serializers.SerializerMethodField()
+    thumbnail = MediaURLField()
+    video = MediaURLField()
     # allow posting `markdown` without separately sending title/content fields
     title = serializers.CharField(required=False)
     content = serializers.CharField(required=False)
@@ -23,37 +102,27 @@ class PostSerializer(serializers.ModelSerializer):
     # represent tags as a list of tag names
     tags = serializers.SlugRelatedField(many=True, slug_field='name', queryset=Tag.objects.all(), required=False)
     images = serializers.SerializerMethodField()
+    thumbnail_srcset = serializers.SerializerMethodField()
+    images_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Post
-        fields = ['id', 'author', 'title', 'slug', 'content', 'status', 'published', 'published_at', 'created_at', 'updated_at', 'comments', 'thumbnail', 'images', 'video', 'tags', 'markdown']
+        fields = ['id', 'author', 'title', 'slug', 'content', 'content_html', 'excerpt', 'word_count', 'reading_time', 'status', 'published', 'published_at', 'created_at', 'updated_at', 'comments', 'thumbnail', 'thumbnail_srcset', 'images', 'images_srcset', 'video', 'tags', 'markdown']
 
-    def get_thumbnail(self, obj):
+    def get_images(self, obj):
         request = self.context.get('request')
-        if hasattr(obj, 'thumbnail') and obj.thumbnail:
-            if request is not None:
-                return request.build_absolute_uri(obj.thumbnail.url)
-            return obj.thumbnail.url
-        return None
+        return [
+            absolute_media_url(request, img_obj.image.name, img_obj.image.storage)
+            for img_obj in obj.uploaded_images.all() if img_obj.image
+        ]
 
-    def get_video(self, obj):
-        request = self.context.get('request')
-        if hasattr(obj, 'video') and obj.video:
-            if request is not None:
-                return request.build_absolute_uri(obj.video.url)
-            return obj.video.url
-        return None
+    def get_thumbnail_srcset(self, obj):
+        return absolute_srcset(self.context.get('request'), obj.thumbnail)
 
-    def get_images(self, obj):
+    def get_images_srcset(self, obj):
+        # one entry per URL in `images`, in the same order
         request = self.context.get('request')
-        image_urls = []
-        for img_obj in obj.uploaded_images.all():
-            if img_obj.image:
-                if request is not None:
-                    image_urls.append(request.build_absolute_uri(img_obj.image.url))
-                else:
-                    image_urls.append(img_obj.image.url)
-        return image_urls
+        return [absolute_srcset(request, img_obj.image) for img_obj in obj.uploaded_images.all() if img_obj.image]
 
     def _parse_frontmatter(self, markdown_text):
         """Return (meta_dict, body_text).
@@ -140,7 +209,26 @@ class PostSerializer(serializers.ModelSerializer):
         return super().update(instance, validated_data)
     
 
-class AuthorSerializer(serializers.ModelSerializer):
+class PostSummarySerializer(TimedSerializerMixin, DynamicFieldsMixin, serializers.ModelSerializer):
+    """Compact, read-only post card for list pages.
+
+    Uses the excerpt stored by Post.save() so the body never leaves the
+    database.
+    """
+    thumbnail = MediaURLField()
+    thumbnail_srcset = serializers.SerializerMethodField()
+    tags = serializers.SlugRelatedField(many=True, slug_field='name', read_only=True)
+
+    class Meta:
+        model = Post
+        fields = ['id', 'title', 'slug', 'published_at', 'created_at', 'thumbnail', 'thumbnail_srcset', 'tags', 'excerpt', 'reading_time']
+        read_only_fields = fields
+
+    def get_thumbnail_srcset(self, obj):
+        return absolute_srcset(self.context.get('request'), obj.thumbnail)
+
+
+class AuthorSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     posts = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
 
     class Meta:
@@ -148,71 +236,56 @@ class AuthorSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'email', 'bio', 'created_at', 'posts']
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Tag
         fields = ['id', 'name', 'slug']
 
 
-class PublicationSerializer(serializers.ModelSerializer):
-    image = serializers.SerializerMethodField()
-    download_link = serializers.SerializerMethodField()
+class PublicationSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    image = MediaURLField()
+    image_srcset = serializers.SerializerMethodField()
+    download_link = MediaURLField(source='pdf_file')
+    pdf_file = MediaURLField()
+    pdf_preview = MediaURLField()
 
     class Meta:
         model = Publication
-        fields = '__all__'
+        exclude = ['pdf_analyzed_name']
 
-    def get_image(self, obj):
-        request = self.context.get('request')
-        if hasattr(obj, 'image') and obj.image:
-            if request is not None:
-                return request.build_absolute_uri(obj.image.url)
-            return obj.image.url
-        return None
+    def get_image_srcset(self, obj):
+        return absolute_srcset(self.context.get('request'), obj.image)
 
-    def get_download_link(self, obj):
-        request = self.context.get('request')
-        if hasattr(obj, 'pdf_file') and obj.pdf_file:
-            if request is not None:
-                return request.build_absolute_uri(obj.pdf_file.url)
-            return obj.pdf_file.url
-        return None
-
-class WelcomePopupSerializer(serializers.ModelSerializer):
-    image = serializers.SerializerMethodField()
+class WelcomePopupSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    image = MediaURLField()
+    image_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = WelcomePopup
         fields = '__all__'
 
-    def get_image(self, obj):
-        request = self.context.get('request')
-        if hasattr(obj, 'image') and obj.image:
-            if request is not None:
-                return request.build_absolute_uri(obj.image.url)
-            return obj.image.url
-        return None
+    def get_image_srcset(self, obj):
+        return absolute_srcset(self.context.get('request'), obj.image)
 
-class BrochureSerializer(serializers.ModelSerializer):
-    image = serializers.SerializerMethodField()
-    file = serializers.SerializerMethodField()
+class BrochureSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    image = MediaURLField()
+    image_srcset = serializers.SerializerMethodField()
+    file = MediaURLField()
+    pdf_preview = MediaURLField()
 
     class Meta:
         model = Brochure
-        fields = '__all__'
+        exclude = ['pdf_analyzed_name']
 
-    def get_image(self, obj):
-        request = self.context.get('request')
-        if hasattr(obj, 'image') and obj.image:
-            if request is not None:
-                return request.build_absolute_uri(obj.image.url)
-            return obj.image.url
-        return None
-        
-    def get_file(self, obj):
-        request = self.context.get('request')
-        if hasattr(obj, 'file') and obj.file:
-            if request is not None:
-                return request.build_absolute_uri(obj.file.url)
-            return obj.file.url
-        return None
\ No newline at end of file
+    def get_image_srcset(self, obj):
+        return absolute_srcset(self.context.get('request'), obj.image)
+
+
+class SearchResultSerializer(TimedSerializerMixin, serializers.Serializer):
+    type = serializers.CharField(source='kind')
+    id = serializers.IntegerField(source='object_id')
+    title = serializers.CharField()
+    slug = serializers.CharField()
+    # HTML-escaped text with <mark> around the matched terms
+    snippet = serializers.CharField()
+    rank = serializers.FloatField()
@@ -0,0 +1,104 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+
+from .cache import bump_namespace
+from .images import image_fields, load_manifest, request_derivatives
+from .pdfs import pdf_fields, needs_analysis, request_pdf_info
+from .models import Author, Post, PostImage, Comment, Tag, Publication, WelcomePopup, Brochure
+from .search import index_instance, remove_instance, reindex_posts, search_kind
+
+# Which cached API namespaces each model feeds into.
+CACHE_DEPENDENCIES = {
+    Author: ('authors',),
+    Post: ('posts', 'authors', 'search'),
+    PostImage: ('posts',),
+    Comment: ('posts', 'comments'),
+    Tag: ('posts', 'tags', 'search'),
+    Publication: ('publications', 'search'),
+    Brochure: ('brochures', 'search'),
+    WelcomePopup: ('welcome-popups',),
+}
+
+
+def invalidate_for(model):
+    """Bump every namespace fed by `model`.
+
+    Signal handlers call this automatically; code that writes with
+    bulk_create/bulk_update/update() (which send no signals) must call it.
+    Inside a transaction the namespaces are bumped again on commit, so a
+    concurrent request cannot leave pre-commit rows cached under the new
+    version.
+    """
+    def bump():
+        for namespace in CACHE_DEPENDENCIES.get(model, ()):
+            bump_namespace(namespace)
+    bump()
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(bump)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_api_cache(sender, **kwargs):
+    if kwargs.get('raw'):
+        # loaddata: nothing has been served from these rows yet
+        return
+    invalidate_for(sender)
+
+
+@receiver(post_save)
+def queue_image_derivatives(sender, instance, **kwargs):
+    # runs in the worker so admin saves never wait on Pillow
+    if kwargs.get('raw'):
+        return
+    for field in image_fields().get(sender, ()):
+        fieldfile = getattr(instance, field)
+        if fieldfile and load_manifest(fieldfile.name, fieldfile.storage, verify=True) is None:
+            request_derivatives(fieldfile)
+
+
+@receiver(post_save)
+def queue_pdf_metadata(sender, instance, **kwargs):
+    if kwargs.get('raw') or sender not in pdf_fields():
+        return
+    if needs_analysis(instance):
+        request_pdf_info(instance)
+
+
+@receiver(post_save)
+def update_search_index(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    if search_kind(sender):
+        index_instance(instance)
+    elif sender is Tag:
+        # a renamed tag changes the text of every post carrying it
+        reindex_posts(instance.posts.values_list('pk', flat=True))
+
+
+@receiver(post_delete)
+def remove_from_search_index(sender, instance, **kwargs):
+    if search_kind(sender):
+        remove_instance(instance)
+
+
+@receiver(pre_delete, sender=Tag)
+def remember_tagged_posts(sender, instance, **kwargs):
+    # the through rows are gone (without m2m_changed) by post_delete
+    instance._tagged_post_ids = list(instance.posts.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+def reindex_tagged_posts(sender, instance, **kwargs):
+    reindex_posts(getattr(instance, '_tagged_post_ids', ()))
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def invalidate_post_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_for(Post)
+        if not reverse:
+            index_instance(instance)
+        elif pk_set:
+            reindex_posts(pk_set)
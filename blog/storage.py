@@ -0,0 +1,85 @@
+import hashlib
+import os
+
+from django.apps import apps
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import models
+
+CONTENT_ADDRESSED_DIR = 'cas'
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Store uploads under the sha256 of their content.
+
+    `cas/<sha[:2]>/<sha>/<filename>` never changes meaning once written, so
+    the URLs can be cached as immutable, and identical uploads under the
+    same name share one file (saving an existing path writes nothing). The
+    upload_to directory of the field is not part of the name; the original
+    filename is, so downloads keep it. It is shortened to fit the field's
+    max_length, down to `cas/<sha[:2]>/<sha><ext>` when nothing fits.
+    """
+
+    def hashed_name(self, name, content, max_length=None):
+        sha = hashlib.sha256()
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        for chunk in content.chunks():
+            sha.update(chunk)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        digest = sha.hexdigest()
+        root, ext = os.path.splitext(self.get_valid_name(os.path.basename(name)))
+        ext = ext.lower()
+        prefix = f'{CONTENT_ADDRESSED_DIR}/{digest[:2]}/{digest}'
+        if max_length is not None:
+            root = root[:max(max_length - len(prefix) - 1 - len(ext), 0)]
+        if not root:
+            return prefix + ext
+        return f'{prefix}/{root}{ext}'
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content, max_length)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length=max_length)
+
+
+def is_content_addressed(name):
+    return bool(name) and name.startswith(CONTENT_ADDRESSED_DIR + '/')
+
+
+def content_addressed_fields():
+    """Yield (model, field) for every file field stored by content hash."""
+    for model in apps.get_app_config('blog').get_models():
+        for field in model._meta.get_fields():
+            if isinstance(field, models.FileField) and isinstance(field.storage, ContentAddressedStorage):
+                yield model, field
+
+
+def delete_unreferenced(names):
+    """Delete the files in `names` that no content-addressed field points at.
+
+    Identical uploads share one file, so a name dropped by one row may
+    still be in use by another. Returns how many files were deleted.
+    """
+    in_use = set()
+    for model, field in content_addressed_fields():
+        in_use.update(model.objects.filter(**{f'{field.name}__in': names}).values_list(field.name, flat=True))
+    deleted = 0
+    for name in sorted(set(names) - in_use):
+        _storage.delete(name)
+        deleted += 1
+    return deleted
+
+
+def content_addressed_storage():
+    # a callable keeps the storage out of the migration files
+    return _storage
+
+
+_storage = ContentAddressedStorage()
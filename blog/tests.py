@@ -1,3 +1,1506 @@
-from django.test import TestCase
+import gzip
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import close_old_connections, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path
+from django.utils.http import parse_http_date
+from PIL import Image
+from rest_framework import viewsets
+from rest_framework.test import APIClient
+from rest_framework.throttling import SimpleRateThrottle
+
+from .async_views import AsyncReadView
+from .cache import CachedResponseMixin, bump_namespace, get_api_cache
+from .compression import brotli
+from .conditional import ConditionalGetMixin
+from .images import generate_derivatives, load_manifest
+from .jobs import enqueue, job_handler, run_pending
+from .metrics import registry
+from .pdfs import pdfium, update_pdf_info
+from .management.commands import seed_posts
+from .management.commands.seed_posts import Command as SeedCommand
+from .models import Author, Post, Comment, Tag, PostImage, Publication, Brochure, WelcomePopup, Job, SearchDocument
+from .serializers import PostSerializer, PostSummarySerializer
+from .resolvers import post_slugs
+from .views import active_popup_entries
+from .urls import async_urlpatterns
+
+# API_ASYNC_READS routing, for AsyncReadTests
+urlpatterns = async_urlpatterns + [path('', include('blog.urls'))]
+
+
+def make_posts(author, count, tags=()):
+    posts = []
+    start = Post.objects.count()
+    for i in range(start, start + count):
+        post = Post.objects.create(
+            author=author,
+            title=f'Post {i}',
+            content=f'Body of post {i}',
+            status=Post.STATUS_PUBLISHED,
+        )
+        post.tags.set(tags)
+        Comment.objects.create(post=post, author_name='Reader', body='Nice')
+        PostImage.objects.create(post=post, image=f'posts/gallery/{i}.webp')
+        PostImage.objects.create(post=post, image=f'posts/gallery/{i}-b.webp')
+        posts.append(post)
+    return posts
+
+
+def share_caches(test):
+    """Use file-based caches for both aliases, as deploy.sh does.
+
+    Returns a second client of each, standing in for another Gunicorn
+    worker or `run_worker` (see `in_other_process`).
+    """
+    tmp = tempfile.TemporaryDirectory()
+    test.addCleanup(tmp.cleanup)
+    locations = {alias: f'{tmp.name}/{alias}' for alias in ('default', 'api')}
+    shared = override_settings(CACHES={
+        alias: {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}
+        for alias, location in locations.items()
+    })
+    shared.enable()
+    test.addCleanup(shared.disable)
+    return {alias: FileBasedCache(location, {}) for alias, location in locations.items()}
+
+
+@contextmanager
+def in_other_process(other):
+    with mock.patch('blog.images.caches', other), mock.patch('blog.cache.get_api_cache', return_value=other['api']):
+        yield
+
+
+class PostListQueryCountTests(TestCase):
+    """The post list must load its object graph in a fixed number of queries."""
+
+    def setUp(self):
+        get_api_cache().clear()
+        self.client = APIClient()
+        self.author = Author.objects.create(name='Iraya', email='team@iraya.com')
+        self.tags = [Tag.objects.create(name='News'), Tag.objects.create(name='Events')]
+
+    def _count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_list_query_count_is_independent_of_page_size(self):
+        make_posts(self.author, 2, self.tags)
+        small = self._count_queries('/api/posts/')
+        make_posts(self.author, 8, self.tags)
+        full = self._count_queries('/api/posts/')
+        self.assertEqual(small, full)
+
+    def test_detail_query_count_is_constant(self):
+        post = make_posts(self.author, 1, self.tags)[0]
+        PostImage.objects.create(post=post, image='posts/gallery/extra.webp')
+        Comment.objects.create(post=post, author_name='Another', body='Agreed')
+        # ETag aggregate + post + tags + gallery images + comments
+        with self.assertNumQueries(5):
+            response = self.client.get(f'/api/posts/{post.pk}/')
+        self.assertEqual(len(response.data['images']), 3)
+
+    def test_unapproved_comments_are_not_listed(self):
+        post = make_posts(self.author, 1)[0]
+        Comment.objects.create(post=post, author_name='Spam', body='Buy now', approved=False)
+        response = self.client.get(f'/api/posts/{post.pk}/')
+        self.assertEqual([c['author_name'] for c in response.data['comments']], ['Reader'])
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        get_api_cache().clear()
+        self.client = APIClient()
+        self.author = Author.objects.create(name='Iraya', email='team@iraya.com')
+
+    def test_anonymous_get_is_served_from_cache(self):
+        make_posts(self.author, 2)
+        first = self.client.get('/api/posts/')
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/posts/')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(first.content, second.content)
+
+    @override_settings(ALLOWED_HOSTS=['testserver', 'api.iraya.com'])
+    def test_host_is_part_of_the_key(self):
+        make_posts(self.author, 1)
+        self.client.get('/api/posts/', HTTP_HOST='testserver')
+        other = self.client.get('/api/posts/', HTTP_HOST='api.iraya.com')
+        self.assertEqual(other['X-Cache'], 'MISS')
+
+    def test_model_signals_invalidate_dependent_endpoints(self):
+        post = make_posts(self.author, 1)[0]
+        self.client.get('/api/posts/')
+        self.client.get('/api/publications/')
+
+        tag = Tag.objects.create(name='News')
+        post.tags.add(tag)
+
+        response = self.client.get('/api/posts/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['tags'], ['News'])
+        self.assertEqual(self.client.get('/api/publications/')['X-Cache'], 'HIT')
+
+    def test_brochures_are_cached(self):
+        brochure = Brochure.objects.create(title='Brochure', text_content='Text')
+        for url in ('/api/brochures/', f'/api/brochures/{brochure.pk}/'):
+            self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+            with self.assertNumQueries(0):
+                self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+        brochure.title = 'Renamed'
+        brochure.save()
+        self.assertEqual(self.client.get('/api/brochures/')['X-Cache'], 'MISS')
+
+    def test_viewset_without_namespace_is_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            type('UncachedViewSet', (CachedResponseMixin, viewsets.ReadOnlyModelViewSet), {'queryset': Brochure.objects.all()})
+
+
+class SharedCacheTests(TestCase):
+    """Invalidation reaches a worker through the shared `api` cache alone."""
+
+    def setUp(self):
+        self.other = share_caches(self)
+        self.client = APIClient()
+        self.author = Author.objects.create(name='Iraya', email='team@iraya.com')
+
+    def bump_elsewhere(self, namespace):
+        with in_other_process(self.other):
+            bump_namespace(namespace)
+
+    def test_version_bumped_by_another_process_invalidates_responses(self):
+        make_posts(self.author, 1)
+        self.client.get('/api/posts/')
+        self.assertEqual(self.client.get('/api/posts/')['X-Cache'], 'HIT')
+        self.bump_elsewhere('posts')
+        self.assertEqual(self.client.get('/api/posts/')['X-Cache'], 'MISS')
+
+    def test_slug_moved_by_another_process(self):
+        first, second = make_posts(self.author, 2)
+        self.assertEqual(self.client.get(f'/api/posts/by-slug/{first.slug}/').data['id'], first.pk)
+        # the other worker's writes send no signals here
+        Post.objects.filter(pk=first.pk).update(slug='archived')
+        Post.objects.filter(pk=second.pk).update(slug=first.slug)
+        self.bump_elsewhere('posts')
+        # resolved afresh rather than through the forget-and-retry path
+        with mock.patch.object(post_slugs, 'forget') as forget:
+            response = self.client.get(f'/api/posts/by-slug/{first.slug}/')
+        self.assertEqual(response.data['id'], second.pk)
+        forget.assert_not_called()
+
+    def test_tag_renamed_by_another_process(self):
+        tag = Tag.objects.create(name='News')
+        make_posts(self.author, 1, tags=[tag])
+        self.assertEqual(self.client.get('/api/posts/?tag=news').data['count'], 1)
+        Tag.objects.filter(pk=tag.pk).update(name='Updates', slug='updates')
+        self.bump_elsewhere('tags')
+        self.bump_elsewhere('posts')
+        self.assertEqual(self.client.get('/api/posts/?tag=updates').data['count'], 1)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        get_api_cache().clear()
+        self.client = APIClient()
+        self.author = Author.objects.create(name='Iraya', email='team@iraya.com')
+
+    @override_settings(API_CACHE_ENABLED=False)
+    def test_matching_etag_returns_304_without_serializing(self):
+        post = make_posts(self.author, 1)[0]
+        first = self.client.get(f'/api/posts/{post.pk}/')
+        self.assertIn('Last-Modified', first)
+        # only the validator aggregate runs
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/posts/{post.pk}/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], first['ETag'])
+
+    def test_cached_entry_answers_conditional_requests(self):
+        make_posts(self.author, 1)
+        first = self.client.get('/api/posts/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/posts/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    @override_settings(API_CACHE_ENABLED=False)
+    def test_if_modified_since(self):
+        make_posts(self.author, 1)
+        first = self.client.get('/api/posts/')
+        response = self.client.get('/api/posts/', HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def assert_modified_after(self, change):
+        first = self.client.get('/api/posts/')
+        # Last-Modified has one-second resolution
+        with mock.patch('blog.cache.time.time', return_value=time.time() + 2):
+            change()
+        response = self.client.get('/api/posts/', HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(parse_http_date(response['Last-Modified']), parse_http_date(first['Last-Modified']))
+
+    @override_settings(API_CACHE_ENABLED=False)
+    def test_new_comment_moves_last_modified(self):
+        post = make_posts(self.author, 1)[0]
+        self.assert_modified_after(lambda: Comment.objects.create(post=post, author_name='Reader', body='Late reply'))
+
+    @override_settings(API_CACHE_ENABLED=False)
+    def test_unpublishing_the_newest_post_moves_last_modified(self):
+        newest = make_posts(self.author, 2)[-1]
+
+        def unpublish():
+            newest.status = Post.STATUS_DRAFT
+            newest.save()
+        self.assert_modified_after(unpublish)
+
+    def test_etag_changes_when_content_changes(self):
+        post = make_posts(self.author, 1)[0]
+        first = self.client.get('/api/publications/')
+        Publication.objects.create(title='Paper')
+        response = self.client.get('/api/publications/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
+        first = self.client.get('/api/posts/')
+        PostImage.objects.create(post=post, image='posts/gallery/new.webp')
+        response = self.client.get('/api/posts/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(API_CACHE_ENABLED=False)
+    def test_brochures_answer_conditional_requests(self):
+        brochure = Brochure.objects.create(title='Brochure', text_content='Text')
+        for url in ('/api/brochures/', f'/api/brochures/{brochure.pk}/'):
+            first = self.client.get(url)
+            self.assertEqual(first.status_code, 200)
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+
+    def test_viewset_without_namespace_is_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            type('UnversionedViewSet', (ConditionalGetMixin, viewsets.ReadOnlyModelViewSet), {'queryset': Brochure.objects.all()})
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        get_api_cache().clear()
+        self.client = APIClient()
+        self.author = Author.objects.create(name='Iraya', email='team@iraya.com')
+
+    def test_cursor_walks_every_post_once_in_order(self):
+        posts = make_posts(self.author, 25)
+        # force ties on created_at so the id tiebreak matters
+        Post.objects.filter(pk__in=[p.pk for p in posts[5:15]]).update(created_at=posts[5].created_at)
+        expected = list(Post.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+        seen = []
+        url = '/api/posts/?cursor='
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            seen += [p['id'] for p in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(seen, expected)
+
+    def test_page_number_clients_keep_working(self):
+        make_posts(self.author, 12)
+        response = self.client.get('/api/posts/?page=2')
+        self.assertEqual(response.data['count'], 12)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/posts/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+
+class TagFilterTests(TestCase):
+    def setUp(self):
+        get_api_cache().clear()
+        self.client = APIClient()
+        author = Author.objects.create(name='Iraya', email='team@iraya.com')
+        self.news = Tag.objects.create(name='News')
+        self.events = Tag.objects.create(name='New Energy')
+        self.both = make_posts(author, 1, [self.news, self.events])[0]
+        self.news_only = make_posts(author, 1, [self.news])[0]
+        make_posts(author, 1)
+
+    def _ids(self, query):
+        response = self.client.get(f'/api/posts/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return sorted(p['id'] for p in response.data['results'])
+
+    def test_name_or_slug_case_insensitive(self):
+        expected = sorted([self.both.pk, self.news_only.pk])
+        self.assertEqual(self._ids('tag=news'), expected)
+        self.assertEqual(self._ids('tag=NEW-ENERGY'), [self.both.pk])
+
+    def test_multiple_tags_any_and_all(self):
+        self.assertEqual(self._ids('tag=News&tag=new-energy'), sorted([self.both.pk, self.news_only.pk]))
+        self.assertEqual(self._ids('tag=News&tag=new-energy&tag_match=all'), [self.both.pk])
+
+    def test_unknown_tag_returns_nothing(self):
+        self.assertEqual(self._ids('tag=Missing'), [])
+        self.assertEqual(self._ids('tag=News&tag=Missing&tag_match=all'), [])
+
+    def test_renamed_tag_is_picked_up(self):
+        self._ids('tag=News')
+        self.news.name = 'Press'
+        self.news.save()
+        self.assertEqual(self._ids('tag=press'), sorted([self.both.pk, self.news_only.pk]))
+
+    def test_filter_does_not_use_distinct(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/posts/?tag=News&tag=new-energy')
+        self.assertFalse(any('DISTINCT' in q['sql'] for q in ctx.captured_queries))
+
+
+class PostSummaryViewTests(TestCase):
+    def setUp(self):
+        get_api_cache().clear()
+        self.client = APIClient()
+        author = Author.objects.create(name='Iraya', email='team@iraya.com')
+        self.post = make_posts(author, 1, [Tag.objects.create(name='News')])[0]
+        self.post.content = 'Word ' * 500
+        self.post.save()
+
+    def test_summary_view_skips_body_and_relations(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/posts/?view=summary')
+        result = response.data['results'][0]
+        self.assertEqual(sorted(result), sorted(PostSummarySerializer.Meta.fields))
+        self.assertEqual(result['tags'], ['News'])
+        self.assertEqual(result['excerpt'], self.post.excerpt)
+        sql = ' '.join(q['sql'] for q in ctx.captured_queries)
+        self.assertNotIn('"blog_post"."content"', sql)
+        self.assertNotIn('"blog_post"."content_html"', sql)
+        self.assertNotIn('blog_comment', sql)
+        self.assertNotIn('blog_postimage', sql)
+
+    def test_fields_param_trims_payload(self):
+        response = self.client.get(f'/api/posts/{self.post.pk}/?fields=id,title')
+        self.assertEqual(response.data, {'id': self.post.pk, 'title': self.post.title})
+
+    def test_list_leaves_out_rendered_content_unless_asked(self):
+        with CaptureQueriesContext(connection) as ctx:
+            result = self.client.get('/api/posts/').data['results'][0]
+        self.assertNotIn('content_html', result)
+        self.assertIn('content', result)
+        self.assertNotIn('"blog_post"."content_html"', ' '.join(q['sql'] for q in ctx.captured_queries))
+        result = self.client.get('/api/posts/?fields=id,content_html').data['results'][0]
+        self.assertEqual(result, {'id': self.post.pk, 'content_html': self.post.content_html})
+        detail = self.client.get(f'/api/posts/{self.post.pk}/').data
+        self.assertEqual(detail['content_html'], self.post.content_html)
+
+
+class RenderedContentTests(TestCase):
+    def setUp(self):
+        self.author = Author.objects.create(name='Iraya', email='team@iraya.com')
+
+    def test_markdown_is_rendered_and_sanitized_on_save(self):
+        post = Post.objects.create(
+            author=self.author,
+            title='Rendered',
+            content='# Heading\n\nSome **bold** text.<script>alert(1)</script>',
+        )
+        self.assertIn('<h1>Heading</h1>', post.content_html)
+        self.assertIn('<strong>bold</strong>', post.content_html)
+        self.assertNotIn('<script>', post.content_html)
+        self.assertEqual(post.excerpt, 'Heading Some bold text.')
+        self.assertEqual(post.word_count, 4)
+        self.assertEqual(post.reading_time, 1)
+
+    def test_unchanged_content_is_not_rerendered(self):
+        post = Post.objects.create(author=self.author, title='Once', content='Body')
+        post.content_html = 'kept'
+        post.title = 'Renamed'
+        post.save()
+        self.assertEqual(post.content_html, 'kept')
+        post.content = 'New body'
+        post.save(update_fields=['content'])
+        post.refresh_from_db()
+        self.assertEqual(post.content_html, '<p>New body</p>')
+
+
+class PostSlugLookupTests(TestCase):
+    def setUp(self):
+        get_api_cache().clear()
+        post_slugs.clear()
+        self.client = APIClient()
+        author = Author.objects.create(name='Iraya', email='team@iraya.com')
+        self.post = make_posts(author, 1)[0]
+
+    def test_by_slug_matches_detail(self):
+        detail = self.client.get(f'/api/posts/{self.post.pk}/')
+        by_slug = self.client.get(f'/api/posts/by-slug/{self.post.slug}/')
+        self.assertEqual(by_slug.status_code, 200)
+        self.assertEqual(by_slug.data, detail.data)
+
+    @override_settings(API_CACHE_ENABLED=False)
+    def test_resolved_slug_skips_the_lookup_query(self):
+        self.client.get(f'/api/posts/by-slug/{self.post.slug}/')
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(f'/api/posts/by-slug/{self.post.slug}/')
+        self.assertFalse(any('SELECT "blog_post"."id" AS "pk" FROM' in q['sql'] for q in ctx.captured_queries))
+
+    def test_renamed_slug(self):
+        old_slug = self.post.slug
+        self.client.get(f'/api/posts/by-slug/{old_slug}/')
+        self.post.slug = 'renamed'
+        self.post.save()
+        self.assertEqual(self.client.get(f'/api/posts/by-slug/{old_slug}/').status_code, 404)
+        self.assertEqual(self.client.get('/api/posts/by-slug/renamed/').data['id'], self.post.pk)
+
+    def test_stale_mapping_from_another_worker_is_repaired(self):
+        post_slugs._pks['ghost'] = self.post.pk
+        other = make_posts(self.post.author, 1)[0]
+        Post.objects.filter(pk=other.pk).update(slug='ghost')
+        response = self.client.get('/api/posts/by-slug/ghost/')
+        self.assertEqual(response.data['id'], other.pk)
+
+
+class BulkImportTests(TestCase):
+    def setUp(self):
+        self.author = Author.objects.create(name='Iraya', email='team@iraya.com')
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = Path(self.tmp.name)
+        for i in range(3):
+            (self.dir / f'post-{i}.md').write_text(
+                f'---\ntitle: Post {i}\ndate: 2024-05-0{i + 1}\ntags: News, Events\n---\nBody {i}\n',
+                encoding='utf-8',
+            )
+
+    def _import(self):
+        out = StringIO()
+        call_command('import_md_posts', '--bulk', '--path', str(self.dir), '--author', str(self.author.pk), stdout=out)
+        return out.getvalue()
+
+    def test_bulk_import_creates_updates_and_skips(self):
+        self.assertIn('created=3 updated=0 unchanged=0', self._import())
+        post = Post.objects.get(slug='post-1')
+        self.assertEqual(post.content_html, '<p>Body 1</p>')
+        self.assertTrue(post.published)
+        self.assertEqual(sorted(post.tags.values_list('name', flat=True)), ['Events', 'News'])
+
+        (self.dir / 'post-1.md').write_text('---\ntitle: Post 1\ntags: News\n---\nEdited\n', encoding='utf-8')
+        self.assertIn('created=0 updated=1 unchanged=2', self._import())
+        post.refresh_from_db()
+        self.assertEqual(post.content_html, '<p>Edited</p>')
+        self.assertEqual(list(post.tags.values_list('name', flat=True)), ['News'])
+
+    def test_invalid_date_only_affects_its_file(self):
+        (self.dir / 'post-1.md').write_text('---\ntitle: Post 1\ndate: 2024-13-45\n---\nBody 1\n', encoding='utf-8')
+        out = self._import()
+        self.assertIn("Invalid date '2024-13-45' in post-1.md", out)
+        self.assertIn('created=3 updated=0 unchanged=0', out)
+        self.assertIsNotNone(Post.objects.get(slug='post-1').published_at)
+
+    def test_unchanged_files_issue_no_writes(self):
+        self._import()
+        with CaptureQueriesContext(connection) as ctx:
+            self._import()
+        self.assertFalse(any(q['sql'].startswith(('INSERT', 'UPDATE', 'DELETE')) for q in ctx.captured_queries))
+
+
+class SeedPostsTests(TestCase):
+    def test_parallel_seed_reports_each_file(self):
+        author = Author.objects.create(name='Iraya', email='team@iraya.com')
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        root = Path(tmp.name)
+        for i in range(6):
+            (root / f'{i}.md').write_text(
+                f'---\ntitle: Conference {i}\ndate: 2024-01-0{i + 1}\ncategory: News\n---\nBody {i}\n',
+                encoding='utf-8',
+            )
+        (root / 'broken.md').write_bytes(b'\xff\xfe not utf-8')
+
+        out = StringIO()
+        command = SeedCommand(stdout=out)
+        command.seed(sorted(root.glob('*.md')), author, root, workers=4, batch_size=4)
+
+        output = out.getvalue()
+        self.assertEqual(output.count('Created post'), 6)
+        self.assertIn('Failed to process broken.md', output)
+        post = Post.objects.get(slug='conference-3')
+        self.assertEqual(post.created_at.date().isoformat(), '2024-01-04')
+        self.assertEqual(sorted(post.tags.values_list('name', flat=True)), ['Events', 'News'])
+
+    def test_frontmatter_image_keeps_the_date(self):
+        author = Author.objects.create(name='Iraya', email='team@iraya.com')
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        root = Path(tmp.name)
+        media = override_settings(MEDIA_ROOT=str(root / 'media'))
+        media.enable()
+        self.addCleanup(media.disable)
+        buffer = BytesIO()
+        Image.new('RGB', (40, 20), 'teal').save(buffer, format='PNG')
+        (root / 'cover.png').write_bytes(buffer.getvalue())
+        (root / 'dated.md').write_text(
+            '---\ntitle: Dated\ndate: 2020-01-02\nimage: /assets/blog/cover.png\n---\nBody\n', encoding='utf-8',
+        )
+
+        SeedCommand(stdout=StringIO()).seed([root / 'dated.md'], author, root)
+
+        post = Post.objects.get(slug='dated')
+        self.assertTrue(post.thumbnail)
+        self.assertEqual(post.created_at.date().isoformat(), '2020-01-02')
+        self.assertEqual(post.published_at.date().isoformat(), '2020-01-02')
+
+    def _write_files(self, count, prefix='Post'):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        root = Path(tmp.name)
+        for i in range(count):
+            (root / f'{i:02}.md').write_text(f'---\ntitle: {prefix} {i}\ncategory: {prefix} tag {i}\n---\nBody {i}\n', encoding='utf-8')
+        return sorted(root.glob('*.md')), root
+
+    def test_reads_stay_a_bounded_window_ahead_of_the_writer(self):
+        author = Author.objects.create(name='Iraya', email='team@iraya.com')
+        files, root = self._write_files(20)
+        command = SeedCommand(stdout=StringIO())
+        read, written, ahead = [], [], []
+        parse = seed_posts.read_markdown_post
+
+        def write_batch(batch, author):
+            written.extend(batch)
+            ahead.append(len(read) - len(written))
+            SeedCommand.write_batch(command, batch, author)
+        with mock.patch.object(seed_posts, 'read_markdown_post', lambda path, assets: read.append(path) or parse(path, assets)), \
+                mock.patch.object(command, 'write_batch', write_batch):
+            command.seed(files, author, root, workers=2, batch_size=5)
+        self.assertEqual(Post.objects.count(), 20)
+        self.assertLessEqual(max(ahead), 4)
+
+    def test_batch_query_count_does_not_grow_with_its_size(self):
+        author = Author.objects.create(name='Iraya', email='team@iraya.com')
+        counts = []
+        for size in (2, 10):
+            files, root = self._write_files(size, prefix=f'Batch of {size}')
+            # reindex_posts() writes search documents one post at a time
+            with CaptureQueriesContext(connection) as ctx, mock.patch.object(seed_posts, 'reindex_posts') as reindex:
+                SeedCommand(stdout=StringIO()).seed(files, author, root, batch_size=size)
+            counts.append(len(ctx.captured_queries))
+            self.assertEqual(len(reindex.call_args.args[0]), size)
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(Tag.objects.get(name='Batch of 10 tag 9').posts.get().title, 'Batch of 10 9')
+
+    def test_failing_file_is_reported_without_its_batch(self):
+        author = Author.objects.create(name='Iraya', email='team@iraya.com')
+        files, root = self._write_files(4)
+        apply_derived_fields = Post.apply_derived_fields
+
+        def fail_on_post_2(post):
+            if post.title == 'Post 2':
+                raise ValueError('bad post')
+            apply_derived_fields(post)
+        out = StringIO()
+        with mock.patch.object(Post, 'apply_derived_fields', fail_on_post_2):
+            SeedCommand(stdout=out).seed(files, author, root, batch_size=4)
+        self.assertIn('Failed to process 02.md: bad post', out.getvalue())
+        self.assertEqual(sorted(Post.objects.values_list('title', flat=True)), ['Post 0', 'Post 1', 'Post 3'])
+
+
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        media = override_settings(MEDIA_ROOT=tmp.name, IMAGE_DERIVATIVE_FORMATS=('webp',))
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(caches['default'].clear)
+
+    def _upload(self, name, width=1000):
+        buffer = BytesIO()
+        Image.new('RGB', (width, width // 2), 'teal').save(buffer, format='PNG')
+        return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+    def test_generates_widths_up_to_the_original(self):
+        name = self._upload('posts/card.png')
+        manifest = generate_derivatives(name)
+        self.assertEqual(sorted(manifest['variants']['webp'], key=int), ['320', '640', '960'])
+        with default_storage.open(manifest['variants']['webp']['640']) as f:
+            self.assertEqual(Image.open(f).size, (640, 320))
+
+    def test_identical_uploads_share_derivatives(self):
+        first = generate_derivatives(self._upload('posts/a.png'))
+        second = generate_derivatives(self._upload('posts/b.png'))
+        self.assertEqual(first['variants'], second['variants'])
+
+    def test_serializer_exposes_srcset_once_generated(self):
+        author = Author.objects.create(name='Iraya', email='team@iraya.com')
+        post = make_posts(author, 1)[0]
+        post.thumbnail = self._upload('posts/thumb.png')
+        generate_derivatives(post.thumbnail.name)
+        data = PostSerializer(post).data
+        self.assertEqual(sorted(data['thumbnail_srcset']['webp'], key=int), ['320', '640', '960'])
+        self.assertTrue(data['thumbnail_srcset']['webp']['320'].startswith('/media/derivatives/'))
+
+    def test_stale_manifest_is_ignored(self):
+        name = self._upload('posts/changing.png')
+        generate_derivatives(name)
+        default_storage.delete(name)
+        self._upload(name, width=400)
+        self.assertIsNone(load_manifest(name, verify=True))
+
+    def test_reads_neither_queue_jobs_nor_stat_storage(self):
+        author = Author.objects.create(name='Iraya', email='team@iraya.com')
+        make_posts(author, 3)
+        Job.objects.all().delete()
+        storage = PostImage._meta.get_field('image').storage
+        with override_settings(API_CACHE_ENABLED=False):
+            self.assertEqual(APIClient().get('/api/posts/').status_code, 200)
+            with mock.patch.object(storage, 'exists', side_effect=AssertionError), mock.patch.object(storage, 'size', side_effect=AssertionError):
+                response = APIClient().get('/api/posts/')
+        self.assertEqual(response.json()['results'][0]['images_srcset'], [{}, {}])
+        self.assertFalse(Job.objects.exists())
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.calls = []
+        job_handler('test.record')(lambda **payload: self.calls.append(payload))
+
+        def flaky(**payload):
+            raise RuntimeError('boom')
+        job_handler('test.flaky')(flaky)
+
+    def test_idempotency_key_allows_one_active_job(self):
+        self.assertIsNotNone(enqueue('test.record', {'n': 1}, key='same'))
+        self.assertIsNone(enqueue('test.record', {'n': 2}, key='same'))
+        run_pending()
+        self.assertEqual(self.calls, [{'n': 1}])
+        # once done, the key can be queued again
+        self.assertIsNotNone(enqueue('test.record', {'n': 3}, key='same'))
+
+    def test_failures_are_retried_with_backoff_then_marked_failed(self):
+        job = enqueue('test.flaky', max_attempts=2)
+        run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.STATUS_PENDING, 1))
+        self.assertIn('RuntimeError', job.last_error)
+        self.assertEqual(run_pending(), 0)  # not due yet
+
+        Job.objects.filter(pk=job.pk).update(run_after=job.created_at)
+        run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.STATUS_FAILED, 2))
+
+    def test_run_worker_generates_image_derivatives(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.addCleanup(caches['default'].clear)
+        with override_settings(MEDIA_ROOT=tmp.name, IMAGE_DERIVATIVE_FORMATS=('webp',)):
+            buffer = BytesIO()
+            Image.new('RGB', (700, 400), 'teal').save(buffer, format='PNG')
+            author = Author.objects.create(name='Iraya', email='team@iraya.com')
+            post = make_posts(author, 1)[0]
+            with self.captureOnCommitCallbacks(execute=True):
+                post.thumbnail.save('card.png', ContentFile(buffer.getvalue()))
+            self.assertTrue(Job.objects.filter(kind='image_derivatives', status=Job.STATUS_PENDING).exists())
+
+            # close_old_connections() would drop the test transaction's connection
+            with mock.patch('blog.management.commands.run_worker.close_old_connections'):
+                call_command('run_worker', '--once', stdout=StringIO())
+            self.assertEqual(Job.objects.get(kind='image_derivatives').status, Job.STATUS_DONE)
+            self.assertEqual(sorted(load_manifest(post.thumbnail.name)['variants']['webp'], key=int), ['320', '640'])
+
+    def test_derivatives_reach_the_web_process_through_shared_caches(self):
+        other = share_caches(self)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        with override_settings(MEDIA_ROOT=tmp.name, IMAGE_DERIVATIVE_FORMATS=('webp',)):
+            buffer = BytesIO()
+            Image.new('RGB', (700, 400), 'teal').save(buffer, format='PNG')
+            post = make_posts(Author.objects.create(name='Iraya', email='team@iraya.com'), 1)[0]
+            with self.captureOnCommitCallbacks(execute=True):
+                post.thumbnail.save('card.png', ContentFile(buffer.getvalue()))
+            client = APIClient()
+            # caches the response and the missing manifest
+            self.assertEqual(client.get('/api/posts/').json()['results'][0]['thumbnail_srcset'], {})
+
+            with in_other_process(other):
+                run_pending()
+            response = client.get('/api/posts/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(sorted(response.json()['results'][0]['thumbnail_srcset']['webp'], key=int), ['320', '640'])
+
+
+class PdfMetadataTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        media = override_settings(MEDIA_ROOT=tmp.name)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def _pdf(self, pages=2, title='Annual Report', color='white'):
+        buffer = BytesIO()
+        first, *rest = [Image.new('RGB', (600, 800), color) for _ in range(pages)]
+        first.save(buffer, format='PDF', save_all=True, append_images=rest, title=title)
+        return ContentFile(buffer.getvalue(), name='report.pdf')
+
+    def test_worker_extracts_metadata_after_save(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            publication = Publication.objects.create(title='Report', pdf_file=self._pdf(pages=3))
+        self.assertIsNone(publication.pdf_page_count)
+        run_pending()
+
+        publication.refresh_from_db()
+        self.assertEqual(publication.pdf_page_count, 3)
+        self.assertEqual(publication.pdf_size, publication.pdf_file.size)
+        self.assertEqual(publication.pdf_title, 'Annual Report')
+        with publication.pdf_preview.open('rb') as f:
+            self.assertEqual(Image.open(f).size[0], 480)
+
+        data = APIClient().get(f'/api/publications/{publication.pk}/').json()
+        self.assertEqual(data['pdf_page_count'], 3)
+        self.assertNotIn('pdf_analyzed_name', data)
+
+    def test_metadata_reaches_the_web_process_through_the_shared_cache(self):
+        other = share_caches(self)
+        with self.captureOnCommitCallbacks(execute=True):
+            publication = Publication.objects.create(title='Report', pdf_file=self._pdf(pages=3))
+        client = APIClient()
+        self.assertIsNone(client.get(f'/api/publications/{publication.pk}/').json()['pdf_page_count'])
+
+        with in_other_process(other):
+            run_pending()
+        response = client.get(f'/api/publications/{publication.pk}/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['pdf_page_count'], 3)
+
+    def test_pdf_is_read_from_the_open_file(self):
+        publication = Publication.objects.create(title='Report', pdf_file=self._pdf(pages=1))
+        opened = []
+        real = pdfium.PdfDocument
+
+        def document(source, *args, **kwargs):
+            opened.append(source)
+            return real(source, *args, **kwargs)
+        with mock.patch('blog.pdfs.pdfium.PdfDocument', side_effect=document):
+            update_pdf_info(publication)
+        self.assertNotIsInstance(opened[0], bytes)
+        self.assertEqual(Publication.objects.get(pk=publication.pk).pdf_size, publication.pdf_file.size)
+
+    def test_document_without_pages_gets_no_preview(self):
+        publication = Publication.objects.create(title='Report', pdf_file=self._pdf(pages=1))
+        with mock.patch.object(pdfium.PdfDocument, '__len__', return_value=0):
+            update_pdf_info(publication)
+        publication.refresh_from_db()
+        self.assertEqual(publication.pdf_page_count, 0)
+        self.assertFalse(publication.pdf_preview)
+
+    def test_replaced_pdf_drops_its_old_preview(self):
+        publication = Publication.objects.create(title='Report', pdf_file=self._pdf(pages=1))
+        update_pdf_info(publication)
+        publication.refresh_from_db()
+        old_preview = publication.pdf_preview.name
+        publication.pdf_file.save('report.pdf', self._pdf(pages=1, color='navy'))
+        update_pdf_info(publication)
+        publication.refresh_from_db()
+        self.assertNotEqual(publication.pdf_preview.name, old_preview)
+        self.assertFalse(default_storage.exists(old_preview))
+        self.assertTrue(default_storage.exists(publication.pdf_preview.name))
+
+    def test_preview_shared_with_another_row_is_kept(self):
+        first = Publication.objects.create(title='Report', pdf_file=self._pdf(pages=1))
+        update_pdf_info(first)
+        second = Publication.objects.create(title='Copy', pdf_file=self._pdf(pages=1))
+        update_pdf_info(second)
+        second.refresh_from_db()
+        shared = second.pdf_preview.name
+        self.assertEqual(Publication.objects.get(pk=first.pk).pdf_preview.name, shared)
+        second.pdf_file.save('other.pdf', self._pdf(pages=1, color='navy'))
+        update_pdf_info(second)
+        self.assertTrue(default_storage.exists(shared))
+
+    def test_backfill_skips_unchanged_files(self):
+        brochure = Brochure.objects.create(title='Brochure', text_content='-', file=self._pdf(pages=1))
+        out = StringIO()
+        call_command('extract_pdf_metadata', stdout=out)
+        self.assertIn('updated=1', out.getvalue())
+        brochure.refresh_from_db()
+        self.assertEqual(brochure.pdf_page_count, 1)
+
+        out = StringIO()
+        call_command('extract_pdf_metadata', stdout=out)
+        self.assertIn('updated=0', out.getvalue())
+
+
+class MediaRangeTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        media = override_settings(MEDIA_ROOT=tmp.name, MEDIA_ACCEL_REDIRECT_PREFIX='')
+        media.enable()
+        self.addCleanup(media.disable)
+        self.data = bytes(range(256)) * 4
+        default_storage.save('posts/videos/clip.mp4', ContentFile(self.data))
+        self.url = '/media/posts/videos/clip.mp4'
+
+    def _get(self, **headers):
+        return self.client.get(self.url, headers=headers)
+
+    def test_full_file_advertises_ranges(self):
+        response = self._get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.data)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Type'], 'video/mp4')
+
+    def test_single_range(self):
+        response = self._get(Range='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 100-199/1024')
+        self.assertEqual(response['Content-Length'], '100')
+        self.assertEqual(b''.join(response.streaming_content), self.data[100:200])
+
+        response = self._get(Range='bytes=-24')
+        self.assertEqual(b''.join(response.streaming_content), self.data[-24:])
+
+    def test_multiple_ranges(self):
+        response = self._get(Range='bytes=0-9,500-509')
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(response['Content-Type'].startswith('multipart/byteranges; boundary='))
+        body = b''.join(response.streaming_content)
+        self.assertEqual(len(body), int(response['Content-Length']))
+        self.assertIn(b'Content-Range: bytes 500-509/1024\r\n\r\n' + self.data[500:510], body)
+
+    def test_unsatisfiable_range(self):
+        response = self._get(Range='bytes=5000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */1024')
+
+    def test_etag_revalidation_and_if_range(self):
+        etag = self._get()['ETag']
+        self.assertEqual(self._get(If_None_Match=etag).status_code, 304)
+        self.assertEqual(self._get(Range='bytes=0-9', If_Range=etag).status_code, 206)
+        self.assertEqual(self._get(Range='bytes=0-9', If_Range='"stale"').status_code, 200)
+
+    def test_accel_redirect(self):
+        with override_settings(MEDIA_ACCEL_REDIRECT_PREFIX='/protected-media/'):
+            response = self._get(Range='bytes=0-9')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/posts/videos/clip.mp4')
+        self.assertEqual(response.content, b'')
+
+    def test_path_traversal_is_rejected(self):
+        # safe_join raises SuspiciousFileOperation, which Django answers with 400
+        self.assertEqual(self.client.get('/media/../settings.py').status_code, 400)
+        self.assertEqual(self.client.get('/media/posts/videos/').status_code, 404)
+
+
+class ContentAddressedMediaTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        media = override_settings(MEDIA_ROOT=tmp.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.author = Author.objects.create(name='Iraya', email='team@iraya.com')
+
+    def _png(self, color='teal'):
+        buffer = BytesIO()
+        Image.new('RGB', (40, 20), color).save(buffer, format='PNG')
+        return buffer.getvalue()
+
+    def test_identical_uploads_share_one_hashed_file(self):
+        first, second = make_posts(self.author, 2)
+        first.thumbnail.save('Cover.PNG', ContentFile(self._png()))
+        second.thumbnail.save('Cover.PNG', ContentFile(self._png()))
+        self.assertEqual(first.thumbnail.name, second.thumbnail.name)
+        self.assertRegex(first.thumbnail.name, r'^cas/[0-9a-f]{2}/[0-9a-f]{64}/Cover\.png$')
+
+        second.thumbnail.save('Cover.PNG', ContentFile(self._png('red')))
+        self.assertNotEqual(first.thumbnail.name, second.thumbnail.name)
+
+    def test_downloads_keep_the_uploaded_filename(self):
+        publication = Publication.objects.create(title='Report', pdf_file=ContentFile(b'%PDF-1.4', name='Annual Report 2024.pdf'))
+        self.assertTrue(publication.pdf_file.url.endswith('/Annual_Report_2024.pdf'))
+        self.assertEqual(self.client.get(publication.pdf_file.url).status_code, 200)
+
+    def test_long_filenames_are_shortened_to_the_field(self):
+        brochure = Brochure.objects.create(title='Brochure', text_content='-', file=ContentFile(b'%PDF-1.4', name='x' * 120 + '.PDF'))
+        self.assertEqual(len(brochure.file.name), Brochure._meta.get_field('file').max_length)
+        self.assertTrue(brochure.file.name.endswith('xxx.pdf'))
+        again = Brochure.objects.create(title='Again', text_content='-', file=ContentFile(b'%PDF-1.4', name='x' * 120 + '.PDF'))
+        self.assertEqual(again.file.name, brochure.file.name)
+
+    def test_hashed_urls_are_immutable(self):
+        post = make_posts(self.author, 1)[0]
+        post.thumbnail.save('cover.png', ContentFile(self._png()))
+        response = self.client.get(post.thumbnail.url)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+
+    def test_rehash_relinks_existing_files(self):
+        post = make_posts(self.author, 1)[0]
+        old = default_storage.save('posts/legacy.png', ContentFile(self._png()))
+        Post.objects.filter(pk=post.pk).update(thumbnail=old)
+
+        out = StringIO()
+        call_command('rehash_media', '--delete-originals', stdout=out)
+        self.assertIn('relinked=1', out.getvalue())
+        post.refresh_from_db()
+        self.assertTrue(post.thumbnail.name.startswith('cas/'))
+        self.assertTrue(default_storage.exists(post.thumbnail.name))
+        self.assertFalse(default_storage.exists(old))
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        get_api_cache().clear()
+        self.client = APIClient()
+        self.author = Author.objects.create(name='Iraya', email='team@iraya.com')
+
+    def _search(self, q, **params):
+        return self.client.get('/api/search/', {'q': q, **params}).json()['results']
+
+    def test_ranks_title_matches_first_and_highlights(self):
+        Post.objects.create(author=self.author, title='Field notes', content='The geologist said 1 < 2 at the core store.', status='published')
+        Post.objects.create(author=self.author, title='Geologists at work', content='Core logging.', status='published')
+        results = self._search('geologist')
+        self.assertEqual([r['title'] for r in results], ['Geologists at work', 'Field notes'])
+        self.assertIn('<mark>geologist</mark>', results[1]['snippet'])
+        self.assertIn('1 &lt; 2', results[1]['snippet'])
+
+    def test_covers_tags_publications_and_brochures(self):
+        post = Post.objects.create(author=self.author, title='Update', content='News.', status='published')
+        post.tags.add(Tag.objects.create(name='Seismic'))
+        Publication.objects.create(title='Paper', sub_text='Seismic interpretation')
+        Brochure.objects.create(title='Brochure', text_content='Seismic data platform')
+        self.assertEqual({r['type'] for r in self._search('seismic')}, {'post', 'publication', 'brochure'})
+        self.assertEqual([r['type'] for r in self._search('seismic', type='brochure')], ['brochure'])
+
+    def test_index_follows_edits_and_drafts(self):
+        post = Post.objects.create(author=self.author, title='Porosity', content='Text.', status='published')
+        self.assertEqual(len(self._search('porosity')), 1)
+        post.title = 'Permeability'
+        post.save()
+        self.assertEqual(self._search('porosity'), [])
+        self.assertEqual(self._search('permea')[0]['id'], post.pk)
+        post.status = 'draft'
+        post.save()
+        self.assertEqual(self._search('permeability'), [])
+        post.delete()
+        self.assertEqual(self._search('permeability'), [])
+
+    def test_query_syntax_is_not_passed_through(self):
+        Post.objects.create(author=self.author, title='Basin "model"', content='Text.', status='published')
+        self.assertEqual(len(self._search('basin" OR (NEAR')), 0)
+        self.assertEqual(len(self._search('basin"')), 1)
+        self.assertEqual(self.client.get('/api/search/', {'q': 'x', 'type': 'user'}).status_code, 400)
+
+    def test_rebuild_command(self):
+        post = Post.objects.create(author=self.author, title='Reservoir', content='Text.', status='published')
+        SearchDocument.objects.all().delete()
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self._search('reservoir')[0]['id'], post.pk)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver', 'api.iraya.com'])
+class ApiSnapshotTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.output = Path(tmp.name)
+        author = Author.objects.create(name='Iraya', email='team@iraya.com')
+        self.posts = make_posts(author, 12)
+
+    def _export(self, *args):
+        out = StringIO()
+        call_command('export_api_snapshot', '--output', str(self.output), '--base-url', 'https://api.iraya.com', *args, stdout=out)
+        return out.getvalue()
+
+    def test_writes_every_endpoint_precompressed(self):
+        self._export()
+        first = json.loads((self.output / 'api/posts/index.json').read_text())
+        self.assertEqual(first['next'], 'https://api.iraya.com/api/posts/?page=2')
+        second = json.loads((self.output / 'api/posts/index.page=2.json').read_text())
+        self.assertEqual(len(first['results']) + len(second['results']), 12)
+
+        post = self.posts[0]
+        detail = self.output / f'api/posts/by-slug/{post.slug}/index.json'
+        self.assertEqual(json.loads(detail.read_text())['id'], post.pk)
+        self.assertEqual(gzip.decompress((self.output / f'api/posts/{post.pk}/index.json.gz').read_bytes()), (self.output / f'api/posts/{post.pk}/index.json').read_bytes())
+        for name in ('api/tags/index.json', 'api/publications/index.json', 'api/brochures/index.json', 'api/welcome-popups/index.is_active=true.json'):
+            self.assertTrue((self.output / name).exists(), name)
+
+    def test_incremental_only_rewrites_changed_files(self):
+        self._export()
+        post = self.posts[0]
+        post.title = 'Renamed'
+        post.save()
+        out = self._export('--incremental')
+        # the post's two detail files and the list page it sits on
+        self.assertIn('written=3', out)
+
+        post.delete()
+        self.assertIn('removed=2', self._export('--incremental'))
+        self.assertFalse((self.output / f'api/posts/{post.pk}/index.json').exists())
+
+
+class CompressionTests(TestCase):
+    def setUp(self):
+        get_api_cache().clear()
+        self.client = APIClient()
+        author = Author.objects.create(name='Iraya', email='team@iraya.com')
+        for post in make_posts(author, 5):
+            post.content = 'Core logging and seismic interpretation. ' * 50
+            post.save()
+
+    def test_negotiates_brotli_then_gzip(self):
+        with override_settings(API_CACHE_ENABLED=False):
+            identity = self.client.get('/api/posts/')
+            response = self.client.get('/api/posts/', HTTP_ACCEPT_ENCODING='gzip, br')
+            self.assertEqual(response['Content-Encoding'], 'br')
+            self.assertEqual(brotli.decompress(response.content), identity.content)
+            self.assertIn('Accept-Encoding', response['Vary'])
+            self.assertTrue(response['ETag'].startswith('W/'))
+
+            response = self.client.get('/api/posts/', HTTP_ACCEPT_ENCODING='gzip, br;q=0')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(gzip.decompress(response.content), identity.content)
+            self.assertFalse(self.client.get('/api/posts/').has_header('Content-Encoding'))
+
+    def test_small_payloads_are_not_compressed(self):
+        response = self.client.get('/api/brochures/', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_cache_hits_reuse_stored_compressed_bytes(self):
+        miss = self.client.get('/api/posts/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(miss['X-Cache'], 'MISS')
+        with mock.patch('blog.middleware.compress') as compress:
+            hit = self.client.get('/api/posts/', HTTP_ACCEPT_ENCODING='gzip')
+        compress.assert_not_called()
+        self.assertEqual(hit['X-Cache'], 'HIT')
+        self.assertEqual(hit['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(hit.content), gzip.decompress(miss.content))
+
+        revalidated = self.client.get('/api/posts/', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=hit['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+
+
+@override_settings(API_CACHE_ENABLED=False)
+class FastPathTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        media = override_settings(MEDIA_ROOT=tmp.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.client = APIClient()
+        author = Author.objects.create(name='Iraya', email='team@iraya.com')
+        news, events = Tag.objects.create(name='News'), Tag.objects.create(name='Events')
+        self.posts = make_posts(author, 3, tags=[news, events])
+        post = self.posts[0]
+        post.thumbnail.save('cover.png', ContentFile(b'png'))
+        PostImage.objects.create(post=post, image=ContentFile(b'gallery', name='g.png'))
+        Comment.objects.create(post=post, author_name='Ana', body='Great read \u2028 indeed')
+        Comment.objects.create(post=post, author_name='Hidden', body='spam', approved=False)
+        Publication.objects.create(
+            title='Paper', sub_text='Sub', pdf_file=ContentFile(b'%PDF', name='p.pdf'),
+            pdf_preview=ContentFile(b'webp', name='p.webp'),
+        )
+
+    def _both(self, url):
+        fast = self.client.get(url)
+        with override_settings(API_VALUES_FAST_PATH=False):
+            slow = self.client.get(url)
+        self.assertEqual(fast.status_code, slow.status_code)
+        return fast, slow
+
+    def test_same_output_as_the_serializers(self):
+        post = self.posts[0]
+        for url in [
+            '/api/posts/',
+            '/api/posts/?cursor=',
+            '/api/posts/?fields=id,title,tags,comments',
+            f'/api/posts/{post.pk}/',
+            f'/api/posts/by-slug/{post.slug}/',
+            '/api/publications/',
+        ]:
+            fast, slow = self._both(url)
+            self.assertEqual(fast.json(), slow.json(), url)
+            self.assertEqual(fast.content, slow.content, url)
+
+    @override_settings(MEDIA_BASE_URL='https://cdn.iraya.com/')
+    def test_same_media_urls_as_the_serializers_with_a_base_url(self):
+        for url in ('/api/posts/', '/api/publications/'):
+            fast, slow = self._both(url)
+            self.assertEqual(fast.content, slow.content, url)
+        self.assertTrue(fast.json()[0]['pdf_preview'].startswith('https://cdn.iraya.com/media/'))
+
+    def test_page_loads_in_a_fixed_number_of_queries(self):
+        with CaptureQueriesContext(connection) as fast:
+            self.client.get('/api/posts/')
+        self.assertLessEqual(len(fast), 6)
+        self.assertEqual(self.client.get('/api/posts/999999/').status_code, 404)
+
+    def test_renderer_matches_stdlib_encoder(self):
+        from rest_framework.renderers import JSONRenderer
+        from .renderers import FastJSONRenderer
+        data = {'title': 'Caf\u00e9 \u2028', 'n': [1, 2.5, None, True], 'nested': {'a': 'b'}}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+
+class MediaURLTests(TestCase):
+    def setUp(self):
+        get_api_cache().clear()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        media = override_settings(MEDIA_ROOT=tmp.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        author = Author.objects.create(name='Iraya', email='team@iraya.com')
+        self.post = make_posts(author, 1)[0]
+        self.post.thumbnail.save('cover.png', ContentFile(b'png'))
+        Brochure.objects.create(
+            title='Brochure', text_content='-', file=ContentFile(b'%PDF', name='b.pdf'),
+            pdf_preview=ContentFile(b'webp', name='b.webp'),
+        )
+        Publication.objects.create(title='Paper', pdf_preview=ContentFile(b'webp', name='p.webp'))
+
+    def test_urls_use_the_request_origin(self):
+        data = APIClient().get(f'/api/posts/{self.post.pk}/').json()
+        self.assertEqual(data['thumbnail'], f'http://testserver/media/{self.post.thumbnail.name}')
+        brochure = APIClient().get('/api/brochures/').json()[0]
+        self.assertTrue(brochure['file'].startswith('http://testserver/media/cas/'))
+        self.assertIsNone(brochure['image'])
+
+    @override_settings(MEDIA_BASE_URL='https://cdn.iraya.com/')
+    def test_configured_base_url_needs_no_request(self):
+        data = PostSerializer(self.post).data
+        self.assertEqual(data['thumbnail'], f'https://cdn.iraya.com/media/{self.post.thumbnail.name}')
+        data = APIClient().get(f'/api/posts/{self.post.pk}/').json()
+        self.assertTrue(data['thumbnail'].startswith('https://cdn.iraya.com/media/'))
+        with override_settings(API_VALUES_FAST_PATH=False):
+            publication = APIClient().get('/api/publications/').json()[0]
+        brochure = APIClient().get('/api/brochures/').json()[0]
+        for preview in (publication['pdf_preview'], brochure['pdf_preview']):
+            self.assertTrue(preview.startswith('https://cdn.iraya.com/media/'), preview)
+
+    def test_prefix_is_computed_once_per_request(self):
+        from rest_framework.request import Request
+        from django.test import RequestFactory
+        request = Request(RequestFactory().get('/'))
+        with mock.patch.object(request._request, 'build_absolute_uri', wraps=request._request.build_absolute_uri) as build:
+            PostSerializer([self.post] * 5, many=True, context={'request': request}).data
+        self.assertEqual(build.call_count, 1)
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class AsyncReadTests(TestCase):
+    def setUp(self):
+        get_api_cache().clear()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        media = override_settings(MEDIA_ROOT=tmp.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        author = Author.objects.create(name='Iraya', email='team@iraya.com')
+        self.posts = make_posts(author, 12, tags=[Tag.objects.create(name='News')])
+        self.posts[0].thumbnail.save('cover.png', ContentFile(b'png'))
+        Publication.objects.create(title='Paper', sub_text='Sub', pdf_file=ContentFile(b'%PDF', name='p.pdf'))
+        Brochure.objects.create(title='Brochure', text_content='-', file=ContentFile(b'%PDF', name='b.pdf'))
+        WelcomePopup.objects.create(title='Hello', is_active=True)
+        WelcomePopup.objects.create(title='Old', is_active=False)
+        self.drf = APIClient()
+
+    async def drf_get(self, url, **extra):
+        # the router's views, without the async stand-ins
+        with override_settings(ROOT_URLCONF='blog_project.urls'):
+            return await sync_to_async(self.drf.get)(url, **extra)
+
+    @override_settings(API_CACHE_ENABLED=False)
+    async def test_same_responses_as_the_viewsets(self):
+        for url in [
+            '/api/posts/',
+            '/api/posts/?page=2',
+            f'/api/posts/{self.posts[0].pk}/',
+            '/api/publications/',
+            '/api/brochures/',
+            '/api/welcome-popups/?is_active=true',
+            '/api/welcome-popups/?format=json',
+        ]:
+            fast = await self.async_client.get(url, headers={'Accept': 'application/json'})
+            slow = await self.drf_get(url, HTTP_ACCEPT='application/json')
+            self.assertEqual(fast.status_code, 200, url)
+            self.assertEqual(fast.content, slow.content, url)
+            for header in ('Allow', 'ETag', 'Last-Modified', 'Content-Type'):
+                self.assertEqual(fast.get(header), slow.get(header), f'{url} {header}')
+
+    async def test_shares_cache_entries_and_validators(self):
+        await self.drf_get('/api/posts/')
+        response = await self.async_client.get('/api/posts/')
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+        response = await self.async_client.get('/api/brochures/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual((await self.drf_get('/api/brochures/'))['X-Cache'], 'HIT')
+        with override_settings(API_CACHE_ENABLED=False):
+            response = await self.async_client.get('/api/brochures/', headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    async def test_falls_back_to_the_viewsets(self):
+        summary = await self.async_client.get('/api/posts/?view=summary')
+        self.assertIn('excerpt', summary.json()['results'][0])
+        self.assertEqual((await self.async_client.get('/api/posts/999999/')).status_code, 404)
+        self.assertEqual((await self.async_client.get('/api/posts/?page=9')).status_code, 404)
+        self.assertEqual((await self.async_client.post('/api/posts/', {})).status_code, 403)
+        html = await self.async_client.get('/api/publications/', headers={'Accept': 'text/html'})
+        self.assertTrue(html['Content-Type'].startswith('text/html'))
+
+    async def test_requests_are_throttled_once(self):
+        await sync_to_async(caches['default'].clear)()
+        rates = {'anon': '3/minute', 'user': '1000/minute'}
+        with mock.patch.object(SimpleRateThrottle, 'THROTTLE_RATES', rates):
+            # a 404 handed to the viewset, an out-of-range page, a cache miss and a hit
+            self.assertEqual((await self.async_client.get('/api/posts/999999/')).status_code, 404)
+            self.assertEqual((await self.async_client.get('/api/posts/?page=9')).status_code, 404)
+            self.assertEqual((await self.async_client.get('/api/brochures/')).status_code, 200)
+            # refused before any cache or database work
+            with mock.patch.object(AsyncReadView, 'respond') as respond:
+                self.assertEqual((await self.async_client.get('/api/brochures/')).status_code, 429)
+            respond.assert_not_called()
+
+
+@skipUnless(connection.vendor == 'postgresql', 'connection reuse is only observable on PostgreSQL')
+class DatabaseConnectionTests(TransactionTestCase):
+    def request(self):
+        # the test client skips the close_old_connections() that Django's
+        # request_started/request_finished receivers run around each request
+        close_old_connections()
+        response = APIClient().get('/api/tags/')
+        close_old_connections()
+        self.assertEqual(response.status_code, 200)
+
+    def test_persistent_connection_outlives_requests(self):
+        if connection.pool is not None:
+            self.skipTest('DB_POOL is on')
+        connection.close()
+        self.addCleanup(connection.settings_dict.__setitem__, 'CONN_MAX_AGE', connection.settings_dict['CONN_MAX_AGE'])
+        connection.settings_dict['CONN_MAX_AGE'] = 60
+        self.request()
+        raw = connection.connection
+        self.request()
+        self.assertIs(connection.connection, raw)
+
+    def test_pool_hands_out_the_same_connections(self):
+        if connection.pool is None:
+            self.skipTest('DB_POOL is off')
+        self.request()
+        connection.pool.pop_stats()
+        for _ in range(5):
+            self.request()
+        stats = connection.pool.get_stats()
+        self.assertGreaterEqual(stats['requests_num'], 5)
+        self.assertEqual(stats.get('connections_num', 0), 0)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        get_api_cache().clear()
+        registry.reset()
+        self.addCleanup(registry.reset)
+        author = Author.objects.create(name='Iraya', email='team@iraya.com')
+        make_posts(author, 3, tags=[Tag.objects.create(name='News')])
+
+    def scrape(self, **extra):
+        response = self.client.get('/metrics', **extra)
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def sample(self, text, line_start):
+        for line in text.splitlines():
+            if line.startswith(line_start + ' '):
+                return float(line.rsplit(' ', 1)[1])
+        self.fail(f'{line_start} not in /metrics')
+
+    def test_requests_are_aggregated_per_viewset_action(self):
+        APIClient().get('/api/posts/')
+        APIClient().get('/api/posts/')
+        text = self.scrape()
+        labels = '{view="PostViewSet",action="list"}'
+        self.assertEqual(self.sample(text, f'api_request_duration_seconds_count{labels}'), 2)
+        self.assertGreater(self.sample(text, f'api_db_queries_sum{labels}'), 0)
+        self.assertGreater(self.sample(text, f'api_serializer_duration_seconds_sum{labels}'), 0)
+        self.assertGreater(self.sample(text, f'api_response_bytes_sum{labels}'), 0)
+        self.assertEqual(self.sample(text, 'api_requests_total{view="PostViewSet",action="list",status="2xx",cache="miss"}'), 1)
+        self.assertEqual(self.sample(text, 'api_requests_total{view="PostViewSet",action="list",status="2xx",cache="hit"}'), 1)
+        self.assertIn('api_request_duration_seconds_bucket{view="PostViewSet",action="list",le="+Inf"} 2', text)
+
+    def test_endpoint_is_not_public(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='203.0.113.9').status_code, 404)
+        with override_settings(METRICS_TOKEN='s3cret'):
+            self.assertEqual(self.client.get('/metrics').status_code, 404)
+            self.scrape(HTTP_AUTHORIZATION='Bearer s3cret')
+
+    def test_slow_requests_are_logged_with_their_sql(self):
+        # every clock read is a second later than the previous one
+        with mock.patch('blog.middleware.time.perf_counter', side_effect=itertools.count()):
+            with self.assertLogs('blog.slow_requests', 'WARNING') as logs:
+                APIClient().get('/api/tags/')
+        self.assertIn('Slow request GET /api/tags/', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+        self.assertEqual(self.sample(self.scrape(), 'api_slow_requests_total{view="TagViewSet",action="list"}'), 1)
+
+    def test_scrape_adds_up_every_worker(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        other = {'histograms': [], 'counters': [['api_requests_total', [['view', 'TagViewSet'], ['action', 'list'], ['status', '2xx'], ['cache', 'none']], 4]]}
+        Path(tmp.name, 'metrics-1.json').write_text(json.dumps(other))
+        with override_settings(METRICS_DIR=tmp.name):
+            APIClient().get('/api/tags/')
+            text = self.scrape()
+        self.assertEqual(self.sample(text, 'api_requests_total{view="TagViewSet",action="list",status="2xx",cache="none"}'), 5)
+
+    def test_exited_workers_are_folded_into_one_file(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        exited = subprocess.Popen([sys.executable, '-c', ''])
+        exited.wait()
+
+        def counter(value):
+            return {'histograms': [], 'counters': [['api_requests_total', [['view', 'TagViewSet'], ['action', 'list'], ['status', '2xx'], ['cache', 'none']], value]]}
+        Path(tmp.name, f'metrics-{exited.pid}.json').write_text(json.dumps(counter(4)))
+        Path(tmp.name, 'metrics-dead.json').write_text(json.dumps(counter(2)))
+        registry.started = False
+        with override_settings(METRICS_DIR=tmp.name):
+            APIClient().get('/api/tags/')
+            text = self.scrape()
+        self.assertEqual(self.sample(text, 'api_requests_total{view="TagViewSet",action="list",status="2xx",cache="none"}'), 7)
+        self.assertEqual(sorted(p.name for p in Path(tmp.name).glob('metrics-*.json')), [f'metrics-{os.getpid()}.json', 'metrics-dead.json'])
+
+    def test_unnamed_routes_are_labelled_with_their_view_path(self):
+        self.scrape()
+        self.assertIn('api_request_duration_seconds_count{view="blog.metrics.metrics_view",action="get"} 1', self.scrape())
+
+
+class BenchmarkTests(TestCase):
+    def setUp(self):
+        get_api_cache().clear()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+
+    def _generate(self, *args):
+        sizes = ['--authors', '2', '--posts', '12', '--tags', '4', '--words', '50', '--publications', '3', '--brochures', '2', '--popups', '3']
+        call_command('generate_benchmark_data', *sizes, *args, stdout=StringIO())
+
+    def _benchmark(self, *args):
+        out = StringIO()
+        call_command('benchmark_api', '--iterations', '2', '--warmup', '0', *args, stdout=out)
+        return out.getvalue()
+
+    def test_generator_is_reproducible(self):
+        self._generate('--seed', '7')
+        first = list(Post.objects.order_by('slug').values_list('slug', 'content', 'status'))
+        self.assertEqual(len(first), 12)
+        self.assertEqual(Comment.objects.count(), 12 * 5)
+        self.assertEqual(PostImage.objects.count(), 12 * 4)
+        self.assertEqual(Post.tags.through.objects.count(), 12 * 3)
+        self.assertEqual(WelcomePopup.objects.filter(is_active=True).get().title, 'Bench Popup 2')
+        self.assertFalse(Post.objects.filter(content_html='').exists())
+        newest = Post.objects.order_by('-created_at').values_list('slug', 'created_at', 'published_at')[:2]
+        self.assertTrue(newest[0][0].startswith('bench-post-0-'))
+        self.assertEqual(newest[0][1], newest[0][2])
+        self.assertGreater(newest[0][1], newest[1][1])
+
+        with self.assertRaises(CommandError):
+            self._generate('--seed', '7')
+        self._generate('--seed', '7', '--clear')
+        self.assertEqual(list(Post.objects.order_by('slug').values_list('slug', 'content', 'status')), first)
+        self.assertEqual(Publication.objects.count(), 3)
+
+    def test_results_are_written_and_compared_with_baseline(self):
+        self._generate()
+        baseline = self.dir / 'baseline.json'
+        self._benchmark('--output', str(baseline))
+        results = json.loads(baseline.read_text())
+        self.assertEqual(
+            set(results['scenarios']),
+            {'posts-page-1', 'posts-page-last', 'posts-by-tag', 'post-detail', 'publications', 'brochures', 'active-popup', 'active-popup-single'},
+        )
+        posts = results['scenarios']['posts-page-1']
+        self.assertGreater(posts['queries'], 0)
+        self.assertGreater(posts['bytes'], 0)
+        self.assertLessEqual(posts['p50_ms'], posts['p95_ms'])
+
+        # an earlier run that needed one query less for the first page
+        posts['queries'] -= 1
+        baseline.write_text(json.dumps(results))
+        with self.assertRaisesMessage(CommandError, 'posts-page-1: queries'):
+            self._benchmark('--output', str(self.dir / 'run.json'), '--baseline', str(baseline), '--scenario', 'posts-page-1')
+        self.assertTrue((self.dir / 'run.json').exists())
+
+
+class ActivePopupTests(TestCase):
+    url = '/api/welcome-popups/active/'
+
+    def setUp(self):
+        get_api_cache().clear()
+        active_popup_entries.clear()
+        self.client = APIClient(HTTP_ACCEPT='application/json')
+
+    def test_returns_the_active_popup_or_no_content(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response.content, b'')
+
+        WelcomePopup.objects.create(title='Old', is_active=True)
+        WelcomePopup.objects.create(title='New', is_active=True)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['title'], 'New')
+
+    def test_served_from_process_memory_until_a_popup_changes(self):
+        popup = WelcomePopup.objects.create(title='Welcome', is_active=True)
+        self.assertEqual(self.client.get(self.url)['X-Cache'], 'MISS')
+        with mock.patch('blog.views.get_api_cache') as shared, self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        shared.assert_not_called()
+
+        popup.title = 'Hello'
+        popup.save()
+        response = self.client.get(self.url)
+        self.assertEqual((response['X-Cache'], response.json()['title']), ('MISS', 'Hello'))
+
+        popup.delete()
+        self.assertEqual(self.client.get(self.url).status_code, 204)
+
+    def test_matching_etag_is_answered_without_queries(self):
+        WelcomePopup.objects.create(title='Welcome', is_active=True)
+        etag = self.client.get(self.url)['ETag']
+        active_popup_entries.clear()
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        WelcomePopup.objects.create(title='Other')
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
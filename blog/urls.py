@@ -1,6 +1,8 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import AuthorViewSet, PostViewSet, CommentViewSet, TagViewSet, PublicationViewSet, WelcomePopupViewSet, BrochureViewSet
+from .async_views import PostReadView, PublicationReadView, BrochureReadView, WelcomePopupReadView
+from .views import AuthorViewSet, PostViewSet, CommentViewSet, TagViewSet, PublicationViewSet, WelcomePopupViewSet, BrochureViewSet, SearchViewSet
 
 router = DefaultRouter()
 router.register(r'authors', AuthorViewSet)
@@ -10,7 +12,29 @@ router.register(r'tags', TagViewSet)
 router.register(r'publications', PublicationViewSet)
 router.register(r'welcome-popups', WelcomePopupViewSet)
 router.register(r'brochures', BrochureViewSet)
+router.register(r'search', SearchViewSet, basename='search')
 
-urlpatterns = [
+
+def router_view(name):
+    """The view the router built for a route name, e.g. 'post-list'."""
+    return next(pattern.callback for pattern in router.urls if pattern.name == name)
+
+
+# Async stand-ins for the public read routes; each falls back to the
+# router's view for anything it does not serve (see blog/async_views.py).
+async_urlpatterns = []
+for prefix, view_class, basename in [
+    ('posts', PostReadView, 'post'),
+    ('publications', PublicationReadView, 'publication'),
+    ('brochures', BrochureReadView, 'brochure'),
+    ('welcome-popups', WelcomePopupReadView, 'welcomepopup'),
+]:
+    async_urlpatterns += [
+        path(f'api/{prefix}/', view_class.as_view(router_view(f'{basename}-list'))),
+        path(f'api/{prefix}/<int:pk>/', view_class.as_view(router_view(f'{basename}-detail'))),
+    ]
+
+urlpatterns = async_urlpatterns if settings.API_ASYNC_READS else []
+urlpatterns += [
     path('api/', include(router.urls)),
-]
\ No newline at end of file
+]
@@ -1,50 +1,192 @@
 from django.shortcuts import render
-from django.db.models import Q
+from django.db.models import Exists, OuterRef, Prefetch
+from django.http import Http404
 from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from .cache import CachedResponseMixin, LocalEntries, cache_entry, get_api_cache, get_namespace_version, response_cache_key, response_from_entry
+from .conditional import ConditionalGetMixin, make_validators, not_modified_response, set_validators
+from .fastpath import ValuesReadMixin, PostValuesSerializer, PublicationValuesSerializer
+from .pagination import PostPagination
+from .resolvers import post_slugs, resolve_tag_ids
+from .search import SEARCH_KINDS, search
 from .models import Author, Post, Comment, Tag, Publication, WelcomePopup, Brochure
-from .serializers import AuthorSerializer, PostSerializer, CommentSerializer, TagSerializer, PublicationSerializer, WelcomePopupSerializer, BrochureSerializer
+from .serializers import AuthorSerializer, PostSerializer, PostSummarySerializer, CommentSerializer, TagSerializer, PublicationSerializer, WelcomePopupSerializer, BrochureSerializer, SearchResultSerializer
+
+
+def post_queryset(fields=None):
+    """Published posts with everything PostSerializer touches loaded up front.
+
+    Author, tags, approved comments and gallery images are fetched in a fixed
+    number of queries no matter how many posts end up on the page. Pass the
+    serializer `fields` being rendered to skip relations and the `content`
+    column that will not be used.
+    """
+    def wanted(name):
+        return fields is None or name in fields
+
+    qs = Post.objects.filter(status=Post.STATUS_PUBLISHED)
+    if wanted('author'):
+        qs = qs.select_related('author')
+    if not wanted('content'):
+        qs = qs.defer('content')
+    if not wanted('content_html'):
+        qs = qs.defer('content_html')
+    prefetches = []
+    if wanted('tags'):
+        prefetches.append('tags')
+    if wanted('images'):
+        prefetches.append('uploaded_images')
+    if wanted('comments'):
+        prefetches.append(Prefetch('comments', queryset=Comment.objects.filter(approved=True).order_by('created_at')))
+    return qs.prefetch_related(*prefetches).order_by('-created_at', '-id')
+
+
+# list pages leave out the rendered body unless `?fields=` asks for it
+POST_LIST_FIELDS = [name for name in PostSerializer.Meta.fields if name != 'content_html']
+
+
+def summary_post_queryset():
+    """Published posts for card listings: no body, comments or gallery."""
+    return post_queryset(fields=PostSummarySerializer.Meta.fields)
+
 
 # Create your views here.
-class AuthorViewSet(viewsets.ModelViewSet):
+class AuthorViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Author.objects.prefetch_related('posts').all()
     serializer_class = AuthorSerializer
+    cache_namespace = 'authors'
 
-class PostViewSet(viewsets.ModelViewSet):
+class PostViewSet(CachedResponseMixin, ConditionalGetMixin, ValuesReadMixin, viewsets.ModelViewSet):
     queryset = Post.objects.select_related('author').prefetch_related('comments', 'tags').all().order_by('-created_at')
     serializer_class = PostSerializer
+    values_serializer_class = PostValuesSerializer
+    pagination_class = PostPagination
+    cache_namespace = 'posts'
+    last_modified_field = 'updated_at'
 
     def get_queryset(self):
         """
-        Optionally filter posts by tag name using the `?tag=` query parameter.
+        Optionally filter posts by tag name or slug using the `?tag=` query parameter.
         Example: /api/posts/?tag=Events
+
+        Repeat the parameter to filter on several tags; posts matching any of
+        them are returned unless `?tag_match=all` is given.
+        Example: /api/posts/?tag=News&tag=Events&tag_match=all
+
+        Add `?cursor=` to page through posts by keyset instead of page number
+        (see `PostPagination`).
+
+        `?view=summary` returns compact cards (see `PostSummarySerializer`)
+        and `?fields=id,title,...` trims the payload to the listed fields;
+        both skip loading whatever they leave out. Plain list pages carry
+        every field but `content_html`, which is served on detail routes or
+        through `?fields=`.
         """
         # By default only return published posts so drafts are not exposed to the public frontend
-        qs = Post.objects.filter(status=Post.STATUS_PUBLISHED).select_related('author').prefetch_related('comments', 'tags').order_by('-created_at')
-        tag = self.request.query_params.get('tag')
-        if tag:
-            # allow either tag name or tag slug (case-insensitive)
-            qs = qs.filter(Q(tags__name__iexact=tag) | Q(tags__slug__iexact=tag))
-        return qs.distinct()
-
-class CommentViewSet(viewsets.ModelViewSet):
+        if self.is_summary_view():
+            qs = summary_post_queryset()
+        else:
+            qs = post_queryset(fields=self.get_requested_fields())
+        if self.action == 'by_slug':
+            # guards against a stale slug -> pk mapping from another worker
+            qs = qs.filter(slug=self.kwargs['slug'])
+        tags = [t for t in self.request.query_params.getlist('tag') if t.strip()]
+        if tags:
+            qs = self.filter_by_tags(qs, tags, self.request.query_params.get('tag_match', 'any'))
+        return qs
+
+    @action(detail=False, methods=['get'], url_path=r'by-slug/(?P<slug>[-\w]+)')
+    def by_slug(self, request, slug=None):
+        """Same payload as the detail route, addressed by slug.
+
+        Example: /api/posts/by-slug/iraya-at-eage-2024/
+        """
+        pk = post_slugs.resolve(slug)
+        if pk is None:
+            raise Http404
+        self.kwargs[self.lookup_field] = pk
+        try:
+            return self.retrieve(request)
+        except Http404:
+            post_slugs.forget(slug)
+            fresh_pk = post_slugs.resolve(slug)
+            if fresh_pk is None or fresh_pk == pk:
+                raise
+            self.kwargs[self.lookup_field] = fresh_pk
+            return self.retrieve(request)
+
+    def is_summary_view(self):
+        return self.action == 'list' and self.request.query_params.get('view') == 'summary'
+
+    def get_requested_fields(self):
+        """Field names from `?fields=` on reads, or None for everything.
+
+        Lists without `?fields=` get POST_LIST_FIELDS.
+        """
+        if self.request is None or self.request.method not in ('GET', 'HEAD'):
+            return None
+        fields = self.request.query_params.get('fields')
+        if not fields:
+            return POST_LIST_FIELDS if self.action == 'list' else None
+        return [f.strip() for f in fields.split(',') if f.strip()]
+
+    def get_serializer_class(self):
+        if self.is_summary_view():
+            return PostSummarySerializer
+        return PostSerializer
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.get_requested_fields())
+        return super().get_serializer(*args, **kwargs)
+
+    def get_values_serializer(self, **kwargs):
+        kwargs.setdefault('fields', self.get_requested_fields())
+        return super().get_values_serializer(**kwargs)
+
+    def filter_by_tags(self, qs, tags, match):
+        """Filter with EXISTS subqueries on the through table (no JOIN/DISTINCT)."""
+        tag_ids = resolve_tag_ids(tags)
+        known = [pk for pk in tag_ids if pk is not None]
+        if not known or (match == 'all' and len(known) != len(tag_ids)):
+            return qs.none()
+        through = Post.tags.through.objects.filter(post_id=OuterRef('pk'))
+        if match == 'all':
+            for pk in set(known):
+                qs = qs.filter(Exists(through.filter(tag_id=pk)))
+            return qs
+        return qs.filter(Exists(through.filter(tag_id__in=known)))
+
+class CommentViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Comment.objects.select_related('post').all().order_by('-created_at')
     serializer_class = CommentSerializer
+    cache_namespace = 'comments'
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Tag.objects.all().order_by('name')
     serializer_class = TagSerializer
+    cache_namespace = 'tags'
 
 
-class PublicationViewSet(viewsets.ModelViewSet):
+class PublicationViewSet(CachedResponseMixin, ConditionalGetMixin, ValuesReadMixin, viewsets.ModelViewSet):
     queryset = Publication.objects.all().order_by('-created_at')
     serializer_class = PublicationSerializer
+    values_serializer_class = PublicationValuesSerializer
     pagination_class = None
+    cache_namespace = 'publications'
+
 
-class WelcomePopupViewSet(viewsets.ModelViewSet):
+# rendered /api/welcome-popups/active/ responses, see WelcomePopupViewSet.active
+active_popup_entries = LocalEntries()
+
+
+class WelcomePopupViewSet(CachedResponseMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = WelcomePopup.objects.all().order_by('-created_at')
     serializer_class = WelcomePopupSerializer
     pagination_class = None
+    cache_namespace = 'welcome-popups'
 
     def get_queryset(self):
         qs = WelcomePopup.objects.all().order_by('-created_at')
@@ -54,7 +196,76 @@ class WelcomePopupViewSet(viewsets.ModelViewSet):
             qs = qs.filter(is_active=active_bool)
         return qs
 
-class BrochureViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'])
+    def active(self, request):
+        """The active popup as a single object, or 204 No Content when none is.
+
+        WelcomePopup.save() keeps at most one popup active, so the frontend
+        needs no list. The response is kept in this process and in the API
+        cache under the `welcome-popups` version, which only moves when a
+        popup is saved or deleted, and a matching If-None-Match gets a 304
+        before either is looked at.
+
+        Example: /api/welcome-popups/active/
+        """
+        version = get_namespace_version(self.cache_namespace)
+        etag, _ = make_validators(self.cache_namespace, version, request)
+        not_modified = not_modified_response(request, etag, None)
+        if not_modified is not None:
+            return not_modified
+
+        use_cache = self._should_cache(request)
+        key = response_cache_key(request, self.cache_namespace)
+        if use_cache:
+            entry = active_popup_entries.get(key, version)
+            if entry is None:
+                entry = get_api_cache().get(key, version=version)
+                if entry is not None:
+                    active_popup_entries.set(key, entry, version)
+            if entry is not None:
+                return response_from_entry(request, entry)
+
+        popup = WelcomePopup.objects.filter(is_active=True).order_by('-created_at').first()
+        response = Response(self.get_serializer(popup).data) if popup else Response(status=204)
+        set_validators(response, etag, None)
+        if use_cache:
+            def store(rendered):
+                entry = cache_entry(rendered)
+                get_api_cache().set(key, entry, version=version)
+                active_popup_entries.set(key, entry, version)
+            response.add_post_render_callback(store)
+        response['X-Cache'] = 'MISS'
+        return response
+
+
+class BrochureViewSet(CachedResponseMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Brochure.objects.all().order_by('-created_at')
     serializer_class = BrochureSerializer
-    pagination_class = None
\ No newline at end of file
+    pagination_class = None
+    cache_namespace = 'brochures'
+
+
+class SearchViewSet(CachedResponseMixin, viewsets.ViewSet):
+    """Ranked full-text search over posts, publications and brochures.
+
+    `?q=` is required; `?type=post|publication|brochure` (repeatable)
+    narrows the kinds and `?limit=` caps the results (default 20, max 50).
+    """
+    cache_namespace = 'search'
+    max_limit = 50
+
+    def list(self, request, *args, **kwargs):
+        return self._cached_response(self._search, request)
+
+    def _search(self, request):
+        q = request.query_params.get('q', '').strip()
+        kinds = request.query_params.getlist('type') or SEARCH_KINDS
+        unknown = set(kinds) - set(SEARCH_KINDS)
+        if unknown:
+            raise ValidationError({'type': f"Unknown type: {', '.join(sorted(unknown))}"})
+        try:
+            limit = min(int(request.query_params.get('limit', 20)), self.max_limit)
+        except ValueError:
+            raise ValidationError({'limit': 'Must be an integer.'})
+        results = search(q, kinds, max(limit, 1)) if q else []
+        return Response({'query': q, 'results': SearchResultSerializer(results, many=True).data})
@@ -54,9 +54,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # per-request timings for /metrics; first, to see the whole request
+    'blog.middleware.MetricsMiddleware',
     # CORS middleware should be placed as high as possible
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # brotli/gzip for JSON; must sit above anything that reads the body
+    'blog.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -88,6 +92,15 @@ WSGI_APPLICATION = 'blog_project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Connections are kept open between requests (DB_CONN_MAX_AGE seconds) and
+# checked before reuse, pooled or not. On PostgreSQL, DB_POOL=True switches
+# to a psycopg 3 pool per process instead, sized for the GUNICORN_THREADS
+# threads each Gunicorn worker runs; PostgreSQL then needs room for about
+# GUNICORN_WORKERS * DB_POOL_MAX_SIZE connections (see README.md).
+GUNICORN_WORKERS = int(os.environ.get('GUNICORN_WORKERS', '3'))
+GUNICORN_THREADS = int(os.environ.get('GUNICORN_THREADS', '1'))
+DB_POOL = os.environ.get('DB_POOL', 'False') == 'True'
+
 DATABASES = {
     'default': {
         'ENGINE': os.environ.get('DB_ENGINE', 'django.db.backends.sqlite3'),
@@ -96,9 +109,74 @@ DATABASES = {
         'PASSWORD': os.environ.get('DB_PASSWORD', ''),
         'HOST': os.environ.get('DB_HOST', ''),
         'PORT': os.environ.get('DB_PORT', ''),
+        # the pool replaces persistent connections; Django refuses both
+        'CONN_MAX_AGE': 0 if DB_POOL else int(os.environ.get('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': os.environ.get('DB_CONN_HEALTH_CHECKS', 'True') == 'True',
+        'OPTIONS': {},
+    }
+}
+
+if DB_POOL and DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '1')),
+        'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', str(GUNICORN_THREADS))),
+        # seconds a request waits for a free connection before erroring
+        'timeout': float(os.environ.get('DB_POOL_TIMEOUT', '10')),
     }
+
+
+# Caching
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# The `api` cache holds rendered responses for anonymous GETs and is
+# invalidated by model signals (see blog/signals.py). Local memory works out
+# of the box; with several Gunicorn workers prefer a shared backend, e.g.
+#   API_CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+#   API_CACHE_LOCATION=/var/tmp/iraya-api-cache
+# so an admin save invalidates the cache for every worker.
+
+# Both aliases must be shared by every Gunicorn worker and run_worker in
+# production: `api` holds the invalidation versions, `default` the image
+# derivative manifests and throttle counters (see README.md).
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('DEFAULT_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('DEFAULT_CACHE_LOCATION', ''),
+    },
+    'api': {
+        'BACKEND': os.environ.get('API_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('API_CACHE_LOCATION', 'iraya-api'),
+        'TIMEOUT': int(os.environ.get('API_CACHE_TIMEOUT', '600')),
+    },
 }
 
+API_CACHE_ALIAS = 'api'
+API_CACHE_ENABLED = os.environ.get('API_CACHE_ENABLED', 'True') == 'True'
+
+# Read posts and publications from .values() rows instead of going through
+# the serializer field machinery (see blog/fastpath.py).
+API_VALUES_FAST_PATH = os.environ.get('API_VALUES_FAST_PATH', 'True') == 'True'
+
+# Responses smaller than this are sent uncompressed (see blog/middleware.py).
+API_COMPRESSION_MIN_SIZE = int(os.environ.get('API_COMPRESSION_MIN_SIZE', '1024'))
+
+# Request metrics at /metrics in Prometheus text format (blog/metrics.py).
+# The endpoint answers METRICS_ALLOWED_IPS, or only `Authorization: Bearer
+# <METRICS_TOKEN>` when a token is set. Requests slower than
+# METRICS_SLOW_REQUEST_MS (0 disables) are logged to `blog.slow_requests`
+# with their SQL. Point METRICS_DIR at a directory shared by the Gunicorn
+# workers so a scrape covers all of them rather than the one answering.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True') == 'True'
+METRICS_SLOW_REQUEST_MS = int(os.environ.get('METRICS_SLOW_REQUEST_MS', '500'))
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', '1.0'))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+
+# Serve anonymous JSON reads of posts, publications, brochures and popups
+# from async views (blog/async_views.py). Only worth it under an ASGI
+# server; under WSGI every such request would spin up an event loop.
+API_ASYNC_READS = os.environ.get('API_ASYNC_READS', 'False') == 'True'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -155,12 +233,40 @@ CORS_ALLOW_ALL_ORIGINS = True
 # Media (for uploaded images) - useful if you add ImageField to your Post model
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Origin put in front of media URLs in API responses, e.g. a CDN
+# (https://cdn.iraya.com). Empty: the scheme and host of the request.
+MEDIA_BASE_URL = os.environ.get('MEDIA_BASE_URL', '')
+
+# Let Django answer /media/ (with Range support, see blog/media.py) when no
+# web server sits in front of it. With MEDIA_ACCEL_REDIRECT_PREFIX set
+# (e.g. /protected-media/) Django only checks the request and Nginx sends
+# the bytes from a matching `internal` location.
+MEDIA_SERVE = os.environ.get('MEDIA_SERVE', str(DEBUG)) == 'True'
+MEDIA_ACCEL_REDIRECT_PREFIX = os.environ.get('MEDIA_ACCEL_REDIRECT_PREFIX', '')
+
+# Static copy of the public API written by `manage.py export_api_snapshot`
+# for Nginx to serve without reaching Gunicorn (see README.md).
+API_SNAPSHOT_DIR = os.environ.get('API_SNAPSHOT_DIR', str(BASE_DIR / 'snapshot'))
+API_SNAPSHOT_BASE_URL = os.environ.get('API_SNAPSHOT_BASE_URL', 'http://localhost:8000')
+
+# Resized copies of uploaded images exposed as `*_srcset` by the serializers
+# (see blog/images.py). Formats the installed Pillow cannot encode are skipped.
+IMAGE_DERIVATIVES_ENABLED = os.environ.get('IMAGE_DERIVATIVES_ENABLED', 'True') == 'True'
+IMAGE_DERIVATIVE_WIDTHS = (320, 640, 960, 1280)
+IMAGE_DERIVATIVE_FORMATS = ('webp', 'avif')
+# how long a page render trusts that an image has no derivatives yet
+IMAGE_MANIFEST_MISS_TIMEOUT = int(os.environ.get('IMAGE_MANIFEST_MISS_TIMEOUT', '60'))
 
 # Django REST Framework Settings
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
+    # orjson when installed, see blog/renderers.py
+    'DEFAULT_RENDERER_CLASSES': [
+        'blog.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
     'DEFAULT_THROTTLE_CLASSES': [
@@ -168,8 +274,8 @@ REST_FRAMEWORK = {
         'rest_framework.throttling.UserRateThrottle'
     ],
     'DEFAULT_THROTTLE_RATES': {
-        'anon': '100/minute',
-        'user': '1000/minute'
+        'anon': os.environ.get('API_THROTTLE_ANON', '100/minute'),
+        'user': os.environ.get('API_THROTTLE_USER', '1000/minute'),
     }
 }
 
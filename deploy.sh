@@ -168,6 +168,28 @@ DB_USER=$DB_USER
 DB_PASSWORD=$DB_PASSWORD
 DB_HOST=localhost
 DB_PORT=5432
+
+# Connection reuse (see README.md). DB_POOL=True pools connections per
+# worker instead, DB_POOL_MAX_SIZE defaulting to GUNICORN_THREADS.
+DB_CONN_MAX_AGE=60
+DB_CONN_HEALTH_CHECKS=True
+DB_POOL=False
+
+# Caches shared by the Gunicorn workers and the job worker (see README.md):
+# responses and their invalidation versions, then image manifests and
+# throttle counters
+API_CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+API_CACHE_LOCATION=/var/cache/iraya-api/api
+DEFAULT_CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+DEFAULT_CACHE_LOCATION=/var/cache/iraya-api/default
+
+# Gunicorn
+GUNICORN_WORKERS=3
+GUNICORN_THREADS=1
+
+# /metrics, summed over the Gunicorn workers (see README.md)
+METRICS_DIR=/run/iraya-api/metrics
+METRICS_SLOW_REQUEST_MS=500
 EOF
 
 chmod 600 "$ENV_FILE"
@@ -246,8 +268,11 @@ User=root
 Group=www-data
 WorkingDirectory=$PROJECT_DIR
 EnvironmentFile=$ENV_FILE
+# /run/iraya-api/metrics, emptied on restart
+RuntimeDirectory=iraya-api
 ExecStart=$GUNICORN_BIN \\
-    --workers 3 \\
+    --workers \${GUNICORN_WORKERS} \\
+    --threads \${GUNICORN_THREADS} \\
     --bind 127.0.0.1:8000 \\
     --access-logfile /var/log/iraya-api-access.log \\
     --error-logfile /var/log/iraya-api-error.log \\
@@ -263,6 +288,29 @@ systemctl daemon-reload
 systemctl enable "$SERVICE_NAME"
 systemctl restart "$SERVICE_NAME"
 
+# Background job worker (image derivatives etc.) — see blog/jobs.py
+cat > "/etc/systemd/system/${SERVICE_NAME}-worker.service" <<EOF
+[Unit]
+Description=Iraya API Background Job Worker
+After=network.target postgresql.service
+
+[Service]
+User=root
+Group=www-data
+WorkingDirectory=$PROJECT_DIR
+EnvironmentFile=$ENV_FILE
+ExecStart=$VENV_DIR/bin/python manage.py run_worker
+Restart=on-failure
+RestartSec=5
+
+[Install]
+WantedBy=multi-user.target
+EOF
+
+systemctl daemon-reload
+systemctl enable "${SERVICE_NAME}-worker"
+systemctl restart "${SERVICE_NAME}-worker"
+
 # Give gunicorn a moment to start, then check
 sleep 2
 if systemctl is-active --quiet "$SERVICE_NAME"; then
@@ -292,6 +340,13 @@ server {
         add_header Cache-Control "public, immutable";
     }
 
+    # Content-addressed uploads and image derivatives never change in place
+    location ~ ^/media/(cas|derivatives/[0-9a-f]{2})/ {
+        root $PROJECT_DIR;
+        expires max;
+        add_header Cache-Control "public, max-age=31536000, immutable";
+    }
+
     # Media files (uploaded images, PDFs, etc.)
     location /media/ {
         alias $PROJECT_DIR/media/;
@@ -299,6 +354,22 @@ server {
         add_header Cache-Control "public";
     }
 
+    # Target of X-Accel-Redirect when MEDIA_ACCEL_REDIRECT_PREFIX=/protected-media/
+    location /protected-media/ {
+        internal;
+        alias $PROJECT_DIR/media/;
+    }
+
+    # Prometheus scrapes from this host only; Gunicorn sees every proxied
+    # request as 127.0.0.1, so the check has to happen here
+    location = /metrics {
+        allow 127.0.0.1;
+        allow ::1;
+        deny all;
+        proxy_pass http://127.0.0.1:8000;
+        proxy_set_header Host \$host;
+    }
+
     # Proxy everything else to Gunicorn
     location / {
         proxy_pass http://127.0.0.1:8000;
@@ -351,6 +422,7 @@ echo ""
 echo -e "  Gunicorn service: ${YELLOW}sudo systemctl status $SERVICE_NAME${NC}"
 echo -e "  Nginx service:    ${YELLOW}sudo systemctl status nginx${NC}"
 echo -e "  Gunicorn logs:    ${YELLOW}sudo journalctl -u $SERVICE_NAME -f${NC}"
+echo -e "  Job worker:       ${YELLOW}sudo systemctl status ${SERVICE_NAME}-worker${NC}"
 echo -e "  Access log:       ${YELLOW}/var/log/iraya-api-access.log${NC}"
 echo -e "  Error log:        ${YELLOW}/var/log/iraya-api-error.log${NC}"
 echo ""